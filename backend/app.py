@@ -1,23 +1,52 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from utils.recommendation import get_recommendation_status
 from flask_cors import CORS
-from prediction import predict_glucose_events
+from preprocessing import EVENT_HISTORY_STEPS, STEP_MINUTES
+from resampling import resample_user_readings
+from feature_cache import FeatureWindowCache
+from bulk_ingest import bulk_insert, iter_json, iter_ndjson
+from recent_data import fetch_recent
+from history import decode_cursor, find_history, stream_history
+from result_cache import UserResultCache
+from glucose_series import load_glucose_grid, load_glucose_series, to_iso
+from downsampling import DOWNSAMPLERS, downsample
+from rollups import glucose_stats, update_rollups
+from agp import build_agp
+from variability import STEPS_PER_DAY, variability_metrics
+from vitals_buckets import VitalsBucketWriter, VitalsBufferFull, hourly_summary, read_vitals, step_means
+from write_behind import WriteBehindFull, WriteBehindQueue
+from prediction import (
+    predict_glucose_events, predict_glucose_events_batch, predict_from_features, get_batching_stats,
+    start_model_loading, get_model_status, get_feature_columns, get_prediction_cache_stats, reload_model,
+    get_inference_pool_stats, get_registry_status, load_model_version, activate_model_version,
+    set_shadow_version
+)
 from database.db import (
     glucose_readings, insulin_doses, meal_entries, 
-    activity_entries, vitals_entries, users, init_db
+    activity_entries, vitals_entries, glucose_rollups, vitals_buckets, users, init_db
 )
 from datetime import datetime, timedelta
 from bson import ObjectId
 import json
+import logging
+import math
 import os
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
+# Upper bound on windows accepted by /api/predict/batch
+PREDICT_BATCH_MAX_ITEMS = int(os.environ.get('PREDICT_BATCH_MAX_ITEMS', 1000))
+
 # Initialize database
 init_db()
 
+# Load the prediction model (in the background by default)
+start_model_loading()
+
 # Helper function to convert ObjectId to string
 def json_serialize(obj):
     if isinstance(obj, ObjectId):
@@ -28,96 +57,333 @@ def json_serialize(obj):
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Simple endpoint to check if API is running"""
+    """Simple endpoint to check if API is running (liveness)"""
     return jsonify({
         'status': 'healthy',
         'version': '1.0.0'
     })
 
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once the model is loaded and warmed up, 503 until then"""
+    model_status = get_model_status()
+    return jsonify({
+        'status': 'ready' if model_status['ready'] else 'not_ready',
+        'model': model_status
+    }), 200 if model_status['ready'] else 503
+
+@app.route('/api/model/reload', methods=['POST'])
+def model_reload():
+    """Reload the model files from disk and invalidate cached predictions"""
+    try:
+        result = reload_model()
+        return jsonify(result), 200 if result['reloaded'] else 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/model/registry', methods=['GET'])
+def model_registry():
+    """Registered model versions, the active and shadow versions, and shadow comparison stats"""
+    return jsonify(get_registry_status())
+
+@app.route('/api/model/versions/<name>/load', methods=['POST'])
+def model_version_load(name):
+    """Load a model version from models/versions/<name> in the background (202 until ready)"""
+    try:
+        wait = request.args.get('wait') == '1'
+        result = load_model_version(name, wait=wait)
+        return jsonify(result), 200 if result['ready'] else 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/model/versions/<name>/activate', methods=['POST'])
+def model_version_activate(name):
+    """Atomically switch live traffic to a loaded model version"""
+    try:
+        return jsonify(activate_model_version(name))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/model/shadow', methods=['POST', 'DELETE'])
+def model_shadow():
+    """Shadow a loaded version on a sampled fraction of traffic ({version, sample_rate}); DELETE stops"""
+    try:
+        if request.method == 'DELETE':
+            return jsonify(set_shadow_version(None))
+        data = request.json or {}
+        if not data.get('version'):
+            return jsonify({'error': 'version is required'}), 400
+        return jsonify(set_shadow_version(data['version'], float(data.get('sample_rate', 0.1))))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Helper function to pad and interpolate data
+def interpolate_data(input_data, target_length=12, history_length=None):
+    # Keep up to `history_length` values when there is more than enough data
+    if len(input_data) >= target_length:
+        return input_data[-max(target_length, history_length or target_length):]
+    
+    # If no data, return default
+    if len(input_data) == 0:
+        return [120] * target_length
+    
+    # Linear interpolation to fill missing points
+    interpolated = []
+    for i in range(target_length):
+        # Calculate the index in the original data
+        orig_index = (i * len(input_data)) / target_length
+        
+        # Get surrounding indices
+        lower_index = int(orig_index)
+        upper_index = min(lower_index + 1, len(input_data) - 1)
+        
+        # Linear interpolation
+        if lower_index == upper_index:
+            interpolated.append(input_data[lower_index])
+        else:
+            lower_value = input_data[lower_index]
+            upper_value = input_data[upper_index]
+            fraction = orig_index - lower_index
+            interpolated_value = lower_value + fraction * (upper_value - lower_value)
+            interpolated.append(interpolated_value)
+    
+    return interpolated
+
+def prepare_prediction_data(data):
+    """Extract and interpolate one /api/predict payload into model-ready inputs"""
+    glucose_readings = interpolate_data(
+        data.get('glucose_readings', []), 
+        target_length=12
+    )
+    
+    insulin_data = {
+        'basal': interpolate_data(
+            data.get('insulin', {}).get('basal', []), 
+            target_length=12
+        ),
+        'bolus': interpolate_data(
+            data.get('insulin', {}).get('bolus', []), 
+            target_length=12,
+            history_length=EVENT_HISTORY_STEPS
+        )
+    }
+    
+    # Bolus and carbs keep longer history for insulin / carbs on board
+    carb_data = interpolate_data(
+        data.get('carbs', []), 
+        target_length=12,
+        history_length=EVENT_HISTORY_STEPS
+    )
+    
+    activity_data = interpolate_data(
+        data.get('activity', []), 
+        target_length=12
+    )
+    
+    # Use default values if no data
+    heart_rate_data = interpolate_data(
+        data.get('heart_rate', []), 
+        target_length=12
+    ) or [70] * 12
+    
+    gsr_data = interpolate_data(
+        data.get('gsr', []), 
+        target_length=12
+    ) or [1] * 12
+    
+    return {
+        'glucose_readings': glucose_readings,
+        'insulin': insulin_data,
+        'carbs': carb_data,
+        'activity': activity_data,
+        'heart_rate': heart_rate_data,
+        'gsr': gsr_data
+    }
+
+def load_user_readings(user_id, end=None, history_steps=EVENT_HISTORY_STEPS):
+    """Fetch the timestamped readings needed to resample one prediction window"""
+    end = end or datetime.utcnow()
+    query = {
+        'user_id': user_id,
+        'timestamp': {'$gte': end - timedelta(minutes=STEP_MINUTES * history_steps), '$lte': end}
+    }
+    return {
+        'glucose': list(glucose_readings.find(query, {'_id': 0, 'timestamp': 1, 'value': 1})),
+        'insulin': list(insulin_doses.find(query, {'_id': 0, 'timestamp': 1, 'dose': 1, 'insulin_type': 1})),
+        'meals': list(meal_entries.find(query, {'_id': 0, 'timestamp': 1, 'carbs': 1})),
+        'vitals': list(vitals_entries.find(query, {'_id': 0, 'timestamp': 1, 'heart_rate': 1, 'gsr': 1}))
+                  + bucketed_vitals_docs(user_id, query['timestamp']['$gte'], end)
+    }
+
+def bucketed_vitals_docs(user_id, start, end, step_seconds=60):
+    """High-frequency vitals from the hourly buckets, averaged per minute, as resampler documents"""
+    samples = step_means(read_vitals(vitals_buckets, user_id, start, end, writer=vitals_writer), step_seconds)
+    return [
+        {'timestamp': ts, 'heart_rate': None if math.isnan(hr) else hr, 'gsr': None if math.isnan(gsr) else gsr}
+        for ts, hr, gsr in zip(samples['timestamp'].tolist(), samples['heart_rate'].tolist(), samples['gsr'].tolist())
+    ]
+
+def prepare_timestamped_prediction_data(data):
+    """
+    Resample timestamped readings onto the 5-minute grid.
+
+    Readings come either from the payload ({"readings": {"glucose": [...],
+    "insulin": [...], "meals": [...], "vitals": [...]}} using the same document
+    shapes as the collections) or, with {"source": "db", "user_id": ...},
+    straight from MongoDB.
+    """
+    end = datetime.fromisoformat(data['end']) if data.get('end') else None
+    if data.get('source') == 'db':
+        if not data.get('user_id'):
+            raise ValueError('user_id is required to read from the database')
+        readings = load_user_readings(data['user_id'], end)
+    else:
+        readings = data['readings']
+    
+    return resample_user_readings(
+        readings.get('glucose', []),
+        readings.get('insulin', []),
+        readings.get('meals', []),
+        readings.get('vitals', []),
+        end=end
+    )
+
+def rebuild_feature_window(user_id):
+    """Cold-start loader for the feature window cache: resample the user's recent readings"""
+    readings = load_user_readings(user_id)
+    if not readings['glucose']:
+        return None
+    resampled = resample_user_readings(
+        readings['glucose'], readings['insulin'], readings['meals'], readings['vitals']
+    )
+    end = datetime.fromisoformat(resampled['window_end']).timestamp()
+    return resampled, end
+
+# Per-user rolling feature windows, updated by the ingest endpoints
+feature_cache = FeatureWindowCache(
+    loader=rebuild_feature_window,
+    max_users=int(os.environ.get('FEATURE_CACHE_MAX_USERS', 10000)),
+    idle_seconds=float(os.environ.get('FEATURE_CACHE_IDLE_SECONDS', 6 * 3600))
+)
+
+# Buffered writer filling the hourly vitals buckets (POST /api/vitals/samples)
+vitals_writer = VitalsBucketWriter(
+    vitals_buckets,
+    max_pending=int(os.environ.get('VITALS_BUFFER_SAMPLES', 5000)),
+    flush_interval=float(os.environ.get('VITALS_FLUSH_SECONDS', 2)),
+    max_buffered=int(os.environ.get('VITALS_BUFFER_MAX_SAMPLES', 50000))
+).start()
+
+# Derived glucose views (chart series, AGP), invalidated by readings in their range
+glucose_view_cache = UserResultCache(
+    max_entries=int(os.environ.get('GLUCOSE_VIEW_CACHE_SIZE', 2048)),
+    ttl_seconds=float(os.environ.get('GLUCOSE_VIEW_CACHE_TTL_SECONDS', 300))
+)
+
+def invalidate_glucose_views(docs):
+    """Drop cached views whose range covers any of the new readings"""
+    timestamps = {}
+    for doc in docs:
+        timestamps.setdefault(doc.get('user_id'), []).append(doc['timestamp'])
+    for user_id, user_timestamps in timestamps.items():
+        glucose_view_cache.invalidate(user_id, user_timestamps)
+        if user_id is not None:
+            # Views requested without a user_id span every user's readings
+            glucose_view_cache.invalidate(None, user_timestamps)
+
+EVENT_COLLECTIONS = {
+    'glucose': glucose_readings,
+    'insulin': insulin_doses,
+    'meal': meal_entries,
+    'activity': activity_entries,
+    'vitals': vitals_entries,
+}
+
+def on_events_written(kind, docs):
+    """
+    Derived state that must follow stored events (not the in-memory feature
+    windows). The events are already stored, so a failure here is logged and
+    never fails the request: a retried POST would insert a duplicate, while
+    cached views expire and rollups can be rebuilt (python rollups.py).
+    """
+    if kind != 'glucose':
+        return
+    try:
+        invalidate_glucose_views(docs)
+    except Exception:
+        logger.exception(f"Glucose view invalidation failed for {len(docs)} readings")
+    try:
+        update_rollups(glucose_rollups, docs)
+    except Exception:
+        logger.exception(f"Glucose rollup update failed for {len(docs)} readings; rebuild with rollups.py")
+
+# Optional write-behind ingest: single-record POSTs are queued and inserted in batches
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'false').lower() == 'true'
+write_behind = WriteBehindQueue(
+    EVENT_COLLECTIONS,
+    max_queue=int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_MS', 200)) / 1000,
+    submit_timeout=float(os.environ.get('WRITE_BEHIND_SUBMIT_TIMEOUT', 1)),
+    # Base path: each worker process spools to <path>.<pid>
+    spool_path=os.environ.get('WRITE_BEHIND_SPOOL') or None,
+    fsync=os.environ.get('WRITE_BEHIND_FSYNC', 'false').lower() == 'true',
+    on_written=on_events_written
+).start() if WRITE_BEHIND else None
+
+def store_event(kind, data):
+    """
+    Persist one validated event; returns (id, status code).
+
+    With write-behind the event is queued and 202 returned once it is
+    accepted (raises WriteBehindFull when the queue stays full); otherwise it
+    is inserted before responding with 201.
+    """
+    if write_behind is not None:
+        return write_behind.submit(kind, data), 202
+    result = EVENT_COLLECTIONS[kind].insert_one(data)
+    on_events_written(kind, [data])
+    return result.inserted_id, 201
+
+def queue_full_response():
+    response = jsonify({'error': 'Ingest queue is full, retry later'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def is_timestamped_payload(data):
+    return isinstance(data, dict) and ('readings' in data or data.get('source') == 'db')
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     if request.method == 'POST':
         try:
             data = request.get_json()
             
-            # Helper function to pad and interpolate data
-            def interpolate_data(input_data, target_length=12):
-                if len(input_data) >= target_length:
-                    return input_data[-target_length:]
-                
-                # If no data, return default
-                if len(input_data) == 0:
-                    return [statistics.mean(input_data) if input_data else 120] * target_length
-                
-                # Linear interpolation to fill missing points
-                interpolated = []
-                for i in range(target_length):
-                    # Calculate the index in the original data
-                    orig_index = (i * len(input_data)) / target_length
-                    
-                    # Get surrounding indices
-                    lower_index = int(orig_index)
-                    upper_index = min(lower_index + 1, len(input_data) - 1)
-                    
-                    # Linear interpolation
-                    if lower_index == upper_index:
-                        interpolated.append(input_data[lower_index])
-                    else:
-                        lower_value = input_data[lower_index]
-                        upper_value = input_data[upper_index]
-                        fraction = orig_index - lower_index
-                        interpolated_value = lower_value + fraction * (upper_value - lower_value)
-                        interpolated.append(interpolated_value)
-                
-                return interpolated
-            
-            # Extract and interpolate data
-            glucose_readings = interpolate_data(
-                data.get('glucose_readings', []), 
-                target_length=12
-            )
+            # Fast path: read the user's cached feature window
+            if data.get('source') == 'cache':
+                if not data.get('user_id'):
+                    return jsonify({'error': 'user_id is required for cached predictions'}), 400
+                features = feature_cache.window(data['user_id'], get_feature_columns())
+                if features is None:
+                    return jsonify({'error': 'Need at least 12 glucose readings (1 hour of data)'}), 400
+                return jsonify(predict_from_features(features))
             
-            insulin_data = {
-                'basal': interpolate_data(
-                    data.get('insulin', {}).get('basal', []), 
-                    target_length=12
-                ),
-                'bolus': interpolate_data(
-                    data.get('insulin', {}).get('bolus', []), 
-                    target_length=12
-                )
-            }
-            
-            carb_data = interpolate_data(
-                data.get('carbs', []), 
-                target_length=12
-            )
-            
-            activity_data = interpolate_data(
-                data.get('activity', []), 
-                target_length=12
-            )
-            
-            # Use default values if no data
-            heart_rate_data = interpolate_data(
-                data.get('heart_rate', []), 
-                target_length=12
-            ) or [70] * 12
-            
-            gsr_data = interpolate_data(
-                data.get('gsr', []), 
-                target_length=12
-            ) or [1] * 12
-            
-            # Prepare data for model
-            prediction_data = {
-                'glucose_readings': glucose_readings,
-                'insulin': insulin_data,
-                'carbs': carb_data,
-                'activity': activity_data,
-                'heart_rate': heart_rate_data,
-                'gsr': gsr_data
-            }
+            # Prepare data for model: resample timestamped readings, or
+            # stretch positional lists to 12 points as before
+            timestamped = is_timestamped_payload(data)
+            try:
+                if timestamped:
+                    prediction_data = prepare_timestamped_prediction_data(data)
+                else:
+                    prediction_data = prepare_prediction_data(data)
+            except (KeyError, ValueError, TypeError) as e:
+                return jsonify({'error': f'Invalid prediction input: {e}'}), 400
             
             # Process prediction
             prediction_result = predict_glucose_events(
@@ -129,11 +395,116 @@ def predict():
                 prediction_data['gsr']
             )
             
+            if timestamped:
+                prediction_result['data_quality'] = {
+                    'window_end': prediction_data['window_end'],
+                    'gaps': prediction_data['gaps']
+                }
+            
             return jsonify(prediction_result)
             
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Score many patient windows in one request.
+
+    Body: {"windows": [{"patient_id": ..., <same fields as /api/predict>}, ...]}
+    (a bare list of windows is also accepted). Each window is interpolated,
+    the batch is preprocessed and run through the model in one call, and
+    per-item errors are reported without failing the whole batch.
+    """
+    try:
+        data = request.get_json()
+        windows = data.get('windows') if isinstance(data, dict) else data
+        if not isinstance(windows, list) or not windows:
+            return jsonify({'error': 'A non-empty list of windows is required'}), 400
+        if len(windows) > PREDICT_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'At most {PREDICT_BATCH_MAX_ITEMS} windows per batch'}), 413
+        
+        results = [None] * len(windows)
+        prepared = []
+        prepared_indices = []
+        for i, window in enumerate(windows):
+            try:
+                if is_timestamped_payload(window):
+                    prepared.append(prepare_timestamped_prediction_data(window))
+                else:
+                    prepared.append(prepare_prediction_data(window))
+                prepared_indices.append(i)
+            except Exception as e:
+                results[i] = {'error': f'Invalid window: {e}'}
+        
+        for i, result in zip(prepared_indices, predict_glucose_events_batch(prepared)):
+            results[i] = result
+        
+        response = []
+        for i, (window, result) in enumerate(zip(windows, results)):
+            item = {'index': i, **result}
+            if isinstance(window, dict) and 'patient_id' in window:
+                item['patient_id'] = window['patient_id']
+            response.append(item)
+        
+        return jsonify({
+            'results': response,
+            'count': len(response),
+            'errors': sum(1 for item in response if 'error' in item)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict/stats', methods=['GET'])
+def predict_stats():
+    """Inference scheduler histograms, worker pool, feature window and prediction cache counters"""
+    return jsonify({
+        'batching': get_batching_stats(),
+        'inference_pool': get_inference_pool_stats(),
+        'feature_cache': feature_cache.stats(),
+        'glucose_view_cache': glucose_view_cache.stats(),
+        'vitals_buffer': vitals_writer.stats(),
+        'write_behind': write_behind.stats() if write_behind is not None else None,
+        'prediction_cache': get_prediction_cache_stats()
+    })
+
+def history_response(collection, kind, key):
+    """
+    Newest-first history page for a GET endpoint.
+
+    Query params: user_id, since (ISO timestamp, default 24 hours ago), limit
+    (page size, default 100) and cursor (the next_cursor of the previous page).
+    The body is streamed from the cursor instead of built in memory.
+    """
+    try:
+        user_id = request.args.get('user_id')
+        limit = int(request.args.get('limit', 100))
+        
+        # Get entries from the last 24 hours by default
+        since = request.args.get('since')
+        if since:
+            since_date = datetime.fromisoformat(since)
+        else:
+            since_date = datetime.utcnow() - timedelta(hours=24)
+        
+        page_token = request.args.get('cursor')
+        after = decode_cursor(page_token) if page_token else None
+        
+        query = {'timestamp': {'$gte': since_date}}
+        if user_id:
+            query['user_id'] = user_id
+            
+        # Projected cursor streamed to the client in chunks
+        cursor = find_history(collection, kind, query, limit, after)
+        body = stream_history(key, cursor, limit)
+        return Response(stream_with_context(body), mimetype='application/json')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/glucose', methods=['POST', 'GET'])
 def glucose_endpoint():
     """Endpoint to save or retrieve glucose readings"""
@@ -151,42 +522,22 @@ def glucose_endpoint():
             else:
                 data['timestamp'] = datetime.fromisoformat(data['timestamp'])
             
-            # Insert into database
-            result = glucose_readings.insert_one(data)
+            # Insert into database (or queue it with write-behind)
+            inserted_id, status = store_event('glucose', data)
+            feature_cache.add_glucose(data.get('user_id'), data['timestamp'], data['value'])
             
             return jsonify({
                 'message': 'Glucose reading saved successfully',
-                'id': str(result.inserted_id)
-            }), 201
+                'id': str(inserted_id)
+            }), status
             
+        except WriteBehindFull:
+            return queue_full_response()
         except Exception as e:
             return jsonify({'error': str(e)}), 500
             
     elif request.method == 'GET':
-        try:
-            # Get user_id from query params
-            user_id = request.args.get('user_id')
-            limit = int(request.args.get('limit', 100))
-            
-            # Get readings from the last 24 hours by default
-            since = request.args.get('since')
-            if since:
-                since_date = datetime.fromisoformat(since)
-            else:
-                since_date = datetime.utcnow() - timedelta(hours=24)
-            
-            # Query database
-            query = {'timestamp': {'$gte': since_date}}
-            if user_id:
-                query['user_id'] = user_id
-                
-            results = list(glucose_readings.find(query).sort('timestamp', -1).limit(limit))
-            
-            # Convert ObjectId to string for JSON serialization
-            return json.dumps({'readings': results}, default=json_serialize), 200, {'Content-Type': 'application/json'}
-            
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        return history_response(glucose_readings, 'glucose', 'readings')
 
 @app.route('/api/insulin', methods=['POST', 'GET'])
 def insulin_endpoint():
@@ -205,39 +556,22 @@ def insulin_endpoint():
             else:
                 data['timestamp'] = datetime.fromisoformat(data['timestamp'])
             
-            # Insert into database
-            result = insulin_doses.insert_one(data)
+            # Insert into database (or queue it with write-behind)
+            inserted_id, status = store_event('insulin', data)
+            feature_cache.add_insulin(data.get('user_id'), data['timestamp'], data['dose'], data['insulin_type'])
             
             return jsonify({
                 'message': 'Insulin dose saved successfully',
-                'id': str(result.inserted_id)
-            }), 201
+                'id': str(inserted_id)
+            }), status
             
+        except WriteBehindFull:
+            return queue_full_response()
         except Exception as e:
             return jsonify({'error': str(e)}), 500
             
     elif request.method == 'GET':
-        try:
-            # Similar to glucose endpoint
-            user_id = request.args.get('user_id')
-            limit = int(request.args.get('limit', 100))
-            
-            since = request.args.get('since')
-            if since:
-                since_date = datetime.fromisoformat(since)
-            else:
-                since_date = datetime.utcnow() - timedelta(hours=24)
-            
-            query = {'timestamp': {'$gte': since_date}}
-            if user_id:
-                query['user_id'] = user_id
-                
-            results = list(insulin_doses.find(query).sort('timestamp', -1).limit(limit))
-            
-            return json.dumps({'doses': results}, default=json_serialize), 200, {'Content-Type': 'application/json'}
-            
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        return history_response(insulin_doses, 'insulin', 'doses')
 
 @app.route('/api/meal', methods=['POST', 'GET'])
 def meal_endpoint():
@@ -256,21 +590,22 @@ def meal_endpoint():
             else:
                 data['timestamp'] = datetime.fromisoformat(data['timestamp'])
             
-            # Insert into database
-            result = meal_entries.insert_one(data)
+            # Insert into database (or queue it with write-behind)
+            inserted_id, status = store_event('meal', data)
+            feature_cache.add_meal(data.get('user_id'), data['timestamp'], data['carbs'])
             
             return jsonify({
                 'message': 'Meal entry saved successfully',
-                'id': str(result.inserted_id)
-            }), 201
+                'id': str(inserted_id)
+            }), status
             
+        except WriteBehindFull:
+            return queue_full_response()
         except Exception as e:
             return jsonify({'error': str(e)}), 500
             
     elif request.method == 'GET':
-        # Similar implementation as above endpoints
-        # Get recent meal entries
-        pass
+        return history_response(meal_entries, 'meal', 'meals')
 
 @app.route('/api/activity', methods=['POST', 'GET'])
 def activity_endpoint():
@@ -289,20 +624,21 @@ def activity_endpoint():
             else:
                 data['timestamp'] = datetime.fromisoformat(data['timestamp'])
             
-            # Insert into database
-            result = activity_entries.insert_one(data)
+            # Insert into database (or queue it with write-behind)
+            inserted_id, status = store_event('activity', data)
             
             return jsonify({
                 'message': 'Activity entry saved successfully',
-                'id': str(result.inserted_id)
-            }), 201
+                'id': str(inserted_id)
+            }), status
             
+        except WriteBehindFull:
+            return queue_full_response()
         except Exception as e:
             return jsonify({'error': str(e)}), 500
             
     elif request.method == 'GET':
-        # Similar implementation as above endpoints
-        pass
+        return history_response(activity_entries, 'activity', 'activities')
 
 @app.route('/api/vitals', methods=['POST', 'GET'])
 def vitals_endpoint():
@@ -317,20 +653,365 @@ def vitals_endpoint():
             else:
                 data['timestamp'] = datetime.fromisoformat(data['timestamp'])
             
-            # Insert into database
-            result = vitals_entries.insert_one(data)
+            # Insert into database (or queue it with write-behind)
+            inserted_id, status = store_event('vitals', data)
+            feature_cache.add_vitals(data.get('user_id'), data['timestamp'], data.get('heart_rate'), data.get('gsr'))
             
             return jsonify({
                 'message': 'Vitals entry saved successfully',
-                'id': str(result.inserted_id)
-            }), 201
+                'id': str(inserted_id)
+            }), status
             
+        except WriteBehindFull:
+            return queue_full_response()
         except Exception as e:
             return jsonify({'error': str(e)}), 500
             
     elif request.method == 'GET':
-        # Similar implementation as above endpoints
-        pass
+        return history_response(vitals_entries, 'vitals', 'vitals')
+
+# Longest range GET /api/vitals/samples returns in one response
+VITALS_MAX_HOURS = int(os.environ.get('VITALS_MAX_HOURS', 24))
+
+def parse_vitals_samples(data):
+    """(timestamps, heart_rate, gsr) from columnar arrays or a list of {timestamp, heart_rate, gsr}"""
+    if 'samples' in data:
+        samples = data['samples']
+        if not isinstance(samples, list):
+            raise ValueError('samples must be a list')
+        return ([s['timestamp'] for s in samples],
+                [s.get('heart_rate') for s in samples],
+                [s.get('gsr') for s in samples])
+    if 'timestamp' not in data:
+        raise ValueError('Expected samples or timestamp/heart_rate/gsr arrays')
+    return data['timestamp'], data.get('heart_rate'), data.get('gsr')
+
+@app.route('/api/vitals/samples', methods=['POST', 'GET'])
+def vitals_samples_endpoint():
+    """
+    High-frequency heart rate / GSR samples stored in hourly buckets.
+
+    POST {"user_id", "samples": [{timestamp, heart_rate, gsr}, ...]} or
+    columnar {"user_id", "timestamp": [...], "heart_rate": [...], "gsr": [...]}
+    (timestamps as ISO strings or epoch seconds). Samples are buffered and
+    written in batches, so the response is 202 (503 with Retry-After while
+    the buffer is full, e.g. when the database is unreachable).
+
+    GET ?user_id=&start=&end=&resolution= returns arrays for the range
+    (epoch seconds, null where not measured), averaged per `resolution`
+    seconds when given.
+    """
+    if request.method == 'POST':
+        try:
+            data = request.get_json()
+            if not isinstance(data, dict) or not data.get('user_id'):
+                return jsonify({'error': 'user_id is required'}), 400
+            timestamps, heart_rate, gsr = parse_vitals_samples(data)
+            accepted = vitals_writer.add(data['user_id'], timestamps, heart_rate, gsr)
+            if accepted:
+                feature_cache.add_vitals(
+                    data['user_id'], timestamps[-1],
+                    heart_rate[-1] if heart_rate else None, gsr[-1] if gsr else None
+                )
+            return jsonify({'message': 'Vitals samples accepted', 'accepted': accepted}), 202
+            
+        except VitalsBufferFull:
+            return queue_full_response()
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+            
+    elif request.method == 'GET':
+        try:
+            user_id = request.args.get('user_id')
+            if not user_id:
+                raise ValueError('user_id is required')
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow()
+            start = (datetime.fromisoformat(request.args['start']) if request.args.get('start')
+                     else end - timedelta(hours=1))
+            if not timedelta(0) < end - start <= timedelta(hours=VITALS_MAX_HOURS):
+                raise ValueError(f'The range must be positive and at most {VITALS_MAX_HOURS} hours')
+            resolution = int(request.args.get('resolution', 0))
+            
+            samples = read_vitals(vitals_buckets, user_id, start, end, writer=vitals_writer)
+            if resolution > 0:
+                samples = step_means(samples, resolution)
+            return jsonify({
+                'user_id': user_id,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'samples': len(samples['timestamp']),
+                **{name: [None if math.isnan(v) else v for v in values.tolist()] for name, values in samples.items()}
+            })
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+@app.route('/api/vitals/hourly', methods=['GET'])
+def vitals_hourly_endpoint():
+    """Per-hour sample count and heart rate / GSR min, max and mean from the bucket headers"""
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            raise ValueError('user_id is required')
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        start = (datetime.fromisoformat(request.args['start']) if request.args.get('start')
+                 else end - timedelta(hours=24))
+        hours = hourly_summary(vitals_buckets, user_id, start, end)
+        return json.dumps({'user_id': user_id, 'hours': hours}, default=json_serialize), 200, {'Content-Type': 'application/json'}
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Bulk ingest: records validated and written per chunk, and an upper bound per request
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+BULK_MAX_RECORDS = int(os.environ.get('BULK_MAX_RECORDS', 100000))
+
+def invalidate_feature_windows(docs):
+    """Backfilled readings arrive out of order - rebuild affected users' windows on next read"""
+    for user_id in {doc.get('user_id') for doc in docs}:
+        if user_id:
+            feature_cache.invalidate(user_id)
+
+def bulk_inserted_callback(kind):
+    def on_inserted(docs):
+        if kind != 'activity':
+            invalidate_feature_windows(docs)
+        on_events_written(kind, docs)
+    return on_inserted
+
+@app.route('/api/<kind>/bulk', methods=['POST'])
+def bulk_endpoint(kind):
+    """
+    Bulk ingest for glucose, insulin, meal, activity and vitals records.
+
+    Accepts a JSON array (or {"records": [...]}) or streamed NDJSON
+    (Content-Type: application/x-ndjson), one record per line. Records use the
+    same fields as the single-record endpoints; `user_id` in the query string
+    applies to records without one.
+    """
+    collection = EVENT_COLLECTIONS.get(kind)
+    if collection is None:
+        return jsonify({'error': f'Unknown record type: {kind}'}), 404
+    try:
+        mimetype = request.mimetype or ''
+        if mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            records = iter_ndjson(request.stream)
+        else:
+            payload = request.get_json(silent=True)
+            if payload is None:
+                return jsonify({'error': 'Expected a JSON array or NDJSON body'}), 400
+            records = iter_json(payload)
+
+        summary = bulk_insert(
+            collection, kind, records,
+            chunk_size=BULK_CHUNK_SIZE,
+            max_records=BULK_MAX_RECORDS,
+            default_user_id=request.args.get('user_id'),
+            on_inserted=bulk_inserted_callback(kind)
+        )
+        if summary['received'] == 0:
+            return jsonify({'error': 'No records received', **summary}), 400
+        status = 201 if summary['failed'] == 0 else 207 if summary['inserted'] else 400
+        return jsonify(summary), status
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Point budget for chart series and the longest range a chart can request
+CHART_DEFAULT_POINTS = int(os.environ.get('CHART_DEFAULT_POINTS', 300))
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 2000))
+CHART_MAX_DAYS = int(os.environ.get('CHART_MAX_DAYS', 90))
+
+@app.route('/api/chart/glucose', methods=['GET'])
+def glucose_chart():
+    """
+    Glucose series for long-range charts, downsampled server-side.
+
+    Query params: user_id, days (default 1), points (budget, default 300)
+    and method ('lttb' or 'minmax'). Results are cached per (user, range,
+    budget, method) until a reading in the range arrives or the TTL passes.
+    """
+    try:
+        user_id = request.args.get('user_id')
+        days = float(request.args.get('days', 1))
+        points = int(request.args.get('points', CHART_DEFAULT_POINTS))
+        method = request.args.get('method', 'lttb')
+        if not 0 < days <= CHART_MAX_DAYS:
+            raise ValueError(f'days must be between 0 and {CHART_MAX_DAYS}')
+        if not 3 <= points <= CHART_MAX_POINTS:
+            raise ValueError(f'points must be between 3 and {CHART_MAX_POINTS}')
+        if method not in DOWNSAMPLERS:
+            raise ValueError(f"method must be one of: {', '.join(DOWNSAMPLERS)}")
+        
+        params = ('chart', days, points, method)
+        cached = glucose_view_cache.get(user_id, params)
+        if cached is not None:
+            return jsonify(cached)
+        
+        start = datetime.utcnow() - timedelta(days=days)
+        seconds, values = load_glucose_series(glucose_readings, user_id, start)
+        times, chart_values = downsample(seconds, values, points, method)
+        
+        result = {
+            'glucose_data': [{'time': t, 'value': v} for t, v in zip(to_iso(times), chart_values.tolist())],
+            'method': method,
+            'points': len(times),
+            'raw_points': len(seconds),
+            'start': start.isoformat(),
+            'cached': False
+        }
+        glucose_view_cache.put(user_id, params, result, start=start)
+        return jsonify(result)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Longest range the stats endpoint answers from rollups
+STATS_MAX_DAYS = int(os.environ.get('STATS_MAX_DAYS', 365))
+
+@app.route('/api/stats/glucose', methods=['GET'])
+def glucose_stats_endpoint():
+    """
+    Time-in-range, mean, SD, CV and GMI from the hourly/daily rollups.
+
+    Query params: user_id (required), days (default 14; whole UTC days up to
+    now), period ('day' or 'hour') and series=1 for per-bucket values.
+    """
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            raise ValueError('user_id is required')
+        days = int(request.args.get('days', 14))
+        if not 1 <= days <= STATS_MAX_DAYS:
+            raise ValueError(f'days must be between 1 and {STATS_MAX_DAYS}')
+        period = request.args.get('period', 'day')
+        series = request.args.get('series', '').lower() in ('1', 'true', 'yes')
+        
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=days - 1)
+        result = glucose_stats(glucose_rollups, user_id, start, period=period, series=series)
+        result.update({'user_id': user_id, 'start': start, 'days': days})
+        
+        return json.dumps(result, default=json_serialize), 200, {'Content-Type': 'application/json'}
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# AGP window bounds (14 days is the clinical standard)
+AGP_DEFAULT_DAYS = 14
+AGP_MAX_DAYS = int(os.environ.get('AGP_MAX_DAYS', 90))
+
+@app.route('/api/agp', methods=['GET'])
+def agp_endpoint():
+    """
+    Ambulatory Glucose Profile: 5/25/50/75/95th percentiles per 5-minute
+    time-of-day slot.
+
+    Query params: user_id (required), days (default 14), end (ISO timestamp,
+    default now) and tz_offset_minutes (local time for the time of day).
+    Cached per user and window until a reading inside the window arrives.
+    """
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            raise ValueError('user_id is required')
+        days = int(request.args.get('days', AGP_DEFAULT_DAYS))
+        if not 1 <= days <= AGP_MAX_DAYS:
+            raise ValueError(f'days must be between 1 and {AGP_MAX_DAYS}')
+        end_param = request.args.get('end')
+        end = datetime.fromisoformat(end_param) if end_param else None
+        tz_offset = int(request.args.get('tz_offset_minutes', 0))
+        if not -14 * 60 <= tz_offset <= 14 * 60:
+            raise ValueError('tz_offset_minutes must be between -840 and 840')
+        
+        params = ('agp', days, end_param, tz_offset)
+        cached = glucose_view_cache.get(user_id, params)
+        if cached is not None:
+            return jsonify(cached)
+        
+        start = (end or datetime.utcnow()) - timedelta(days=days)
+        seconds, values = load_glucose_series(glucose_readings, user_id, start, end)
+        result = {
+            'user_id': user_id,
+            'start': start.isoformat(),
+            'end': end.isoformat() if end else None,
+            'days': days,
+            'tz_offset_minutes': tz_offset,
+            **build_agp(seconds, values, days, tz_offset),
+            'cached': False
+        }
+        glucose_view_cache.put(user_id, params, result, start=start, end=end)
+        return jsonify(result)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Bounds for the variability metrics endpoint
+METRICS_MAX_DAYS = int(os.environ.get('METRICS_MAX_DAYS', 90))
+METRICS_MAX_USERS = int(os.environ.get('METRICS_MAX_USERS', 100))
+
+@app.route('/api/metrics/glucose', methods=['GET'])
+def glucose_metrics():
+    """
+    Glycemic variability indices (MAGE, LBGI/HBGI, CONGA, MODD, J-index,
+    ADRR, mean/SD/CV) over whole UTC days ending today.
+
+    Query params: user_id (repeatable, scored together), days (default 14)
+    and conga_hours (default 1).
+    """
+    try:
+        user_ids = list(dict.fromkeys(request.args.getlist('user_id')))
+        if not user_ids:
+            raise ValueError('user_id is required')
+        if len(user_ids) > METRICS_MAX_USERS:
+            raise ValueError(f'At most {METRICS_MAX_USERS} users per request')
+        days = int(request.args.get('days', 14))
+        if not 1 <= days <= METRICS_MAX_DAYS:
+            raise ValueError(f'days must be between 1 and {METRICS_MAX_DAYS}')
+        conga_hours = int(request.args.get('conga_hours', 1))
+        if not 1 <= conga_hours <= 24:
+            raise ValueError('conga_hours must be between 1 and 24')
+        
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=days - 1)
+        grid = load_glucose_grid(glucose_readings, user_ids, start, days * STEPS_PER_DAY,
+                                 step_seconds=STEP_MINUTES * 60)
+        metrics = variability_metrics(grid, conga_hours=conga_hours)
+        
+        users = {}
+        for row, user_id in enumerate(user_ids):
+            values = {name: float(array[row]) for name, array in metrics.items()}
+            users[user_id] = {
+                name: (None if math.isnan(value) else int(value) if name == 'readings' else round(value, 2))
+                for name, value in values.items()
+            }
+        return jsonify({'start': start.isoformat(), 'days': days, 'conga_hours': conga_hours, 'users': users})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+RECENT_COLLECTIONS = {
+    'glucose': glucose_readings,
+    'insulin': insulin_doses,
+    'meal': meal_entries,
+    'activity': activity_entries,
+}
 
 @app.route('/api/data/recent', methods=['GET'])
 def recent_data():
@@ -346,56 +1027,8 @@ def recent_data():
         if user_id:
             query['user_id'] = user_id
             
-        # Get recent data of each type
-        recent_glucose = list(glucose_readings.find(query).sort('timestamp', -1).limit(20))
-        recent_insulin = list(insulin_doses.find(query).sort('timestamp', -1).limit(10))
-        recent_meals = list(meal_entries.find(query).sort('timestamp', -1).limit(10))
-        recent_activity = list(activity_entries.find(query).sort('timestamp', -1).limit(5))
-        
-        # Create timeline of all events
-        timeline = []
-        for reading in recent_glucose:
-            timeline.append({
-                'type': 'glucose',
-                'value': reading['value'],
-                'timestamp': reading['timestamp'],
-                'id': str(reading['_id'])
-            })
-            
-        for dose in recent_insulin:
-            timeline.append({
-                'type': 'insulin',
-                'value': dose['dose'],
-                'insulin_type': dose['insulin_type'],
-                'timestamp': dose['timestamp'],
-                'id': str(dose['_id'])
-            })
-            
-        for meal in recent_meals:
-            timeline.append({
-                'type': 'meal',
-                'value': meal['carbs'],
-                'meal_type': meal.get('meal_type', ''),
-                'timestamp': meal['timestamp'],
-                'id': str(meal['_id'])
-            })
-            
-        for activity in recent_activity:
-            timeline.append({
-                'type': 'activity',
-                'value': activity['duration'],
-                'activity_type': activity['activity_type'],
-                'timestamp': activity['timestamp'],
-                'id': str(activity['_id'])
-            })
-            
-        # Sort timeline by timestamp (newest first)
-        timeline.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        response = {
-            'timeline': timeline,
-            'glucose_data': [{'time': g['timestamp'].strftime('%H:%M'), 'value': g['value']} for g in sorted(recent_glucose, key=lambda x: x['timestamp'])]
-        }
+        # Timeline and chart series in one round-trip (or parallel projected queries)
+        response = fetch_recent(RECENT_COLLECTIONS, query)
         
         return json.dumps(response, default=json_serialize), 200, {'Content-Type': 'application/json'}
         
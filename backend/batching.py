@@ -0,0 +1,182 @@
+# batching.py
+import threading
+import time
+import queue
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class Histogram:
+    """Fixed-bucket histogram used to report batching statistics"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            index = len(self.bounds)
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    index = i
+                    break
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def quantile(self, q):
+        """Approximate quantile from the bucket upper bounds"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            target = q * self.count
+            running = 0
+            for i, bucket_count in enumerate(self.counts):
+                running += bucket_count
+                if running >= target:
+                    return self.bounds[i] if i < len(self.bounds) else float('inf')
+            return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            count = self.count
+            mean = self.total / count if count else None
+        return {
+            'count': count,
+            'mean': mean,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': buckets
+        }
+
+
+class MicroBatcher:
+    """
+    Collect concurrent inference requests into a single stacked forward pass.
+
+    Callers submit one input window (e.g. [12, 12]) and block on the returned
+    future. A background thread waits for up to `max_wait_ms` after the first
+    queued window (or until `max_batch_size` windows are queued), runs
+    `predict_fn` once on the stacked [N, ...] array and hands each caller its row.
+
+    With `concurrency` > 1 that many dispatcher threads collect batches, so
+    several batches can be in flight at once (e.g. one per inference worker).
+
+    After close(), submit() no longer queues (or restarts the dispatchers):
+    late callers are served by an unbatched `predict_fn` call of their own.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, concurrency=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.concurrency = max(1, int(concurrency))
+        self._queue = queue.Queue()
+        self._threads = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.queue_wait_histogram = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000])
+
+    def _ensure_started(self):
+        if self._threads is not None:
+            return
+        with self._start_lock:
+            if self._threads is None and not self._closed:
+                threads = [
+                    threading.Thread(target=self._run, name=f'micro-batcher-{i}', daemon=True)
+                    for i in range(self.concurrency)
+                ]
+                for thread in threads:
+                    thread.start()
+                self._threads = threads
+
+    def submit(self, window):
+        """Queue a single input window and return a Future for its output row"""
+        self._ensure_started()
+        future = Future()
+        # Checked under the lock close() takes, so nothing is queued behind the stop sentinels
+        with self._start_lock:
+            if not self._closed:
+                self._queue.put((np.asarray(window), future, time.perf_counter()))
+                return future
+        try:
+            future.set_result(self.predict_fn(np.asarray(window)[np.newaxis])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def predict(self, window, timeout=None):
+        """Blocking helper: submit a window and wait for its output row"""
+        return self.submit(window).result(timeout=timeout)
+
+    def close(self):
+        """Stop the dispatcher threads once the requests already queued are served"""
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = self._threads
+            for _ in threads or ():
+                self._queue.put(None)
+
+    def _collect(self):
+        # Block until the first request arrives, then gather more until full or timed out
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutting down: leave the sentinel for the next collection
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            started = time.perf_counter()
+
+            self.batch_size_histogram.observe(len(batch))
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((started - enqueued_at) * 1000.0)
+
+            try:
+                outputs = self.predict_fn(np.stack([window for window, _, _ in batch]))
+                for i, (_, future, _) in enumerate(batch):
+                    future.set_result(outputs[i])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'concurrency': self.concurrency,
+            'closed': self._closed,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait_ms': self.queue_wait_histogram.snapshot()
+        }
@@ -0,0 +1,619 @@
+# benchmark.py
+# Microbenchmarks for the prediction hot path.
+#
+# Usage: python benchmark.py [section ...]   (default: all sections)
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import preprocessing
+from preprocessing import build_feature_matrix, build_feature_windows, window_series
+from tests.baseline_preprocessing import BASELINE_COB_KERNEL, BASELINE_IOB_KERNEL, baseline_feature_matrix
+from tests.baseline_recent_data import recent_sequential
+from tests.reference_downsampling import lttb_reference
+from tests.reference_variability import variability_reference
+
+FEATURE_COLUMNS = np.load('models/feature_columns.npy', allow_pickle=True).tolist()
+
+
+def timeit(fn, repeat=200):
+    """Return the best-of-5 mean time per call in microseconds"""
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best * 1e6
+
+
+def random_windows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    windows = []
+    for _ in range(count):
+        windows.append((
+            list(rng.uniform(40, 400, 12)),
+            {'basal': list(rng.uniform(0, 2, 12)), 'bolus': list(rng.choice([0, 0, 0, 2.5, 8], 12))},
+            list(rng.choice([0, 0, 30, 80], 12)),
+            None,
+            list(rng.uniform(50, 150, 12)),
+            list(rng.uniform(0, 5, 12)),
+        ))
+    return windows
+
+
+def bench_preprocessing():
+    windows = random_windows(1000)
+
+    # Parity: NumPy feature builder vs the frozen original pandas implementation,
+    # with the original's truncated decay tables (see tests/test_preprocessing.py)
+    kernels = preprocessing.IOB_DECAY_KERNEL, preprocessing.COB_DECAY_KERNEL
+    preprocessing.IOB_DECAY_KERNEL, preprocessing.COB_DECAY_KERNEL = BASELINE_IOB_KERNEL, BASELINE_COB_KERNEL
+    try:
+        max_error = max(
+            float(np.max(np.abs(baseline_feature_matrix(*w, FEATURE_COLUMNS) - build_feature_matrix(*w, FEATURE_COLUMNS))))
+            for w in windows
+        )
+    finally:
+        preprocessing.IOB_DECAY_KERNEL, preprocessing.COB_DECAY_KERNEL = kernels
+    print(f"[preprocessing] parity vs original max abs error: {max_error:.2e}")
+
+    window = windows[0]
+    pandas_us = timeit(lambda: baseline_feature_matrix(*window, FEATURE_COLUMNS))
+    numpy_us = timeit(lambda: build_feature_matrix(*window, FEATURE_COLUMNS))
+    print(f"[preprocessing] pandas, 1 window:   {pandas_us:9.1f} us/window")
+    print(f"[preprocessing] numpy,  1 window:   {numpy_us:9.1f} us/window ({pandas_us / numpy_us:.1f}x)")
+
+    series = [window_series(g, ins, carbs, hr, gsr) for g, ins, carbs, _, hr, gsr in windows]
+    stacked = [np.stack(column) for column in zip(*series)]
+    batch_us = timeit(lambda: build_feature_windows(*stacked, FEATURE_COLUMNS), repeat=20) / len(windows)
+    print(f"[preprocessing] numpy, batch of {len(windows)}: {batch_us:7.2f} us/window ({pandas_us / batch_us:.1f}x)")
+    if max_error > 1e-9:
+        sys.exit(1)
+
+
+def _private_kb(pid):
+    """Private (unshared) resident memory of a process, from smaps_rollup"""
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line)
+    return sum(int(fields[k].split()[0]) for k in ('Private_Clean', 'Private_Dirty'))
+
+
+def bench_pool():
+    from inference_pool import InferencePool
+    from numpy_model import NumpyBiLSTMModel
+
+    model = NumpyBiLSTMModel.from_model_dir('models', 'glycemic_event_prediction_model.h5')
+    batches = [np.random.default_rng(i).random((32, 12, len(FEATURE_COLUMNS)), dtype=np.float32)
+               for i in range(64)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        model.predict(batch)
+    baseline = len(batches) / (time.perf_counter() - started)
+    print(f"[pool] in-process:  {baseline:8.1f} batches/s")
+
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        pool = InferencePool(model, workers=workers).start()
+        pool.predict(batches[0])  # Make sure every worker is up
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            started = time.perf_counter()
+            list(executor.map(pool.predict, batches))
+            throughput = len(batches) / (time.perf_counter() - started)
+        private = [_private_kb(pid) for pid in pool.stats()['pids']] if os.path.exists('/proc/self/smaps_rollup') else []
+        pool.close()
+        memory = f", private RSS/worker {np.mean(private) / 1024:.1f} MiB" if private else ''
+        print(f"[pool] {workers:2d} workers: {throughput:8.1f} batches/s ({throughput / baseline:.1f}x){memory}")
+
+
+def bench_tensorflow():
+    import tensorflow as tf
+    from compiled_model import CompiledModel
+
+    model = tf.keras.models.load_model('models/glycemic_event_prediction_model.h5', compile=False)
+    compiled = CompiledModel(model)
+    compiled.trace()
+
+    for size in (1, 8, 32):
+        batch = np.random.default_rng(size).random((size, 12, len(FEATURE_COLUMNS)), dtype=np.float32)
+        error = float(np.max(np.abs(model.predict(batch, verbose=0) - compiled.predict(batch))))
+        predict_us = timeit(lambda: model.predict(batch, verbose=0), repeat=20)
+        compiled_us = timeit(lambda: compiled.predict(batch), repeat=100)
+        print(f"[tensorflow] batch {size:2d}: model.predict {predict_us / 1000:7.2f} ms, "
+              f"compiled {compiled_us / 1000:6.2f} ms ({predict_us / compiled_us:.1f}x), max abs error {error:.1e}")
+
+
+def rule_cases(count, seed=0):
+    """Random inputs plus values on and around every threshold in the rules"""
+    rng = np.random.default_rng(seed)
+    glucose_edges = np.array([70, 80, 90, 100, 120, 140, 160, 180], dtype=np.float64)
+    glucose_edges = np.concatenate([glucose_edges, np.nextafter(glucose_edges, 0), np.nextafter(glucose_edges, 1000),
+                                    [36, 60, 84, 240, 400]])
+    trend_edges = np.array([-2, -1, 0, 1, 2], dtype=np.float64)
+    trend_edges = np.concatenate([trend_edges, np.nextafter(trend_edges, -10), np.nextafter(trend_edges, 10)])
+    edges = np.array([30, 2], dtype=np.float64)
+
+    def pick(values, edge_values):
+        use_edge = rng.random(count) < 0.3
+        return np.where(use_edge, rng.choice(edge_values, count), values)
+
+    current = pick(rng.uniform(30, 420, count), glucose_edges)
+    trend = pick(rng.normal(0, 3, count), trend_edges)
+    carbs = pick(rng.choice([0, 10, 25, 60, 120], count) * rng.random(count), np.concatenate([edges[:1], np.nextafter(edges[:1], 100)]))
+    bolus = pick(rng.choice([0, 1, 4, 10], count) * rng.random(count), np.concatenate([edges[1:], np.nextafter(edges[1:], 100)]))
+    return current, trend, carbs, bolus
+
+
+def bench_rules():
+    from rule_based import rule_based_scores, rule_based_scores_scalar
+
+    cases = rule_cases(200000)
+    vector = rule_based_scores(*cases)
+    mismatches = 0
+    for i, case in enumerate(zip(*cases)):
+        expected = rule_based_scores_scalar(*case)
+        if any(expected[key] != vector[key][i] for key in expected):
+            mismatches += 1
+    print(f"[rules] parity over {len(cases[0])} cases: {mismatches} mismatches")
+
+    batch = [c[:1000] for c in cases]
+    scalar_us = timeit(lambda: [rule_based_scores_scalar(*case) for case in zip(*batch)], repeat=10) / 1000
+    vector_us = timeit(lambda: rule_based_scores(*batch), repeat=50) / 1000
+    print(f"[rules] scalar: {scalar_us:6.3f} us/patient, vectorized batch of 1000: {vector_us:6.3f} us/patient "
+          f"({scalar_us / vector_us:.1f}x)")
+    if mismatches:
+        sys.exit(1)
+
+
+class _RoundTripCollection:
+    """Adds a fixed network round-trip to each find()/aggregate() on an in-process collection"""
+
+    def __init__(self, collection, rtt):
+        self._collection = collection
+        self._rtt = rtt
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        time.sleep(self._rtt)
+        return self._collection.find(*args, **kwargs)
+
+    def aggregate(self, *args, **kwargs):
+        time.sleep(self._rtt)
+        return self._collection.aggregate(*args, **kwargs)
+
+
+def _seed_recent(db, user_id='bench-user', days=14):
+    from datetime import datetime, timedelta
+
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow().replace(microsecond=0)
+    notes = 'x' * 200  # Free-text fields the timeline never reads
+    docs = {
+        'glucose': [{'user_id': user_id, 'value': float(rng.uniform(60, 250)), 'notes': notes,
+                     'timestamp': now - timedelta(minutes=5 * i)} for i in range(days * 288)],
+        'insulin': [{'user_id': user_id, 'dose': float(rng.uniform(1, 10)), 'insulin_type': 'bolus', 'notes': notes,
+                     'timestamp': now - timedelta(hours=4 * i, minutes=1)} for i in range(days * 6)],
+        'meal': [{'user_id': user_id, 'carbs': float(rng.uniform(10, 90)), 'meal_type': 'lunch', 'notes': notes,
+                  'timestamp': now - timedelta(hours=5 * i, minutes=2)} for i in range(days * 5)],
+        'activity': [{'user_id': user_id, 'activity_type': 'walking', 'duration': 30, 'notes': notes,
+                      'timestamp': now - timedelta(hours=12 * i, minutes=3)} for i in range(days * 2)],
+    }
+    collections = {}
+    for kind, rows in docs.items():
+        collection = db[f'bench_recent_{kind}']
+        collection.drop()
+        collection.insert_many(rows)
+        collection.create_index([('user_id', 1), ('timestamp', -1)])
+        collections[kind] = collection
+    return collections, {'user_id': user_id, 'timestamp': {'$gte': now - timedelta(hours=24)}}
+
+
+def _bench_database():
+    """(database, backend name) on MONGODB_URI if a server answers, else mongomock (or (None, None))"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+        return client['glycemic_benchmark'], 'mongodb'
+    except PyMongoError:
+        try:
+            import mongomock
+        except ImportError:
+            return None, None
+        return mongomock.MongoClient()['glycemic_benchmark'], 'mongomock'
+
+
+def bench_recent():
+    """
+    /api/data/recent latency: sequential full documents vs parallel projected
+    finds vs one aggregate round-trip. Uses MONGODB_URI when a server answers;
+    otherwise mongomock with RECENT_BENCH_RTT_MS (default 2 ms) per round-trip.
+    """
+    from pymongo.errors import PyMongoError
+    from recent_data import fetch_recent_aggregate, fetch_recent_parallel
+
+    rtt = float(os.environ.get('RECENT_BENCH_RTT_MS', 2)) / 1000.0
+    db, backend = _bench_database()
+    if db is None:
+        print("[recent] skipped: no MongoDB server reachable and mongomock not installed")
+        return
+    simulated = backend != 'mongodb'
+
+    collections, query = _seed_recent(db)
+    if simulated:
+        backend = f'{backend} + {rtt * 1000:.1f} ms RTT'
+        collections = {kind: _RoundTripCollection(c, rtt) for kind, c in collections.items()}
+
+    expected = recent_sequential(collections, query)
+    variants = {'sequential': recent_sequential, 'parallel': fetch_recent_parallel, 'aggregate': fetch_recent_aggregate}
+    baseline_us = None
+    for name, fetch in variants.items():
+        try:
+            result = fetch(collections, query)
+        except (PyMongoError, NotImplementedError) as e:
+            print(f"[recent] {name:10s}: unsupported on {backend} ({type(e).__name__})")
+            continue
+        same = result == expected
+        elapsed_us = timeit(lambda: fetch(collections, query), repeat=20)
+        baseline_us = baseline_us or elapsed_us
+        print(f"[recent] {name:10s}: {elapsed_us / 1000:7.2f} ms ({baseline_us / elapsed_us:.1f}x) "
+              f"on {backend}, matches original: {same}")
+
+    if not simulated:
+        for collection in collections.values():
+            collection.drop()
+
+
+def bench_history():
+    """
+    GET /api/glucose with a 10k-reading export: materialize + json.dumps vs
+    projected, chunked streaming. The cursor is simulated (documents created
+    as they are iterated, like pymongo's batches) so only the response path
+    is measured.
+    """
+    import json
+    import tracemalloc
+    from datetime import datetime, timedelta
+
+    from bson import ObjectId
+    import history
+    from history import HISTORY_FIELDS, stream_history
+
+    count = 10000
+    start = datetime(2024, 1, 1)
+
+    def cursor(projected):
+        for i in range(count):
+            doc = {'_id': ObjectId(f'{i:024x}'), 'user_id': 'bench-user', 'value': 100.0 + i % 150,
+                   'timestamp': start + timedelta(minutes=5 * i), 'device': 'cgm-0001', 'notes': 'x' * 200,
+                   'raw': list(range(16))}
+            yield {k: v for k, v in doc.items() if k in HISTORY_FIELDS['glucose'] or k == '_id'} if projected else doc
+
+    def serialize(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError
+
+    def materialized():
+        return json.dumps({'readings': list(cursor(False))}, default=serialize)
+
+    def streamed():
+        return sum(len(chunk) for chunk in stream_history('readings', cursor(True), count))
+
+    old_body = json.loads(materialized())['readings']
+    new_body = json.loads(b''.join(stream_history('readings', cursor(True), count)))['readings']
+    same = all({k: v for k, v in a.items() if k in b} == b for a, b in zip(old_body, new_body))
+    print(f"[history] projected fields match original: {same and len(old_body) == len(new_body)} "
+          f"(serializer: {'orjson' if history.orjson else 'json'})")
+
+    for name, fn in (('materialized', materialized), ('streamed', streamed)):
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        elapsed_us = timeit(fn, repeat=3)
+        print(f"[history] {name:12s}: {elapsed_us / 1000:7.1f} ms, peak allocation {peak / 2**20:6.2f} MiB for {count} readings")
+
+
+def bench_chart():
+    import json
+    from downsampling import downsample, lttb
+
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for trial in range(50):
+        n = int(rng.integers(10, 3000))
+        x = np.cumsum(rng.uniform(200, 400, n))
+        y = 120 + np.cumsum(rng.normal(0, 4, n))
+        threshold = int(rng.integers(3, n))
+        mismatches += list(lttb(x, y, threshold)) != lttb_reference(list(x), list(y), threshold)
+    print(f"[chart] LTTB parity with the reference over 50 series: {mismatches} mismatches")
+
+    for days in (1, 7, 30, 90):
+        n = days * 288
+        x = 1.7e9 + np.arange(n) * 300.0
+        y = 140 + 50 * np.sin(np.arange(n) / 40) + rng.normal(0, 8, n)
+        raw_bytes = len(json.dumps([{'time': '2024-01-01T00:00:00', 'value': round(v, 1)} for v in y]))
+        for method in ('lttb', 'minmax'):
+            elapsed_us = timeit(lambda: downsample(x, y, 300, method), repeat=10)
+            tx, ty = downsample(x, y, 300, method)
+            payload = len(json.dumps([{'time': '2024-01-01T00:00:00', 'value': round(v, 1)} for v in ty]))
+            print(f"[chart] {days:2d} days ({n:5d} readings) {method:6s}: {len(tx):3d} points, "
+                  f"{elapsed_us / 1000:6.2f} ms, payload {raw_bytes / 1024:7.1f} KiB -> {payload / 1024:5.1f} KiB")
+    if mismatches:
+        sys.exit(1)
+
+
+def bench_rollups():
+    """90-day glucose summary: raw readings pulled and reduced vs ~90 daily rollups"""
+    from datetime import datetime, timedelta
+
+    from glucose_series import load_glucose_series
+    from rollups import PERIODS, aggregate_readings, glucose_stats
+
+    db, backend = _bench_database()
+    if db is None:
+        print("[rollups] skipped: no MongoDB server reachable and mongomock not installed")
+        return
+    readings, rollups = db['bench_glucose_readings'], db['bench_glucose_rollups']
+    readings.drop()
+    rollups.drop()
+
+    rng = np.random.default_rng(0)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=89)
+    count = 90 * 288
+    values = np.clip(150 + 60 * np.sin(np.arange(count) / 50) + rng.normal(0, 20, count), 40, 400).round(1)
+    seconds = (start - datetime(1970, 1, 1)).total_seconds() + np.arange(count) * 300.0
+    readings.insert_many([{'user_id': 'bench-user', 'value': float(v), 'timestamp': start + timedelta(minutes=5 * i)}
+                          for i, v in enumerate(values)])
+    readings.create_index([('user_id', 1), ('timestamp', -1)])
+    # Same documents the ingest path / rebuild job produce
+    rollups.insert_many([
+        {'user_id': 'bench-user', 'period': period, 'start': datetime(1970, 1, 1) + timedelta(seconds=bucket), **stats}
+        for period, length in PERIODS.items() for bucket, stats in aggregate_readings(seconds, values, length)
+    ])
+    rollups.create_index([('user_id', 1), ('period', 1), ('start', 1)], unique=True)
+
+    def from_raw():
+        _, raw = load_glucose_series(readings, 'bench-user', start)
+        return raw.mean(), raw.std()
+
+    def from_rollups():
+        return glucose_stats(rollups, 'bench-user', start)
+
+    mean, sd = from_raw()
+    summary = from_rollups()
+    print(f"[rollups] 90 days on {backend}: raw mean/sd {mean:.1f}/{sd:.1f}, "
+          f"rollups {summary['mean']}/{summary['sd']} from {summary['rollups']} documents")
+    raw_us = timeit(from_raw, repeat=3)
+    rollup_us = timeit(from_rollups, repeat=20)
+    print(f"[rollups] raw {count} readings: {raw_us / 1000:7.1f} ms, rollups: {rollup_us / 1000:6.2f} ms "
+          f"({raw_us / rollup_us:.0f}x)")
+    readings.drop()
+    rollups.drop()
+
+
+def bench_agp():
+    from agp import PERCENTILES, SLOTS_PER_DAY, percentile_bands, slot_indices, slot_matrix
+
+    rng = np.random.default_rng(0)
+    count = 14 * 288
+    seconds = 1.7e9 + np.arange(count) * 300.0 + rng.normal(0, 20, count)
+    values = np.clip(150 + 60 * np.sin(np.arange(count) / 50) + rng.normal(0, 25, count), 40, 400).round(1)
+    slots = slot_indices(seconds)
+
+    def per_slot():
+        return np.array([np.percentile(values[slots == s], PERCENTILES) for s in range(SLOTS_PER_DAY)]).T
+
+    def nanpercentile():
+        return np.nanpercentile(slot_matrix(slots, values)[0], PERCENTILES, axis=1)
+
+    bands, _ = percentile_bands(seconds, values)
+    print(f"[agp] 14 days ({count} readings), max abs diff vs per-slot np.percentile: "
+          f"{float(np.max(np.abs(bands - per_slot()))):.1e}")
+    loop_us = timeit(per_slot, repeat=5)
+    nan_us = timeit(nanpercentile, repeat=5)
+    vector_us = timeit(lambda: percentile_bands(seconds, values), repeat=50)
+    print(f"[agp] per-slot loop {loop_us / 1000:6.2f} ms, nanpercentile(axis=1) {nan_us / 1000:6.2f} ms, "
+          f"vectorized {vector_us / 1000:6.2f} ms ({loop_us / vector_us:.0f}x)")
+
+
+def _synthetic_cgm(users, days, seed=0, missing=0.05):
+    rng = np.random.default_rng(seed)
+    steps = days * 288
+    t = np.arange(steps)
+    phase = rng.uniform(0, 2 * np.pi, (users, 1))
+    glucose = (150 + 50 * np.sin(2 * np.pi * t / 288 + phase) + 25 * np.sin(2 * np.pi * t / 60 + 2 * phase)
+               + np.cumsum(rng.normal(0, 2, (users, steps)), axis=1) * 0.3 + rng.normal(0, 6, (users, steps)))
+    glucose = np.clip(glucose, 40, 400)
+    glucose[rng.random((users, steps)) < missing] = np.nan
+    return glucose
+
+
+def bench_variability():
+    from variability import pad_series, variability_metrics
+
+    # Parity on ragged series (different lengths, gaps) against the loop reference
+    ragged = [row[:length]
+              for row, length in zip(_synthetic_cgm(12, 5, seed=1, missing=0.1), range(600, 1440, 70))]
+    vector = variability_metrics(pad_series(ragged))
+    max_rel = 0.0
+    for i, row in enumerate(ragged):
+        for name, expected in variability_reference(row).items():
+            got = vector[name][i]
+            if np.isnan(expected) or np.isnan(got):
+                max_rel = max(max_rel, 0.0 if np.isnan(expected) and np.isnan(got) else np.inf)
+            else:
+                max_rel = max(max_rel, abs(got - expected) / max(abs(expected), 1e-12))
+    print(f"[variability] parity vs per-user loops over {len(ragged)} ragged series: max rel error {max_rel:.1e}")
+
+    users, days = 1000, 90
+    glucose = _synthetic_cgm(users, days)
+    started = time.perf_counter()
+    variability_metrics(glucose)
+    elapsed = time.perf_counter() - started
+    sample = glucose[:2]
+    started = time.perf_counter()
+    for row in sample:
+        variability_reference(row)
+    reference_per_user = (time.perf_counter() - started) / len(sample)
+    print(f"[variability] {days} days x {users} users ({glucose.size / 1e6:.1f}M readings): {elapsed:.2f} s "
+          f"({elapsed / users * 1000:.2f} ms/user); per-user loops {reference_per_user * 1000:.0f} ms/user "
+          f"({reference_per_user * users / elapsed:.0f}x)")
+    if max_rel > 1e-9:
+        sys.exit(1)
+
+
+def bench_vitals():
+    """
+    One user-day of 1 Hz heart rate / GSR: one document per sample vs hourly
+    buckets (document count, BSON bytes, index entries and 1-hour read time).
+    """
+    from datetime import datetime, timedelta
+
+    import bson
+    from vitals_buckets import bucket_updates, read_vitals
+
+    db, backend = _bench_database()
+    if db is None:
+        print("[vitals] skipped: no MongoDB server reachable and mongomock not installed")
+        return
+    documents, buckets = db['bench_vitals_entries'], db['bench_vitals_buckets']
+    documents.drop()
+    buckets.drop()
+
+    rng = np.random.default_rng(0)
+    start = datetime(2024, 1, 1)
+    count = 86400
+    heart_rate = (70 + 10 * np.sin(np.arange(count) / 600) + rng.normal(0, 2, count)).round(1)
+    gsr = (1.5 + 0.3 * np.sin(np.arange(count) / 900) + rng.normal(0, 0.05, count)).round(3)
+    per_sample = [{'user_id': 'bench-user', 'timestamp': start + timedelta(seconds=i),
+                   'heart_rate': float(heart_rate[i]), 'gsr': float(gsr[i])} for i in range(count)]
+    documents.insert_many(per_sample)
+    documents.create_index([('user_id', 1), ('timestamp', -1), ('_id', -1)])
+
+    # Same upserts VitalsBucketWriter.flush sends (applied one by one: mongomock lacks bulk upserts)
+    epoch = (start - datetime(1970, 1, 1)).total_seconds()
+    updates = bucket_updates('bench-user', epoch + np.arange(count), {'heart_rate': heart_rate, 'gsr': gsr})
+    started = time.perf_counter()
+    for query, update in updates:
+        buckets.update_one(query, update, upsert=True)
+    flush_ms = (time.perf_counter() - started) * 1000
+    buckets.create_index([('user_id', 1), ('start', 1)], unique=True)
+
+    doc_bytes = sum(len(bson.encode(doc)) for doc in documents.find())
+    bucket_bytes = sum(len(bson.encode(doc)) for doc in buckets.find())
+    bucket_count = buckets.count_documents({})
+    print(f"[vitals] {count} samples on {backend}: per-sample {count} docs / {doc_bytes / 2**20:.2f} MiB / "
+          f"{2 * count} index entries; buckets {bucket_count} docs / {bucket_bytes / 2**20:.2f} MiB / "
+          f"{2 * bucket_count} index entries ({count / bucket_count:.0f}x fewer, {doc_bytes / bucket_bytes:.1f}x smaller)")
+
+    hour_start, hour_end = start + timedelta(hours=12), start + timedelta(hours=13)
+
+    def read_documents():
+        docs = list(documents.find({'user_id': 'bench-user', 'timestamp': {'$gte': hour_start, '$lt': hour_end}},
+                                   {'_id': 0, 'timestamp': 1, 'heart_rate': 1, 'gsr': 1}))
+        return np.array([d['heart_rate'] for d in docs])
+
+    def read_buckets():
+        return read_vitals(buckets, 'bench-user', hour_start, hour_end)['heart_rate']
+
+    same = np.array_equal(read_documents(), read_buckets())
+    documents_us = timeit(read_documents, repeat=2)
+    buckets_us = timeit(read_buckets, repeat=20)
+    print(f"[vitals] 1-hour read: per-sample {documents_us / 1000:7.1f} ms, buckets {buckets_us / 1000:6.2f} ms "
+          f"({documents_us / buckets_us:.0f}x), identical: {same}; writing 1 day of buckets took {flush_ms:.0f} ms")
+    documents.drop()
+    buckets.drop()
+
+
+def bench_write_behind(rtt=0.002, events=500):
+    """
+    Single-event ingest with a simulated network round-trip: insert_one per
+    request vs WriteBehindQueue (request-side latency, time until everything
+    is stored, and insert round-trips).
+    """
+    from datetime import datetime, timedelta
+
+    from write_behind import WriteBehindQueue
+
+    db, backend = _bench_database()
+    if db is None:
+        print("[write_behind] skipped: no MongoDB server reachable and mongomock not installed")
+        return
+    direct, queued = db['bench_wb_direct'], db['bench_wb_queued']
+    direct.drop()
+    queued.drop()
+
+    class RoundTripInserts:
+        def __init__(self, collection):
+            self.collection = collection
+            self.calls = 0
+
+        def insert_one(self, doc):
+            self.calls += 1
+            time.sleep(rtt)
+            return self.collection.insert_one(doc)
+
+        def insert_many(self, docs, ordered=True):
+            self.calls += 1
+            time.sleep(rtt)
+            return self.collection.insert_many(docs, ordered=ordered)
+
+    start = datetime(2024, 1, 1)
+    records = [{'user_id': f'user-{i % 20}', 'timestamp': start + timedelta(minutes=5 * i), 'value': 100 + i % 50}
+               for i in range(events)]
+
+    sync_target = RoundTripInserts(direct)
+    started = time.perf_counter()
+    for record in records:
+        sync_target.insert_one(dict(record))
+    sync_s = time.perf_counter() - started
+
+    queued_target = RoundTripInserts(queued)
+    write_behind = WriteBehindQueue({'glucose': queued_target}, batch_size=200, flush_interval=0.05).start()
+    started = time.perf_counter()
+    for record in records:
+        write_behind.submit('glucose', dict(record))
+    submit_s = time.perf_counter() - started
+    write_behind.close()
+    drained_s = time.perf_counter() - started
+
+    projection = {'_id': 0}
+    same = (list(direct.find({}, projection).sort('timestamp', 1))
+            == list(queued.find({}, projection).sort('timestamp', 1)))
+    print(f"[write_behind] {events} events, {rtt * 1000:.0f} ms RTT on {backend}: insert_one "
+          f"{sync_s / events * 1e6:7.0f} us/request ({sync_target.calls} round-trips); write-behind "
+          f"{submit_s / events * 1e6:5.0f} us/request, all stored after {drained_s * 1000:.0f} ms "
+          f"({queued_target.calls} round-trips), identical: {same}")
+    direct.drop()
+    queued.drop()
+
+
+SECTIONS = {
+    'preprocessing': bench_preprocessing,
+    'pool': bench_pool,
+    'tensorflow': bench_tensorflow,
+    'rules': bench_rules,
+    'recent': bench_recent,
+    'history': bench_history,
+    'chart': bench_chart,
+    'rollups': bench_rollups,
+    'agp': bench_agp,
+    'variability': bench_variability,
+    'vitals': bench_vitals,
+    'write_behind': bench_write_behind,
+}
+
+if __name__ == '__main__':
+    selected = sys.argv[1:] or list(SECTIONS)
+    for name in selected:
+        SECTIONS[name]()
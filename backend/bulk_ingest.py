@@ -0,0 +1,141 @@
+# bulk_ingest.py
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+from pymongo.errors import BulkWriteError
+
+# Required and numeric fields per record kind (mirrors the single-record endpoints)
+RECORD_SPECS = {
+    'glucose': {'required': ('value',), 'numeric': ('value',)},
+    'insulin': {'required': ('dose', 'insulin_type'), 'numeric': ('dose',)},
+    'meal': {'required': ('carbs',), 'numeric': ('carbs',)},
+    'activity': {'required': ('activity_type', 'duration'), 'numeric': ('duration',)},
+    'vitals': {'required': (), 'numeric': ('heart_rate', 'gsr')},
+}
+
+# Per-record errors beyond this are counted but not listed in the response
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_timestamp(value):
+    """ISO-8601 string (as the single-record endpoints accept) or epoch seconds"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    raise ValueError(f"Invalid timestamp: {value!r}")
+
+
+def validate_record(kind, record, default_user_id=None):
+    """Return a document ready to insert, or raise ValueError describing the problem"""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    spec = RECORD_SPECS[kind]
+    missing = [field for field in spec['required'] if field not in record]
+    if missing:
+        raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+    for field in spec['numeric']:
+        value = record.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"Field '{field}' must be a number")
+
+    doc = dict(record)
+    doc.pop('_id', None)
+    if default_user_id and not doc.get('user_id'):
+        doc['user_id'] = default_user_id
+    doc['timestamp'] = parse_timestamp(doc['timestamp']) if 'timestamp' in doc else datetime.utcnow()
+    return doc
+
+
+def iter_ndjson(stream):
+    """Yield (line_number, record-or-ValueError) from a newline-delimited JSON byte stream"""
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as e:
+            yield index, ValueError(f"Invalid JSON: {e}")
+
+
+def iter_json(payload):
+    """Yield (index, record) from a JSON array or {"records": [...]} payload"""
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of records or {\"records\": [...]}")
+    return enumerate(records)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(collection, kind, records, chunk_size=1000, max_records=None,
+                default_user_id=None, on_inserted=None):
+    """
+    Validate and insert (index, record) pairs in chunks with unordered insert_many.
+
+    Invalid records and per-document write errors are reported by their
+    input index without stopping the rest of the batch. `on_inserted(docs)`
+    is called with each chunk's successfully inserted documents.
+    """
+    summary = {'received': 0, 'inserted': 0, 'failed': 0, 'chunks': [], 'errors': []}
+
+    def record_error(index, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'index': index, 'error': message})
+
+    for chunk_number, chunk in enumerate(_chunks(records, chunk_size)):
+        if max_records is not None and summary['received'] + len(chunk) > max_records:
+            chunk = chunk[:max(0, max_records - summary['received'])]
+            summary['truncated'] = True
+        if not chunk:
+            break
+        summary['received'] += len(chunk)
+
+        docs, indexes = [], []
+        chunk_errors = 0
+        for index, record in chunk:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                docs.append(validate_record(kind, record, default_user_id))
+                indexes.append(index)
+            except (ValueError, TypeError) as e:
+                record_error(index, str(e))
+                chunk_errors += 1
+
+        inserted_docs = docs
+        if docs:
+            try:
+                collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                failed_positions = set()
+                for write_error in e.details.get('writeErrors', []):
+                    position = write_error['index']
+                    failed_positions.add(position)
+                    record_error(indexes[position], write_error.get('errmsg', 'Write error'))
+                    chunk_errors += 1
+                inserted_docs = [doc for i, doc in enumerate(docs) if i not in failed_positions]
+
+        summary['inserted'] += len(inserted_docs)
+        summary['chunks'].append({
+            'chunk': chunk_number,
+            'received': len(chunk),
+            'inserted': len(inserted_docs),
+            'errors': chunk_errors
+        })
+        if inserted_docs and on_inserted is not None:
+            on_inserted(inserted_docs)
+        if summary.get('truncated'):
+            break
+
+    return summary
@@ -17,14 +17,18 @@ insulin_doses = db.insulin_doses
 meal_entries = db.meal_entries
 activity_entries = db.activity_entries
 vitals_entries = db.vitals_entries
+glucose_rollups = db.glucose_rollups
+vitals_buckets = db.vitals_buckets
 
 def init_db():
     """Initialize database indexes"""
     # Create indexes for faster queries
-    glucose_readings.create_index([("user_id", 1), ("timestamp", -1)])
-    insulin_doses.create_index([("user_id", 1), ("timestamp", -1)])
-    meal_entries.create_index([("user_id", 1), ("timestamp", -1)])
-    activity_entries.create_index([("user_id", 1), ("timestamp", -1)])
-    vitals_entries.create_index([("user_id", 1), ("timestamp", -1)])
+    glucose_readings.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+    insulin_doses.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+    meal_entries.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+    activity_entries.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+    vitals_entries.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+    glucose_rollups.create_index([("user_id", 1), ("period", 1), ("start", 1)], unique=True)
+    vitals_buckets.create_index([("user_id", 1), ("start", 1)], unique=True)
     users.create_index("email", unique=True)
     users.create_index("username", unique=True)
\ No newline at end of file
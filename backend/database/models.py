@@ -233,11 +233,11 @@ def init_db():
         db.create_collection("vitals_entries", **vitals_schema)
     
     # Create indexes for faster queries
-    glucose_readings.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
-    insulin_doses.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
-    meal_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
-    activity_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
-    vitals_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
+    glucose_readings.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    insulin_doses.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    meal_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    activity_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    vitals_entries.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
     users.create_index("email", unique=True)
     users.create_index("username", unique=True)
 
@@ -0,0 +1,91 @@
+# downsampling.py
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points of (x, y)
+    that preserve the visual shape of the series.
+
+    The first and last points are always kept; the rest are split into
+    threshold - 2 equal-count buckets and each bucket keeps the point forming
+    the largest triangle with the previously kept point and the average of
+    the next bucket. Bucket averages and triangle areas are computed with
+    NumPy; only the walk over buckets (each choice depends on the previous
+    one) is a Python loop. Series with <= threshold points are returned whole.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    buckets = threshold - 2
+    edges = (np.arange(buckets + 1) * ((n - 2) / buckets)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Average of every bucket, then the "next" point each bucket is scored against
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    next_x = np.append(sums_x[1:] / sizes[1:], x[-1])
+    next_y = np.append(sums_y[1:] / sizes[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area (the factor doesn't change the argmax)
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, threshold):
+    """
+    Min/max bucketing: indices of each bucket's lowest and highest point
+    (threshold // 2 equal-count buckets, plus the first and last points), in
+    order. Fully vectorized; keeps every extreme, e.g. short hypo dips.
+    Budgets too small for a min/max pair keep the first point, the interior
+    point furthest from the mean and the last point.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 4:
+        ends = np.array([0, n - 1][:max(threshold, 0)], dtype=np.int64)
+        if threshold < 3:
+            return ends
+        deviation = np.abs(y[1:n - 1] - np.nanmean(y))
+        extreme = 1 + int(np.argmax(np.where(np.isnan(deviation), -np.inf, deviation)))
+        return np.array([0, extreme, n - 1], dtype=np.int64)
+
+    buckets = (threshold - 2) // 2
+    width = -(-n // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    # Trailing buckets may be all padding when n doesn't divide evenly
+    valid = offsets < n
+    lows = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lows[valid], highs[valid]]))
+
+
+DOWNSAMPLERS = {
+    'lttb': lttb,
+    'minmax': lambda x, y, threshold: minmax(y, threshold),
+}
+
+
+def downsample(x, y, threshold, method='lttb'):
+    """Return (x, y) reduced to at most `threshold` points with `method`"""
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    indices = DOWNSAMPLERS[method](x, y, threshold)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
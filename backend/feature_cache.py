@@ -0,0 +1,281 @@
+# feature_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from preprocessing import WINDOW_LENGTH, STEP_MINUTES, IOB_DECAY_KERNEL, COB_DECAY_KERNEL, causal_convolve
+from resampling import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+STEP_SECONDS = STEP_MINUTES * 60
+
+# Per-step values kept in each user's ring buffer
+RING_COLUMNS = ['cbg', 'glucose_change', 'basal', 'bolus', 'carbInput',
+                'insulin_on_board', 'carbs_on_board', 'hr', 'gsr']
+_COL = {name: i for i, name in enumerate(RING_COLUMNS)}
+
+
+class UserFeatureState:
+    """
+    Rolling feature state for one user, updated as each reading arrives.
+
+    Keeps the last 12 per-step rows plus the recent bolus/carb bins needed for
+    IOB/COB. Each CGM reading appends one row in O(1) (IOB/COB are a dot
+    product over a fixed-length kernel). Boluses, carbs, basal and vitals that
+    arrive between CGM readings are folded into the next step.
+    """
+
+    def __init__(self):
+        self.rows = np.zeros((WINDOW_LENGTH, len(RING_COLUMNS)))
+        self.head = 0          # Next row to write
+        self.count = 0         # Rows written (capped at WINDOW_LENGTH)
+        self.bolus_ring = np.zeros(len(IOB_DECAY_KERNEL))
+        self.carb_ring = np.zeros(len(COB_DECAY_KERNEL))
+        self.event_head = 0
+        self.pending_bolus = 0.0
+        self.pending_carbs = 0.0
+        self.basal = 0.0
+        self.hr = 70.0
+        self.gsr = 1.0
+        self.last_glucose_time = None
+        self.last_cbg = None
+        self.stale = False
+        self.touched_at = time.monotonic()
+
+    @staticmethod
+    def _ring_dot(ring, head, kernel):
+        # ring[head - 1] is the newest bin, weighted by kernel[0]
+        idx = (head - 1 - np.arange(len(kernel))) % len(ring)
+        return float(kernel @ ring[idx])
+
+    def _push_events(self, bolus, carbs):
+        self.bolus_ring[self.event_head % len(self.bolus_ring)] = bolus
+        self.carb_ring[self.event_head % len(self.carb_ring)] = carbs
+        self.event_head += 1
+        return (self._ring_dot(self.bolus_ring, self.event_head, IOB_DECAY_KERNEL),
+                self._ring_dot(self.carb_ring, self.event_head, COB_DECAY_KERNEL))
+
+    def add_glucose(self, timestamp, value):
+        value = float(value)
+        if self.last_glucose_time is not None:
+            elapsed = timestamp - self.last_glucose_time
+            if elapsed <= 0:
+                # Duplicate or out-of-order reading: rebuild on next read
+                if elapsed < 0:
+                    self.stale = True
+                return
+            if elapsed > 1.5 * STEP_SECONDS:
+                # Missed readings - the grid needs interpolation, so rebuild
+                self.stale = True
+
+        iob, cob = self._push_events(self.pending_bolus, self.pending_carbs)
+        change = value - self.last_cbg if self.last_cbg is not None else 0.0
+        self.rows[self.head] = [value, change, self.basal, self.pending_bolus, self.pending_carbs,
+                                iob, cob, self.hr, self.gsr]
+        self.head = (self.head + 1) % WINDOW_LENGTH
+        self.count = min(self.count + 1, WINDOW_LENGTH)
+        self.pending_bolus = 0.0
+        self.pending_carbs = 0.0
+        self.last_cbg = value
+        self.last_glucose_time = timestamp
+
+    def add_insulin(self, timestamp, dose, insulin_type):
+        dose = float(dose)
+        if insulin_type == 'bolus':
+            self.pending_bolus += dose
+        elif insulin_type == 'basal':
+            self.basal = dose
+
+    def add_meal(self, timestamp, carbs):
+        self.pending_carbs += float(carbs)
+
+    def add_vitals(self, timestamp, heart_rate=None, gsr=None):
+        if heart_rate is not None:
+            self.hr = float(heart_rate)
+        if gsr is not None:
+            self.gsr = float(gsr)
+
+    def seed(self, resampled, end):
+        """Initialise from a resample_user_readings() result (cold-start rebuild)"""
+        glucose = np.asarray(resampled['glucose_readings'], dtype=np.float64)
+        bolus = np.asarray(resampled['insulin']['bolus'], dtype=np.float64)
+        carbs = np.asarray(resampled['carbs'], dtype=np.float64)
+        steps = len(glucose)
+
+        change = np.zeros(steps)
+        change[1:] = np.diff(glucose)
+        iob = causal_convolve(bolus, IOB_DECAY_KERNEL)[-steps:]
+        cob = causal_convolve(carbs, COB_DECAY_KERNEL)[-steps:]
+        rows = np.column_stack([
+            glucose, change, resampled['insulin']['basal'], bolus[-steps:], carbs[-steps:],
+            iob, cob, resampled['heart_rate'], resampled['gsr']
+        ])[-WINDOW_LENGTH:]
+
+        self.rows[:len(rows)] = rows
+        self.head = len(rows) % WINDOW_LENGTH
+        self.count = len(rows)
+
+        # Replay the most recent bolus/carb bins into the event rings
+        self.bolus_ring[:] = 0.0
+        self.carb_ring[:] = 0.0
+        self.event_head = 0
+        length = max(len(self.bolus_ring), len(self.carb_ring))
+        for b, c in zip(bolus[-length:], carbs[-length:]):
+            self._push_events(b, c)
+
+        self.basal = float(rows[-1, _COL['basal']])
+        self.hr = float(rows[-1, _COL['hr']])
+        self.gsr = float(rows[-1, _COL['gsr']])
+        self.last_cbg = float(glucose[-1])
+        self.last_glucose_time = end
+        self.pending_bolus = 0.0
+        self.pending_carbs = 0.0
+        self.stale = False
+
+    def window(self, feature_columns):
+        """
+        Assemble the unscaled [12, F] feature matrix in feature_columns order.
+
+        Window-relative features (first-step change, acceleration and the
+        expanding 1h rolling mean/std) are derived here from the 12 rows so
+        the result matches build_feature_windows on the same inputs.
+        """
+        if self.count < WINDOW_LENGTH:
+            return None
+        order = (self.head + np.arange(WINDOW_LENGTH)) % WINDOW_LENGTH
+        rows = self.rows[order]
+        cbg = rows[:, _COL['cbg']]
+
+        change = rows[:, _COL['glucose_change']].copy()
+        change[0] = 0.0
+        acceleration = np.zeros(WINDOW_LENGTH)
+        acceleration[1:] = np.diff(change)
+
+        counts = np.arange(1, WINDOW_LENGTH + 1)
+        rolling_mean = np.cumsum(cbg) / counts
+        # Expanding sample std via sums of squared deviations from the running mean
+        deviations = np.tril(cbg[None, :] - rolling_mean[:, None])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling_std = np.where(counts > 1, np.sqrt((deviations ** 2).sum(axis=1) / (counts - 1)), 0.0)
+
+        features = {name: rows[:, i] for name, i in _COL.items()}
+        features['glucose_change'] = change
+        features['glucose_acceleration'] = acceleration
+        features['glucose_rolling_mean_1h'] = rolling_mean
+        features['glucose_rolling_std_1h'] = rolling_std
+        zeros = np.zeros(WINDOW_LENGTH)
+        return np.column_stack([features.get(col, zeros) for col in feature_columns])
+
+
+class FeatureWindowCache:
+    """
+    In-memory per-user feature windows, kept warm by the ingest endpoints.
+
+    Users idle for longer than `idle_seconds` (or beyond `max_users`, least
+    recently used first) are evicted. Cold, evicted or stale users are rebuilt
+    through `loader(user_id)`, which returns (resampled_window, end_epoch_seconds)
+    or None.
+    """
+
+    def __init__(self, loader=None, max_users=10000, idle_seconds=6 * 3600):
+        self.loader = loader
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rebuilds = 0
+        self.evictions = 0
+
+    def _evict(self, now):
+        while self._users:
+            user_id, state = next(iter(self._users.items()))
+            if len(self._users) > self.max_users or now - state.touched_at > self.idle_seconds:
+                del self._users[user_id]
+                self.evictions += 1
+            else:
+                break
+
+    def _state(self, user_id, create=True):
+        now = time.monotonic()
+        state = self._users.get(user_id)
+        if state is None and create:
+            state = UserFeatureState()
+            # New users start stale so the first read backfills from the database
+            state.stale = True
+            self._users[user_id] = state
+        if state is not None:
+            state.touched_at = now
+            self._users.move_to_end(user_id)
+        self._evict(now)
+        return state
+
+    def _apply(self, user_id, method, timestamp, *args):
+        if not user_id:
+            return
+        with self._lock:
+            state = self._state(user_id)
+            try:
+                getattr(state, method)(to_epoch_seconds([timestamp])[0], *args)
+            except Exception as e:
+                # Never fail an ingest because of the cache; rebuild on next read instead
+                logger.warning(f"Feature cache update failed for user {user_id}: {e}")
+                state.stale = True
+
+    def add_glucose(self, user_id, timestamp, value):
+        self._apply(user_id, 'add_glucose', timestamp, value)
+
+    def add_insulin(self, user_id, timestamp, dose, insulin_type):
+        self._apply(user_id, 'add_insulin', timestamp, dose, insulin_type)
+
+    def add_meal(self, user_id, timestamp, carbs):
+        self._apply(user_id, 'add_meal', timestamp, carbs)
+
+    def add_vitals(self, user_id, timestamp, heart_rate=None, gsr=None):
+        self._apply(user_id, 'add_vitals', timestamp, heart_rate, gsr)
+
+    def _rebuild(self, user_id):
+        if self.loader is None:
+            return None
+        loaded = self.loader(user_id)
+        if loaded is None:
+            return None
+        resampled, end = loaded
+        with self._lock:
+            state = self._state(user_id)
+            state.seed(resampled, end)
+            self.rebuilds += 1
+        logger.info(f"Rebuilt feature window for user {user_id}")
+        return state
+
+    def window(self, user_id, feature_columns):
+        """Return the user's [12, F] feature matrix, rebuilding from the database if needed"""
+        with self._lock:
+            state = self._state(user_id, create=False)
+            if state is not None and not state.stale and state.count >= WINDOW_LENGTH:
+                self.hits += 1
+                return state.window(feature_columns)
+        state = self._rebuild(user_id)
+        if state is None:
+            return None
+        with self._lock:
+            return state.window(feature_columns)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'idle_seconds': self.idle_seconds,
+                'hits': self.hits,
+                'rebuilds': self.rebuilds,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,65 @@
+# glucose_series.py
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from resampling import to_epoch_seconds
+
+# Readings fetched per round-trip when loading long ranges
+SERIES_BATCH_SIZE = 5000
+
+
+def load_glucose_series(collection, user_id, start, end=None):
+    """
+    Glucose readings for one user in [start, end] as NumPy arrays.
+
+    Returns (epoch_seconds, values), both float64 and sorted by time. Only
+    the timestamp and value fields are fetched; readings without a numeric
+    value are skipped.
+    """
+    query = {'timestamp': {'$gte': start} if end is None else {'$gte': start, '$lte': end}}
+    if user_id:
+        query['user_id'] = user_id
+    cursor = (collection.find(query, {'_id': 0, 'timestamp': 1, 'value': 1})
+              .sort('timestamp', 1)
+              .batch_size(SERIES_BATCH_SIZE))
+    timestamps, values = [], []
+    for doc in cursor:
+        value = doc.get('value')
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            timestamps.append(doc['timestamp'])
+            values.append(value)
+    return to_epoch_seconds(timestamps), np.asarray(values, dtype=np.float64)
+
+
+def load_glucose_grid(collection, user_ids, start, steps, step_seconds=300):
+    """
+    Glucose for several users on a shared regular grid, in one query.
+
+    Returns a [len(user_ids), steps] float64 matrix starting at `start`, one
+    column per `step_seconds`; each reading lands in its step (the latest
+    wins) and steps without a reading are NaN.
+    """
+    grid = np.full((len(user_ids), steps), np.nan)
+    row_of = {user_id: row for row, user_id in enumerate(user_ids)}
+    end = start + timedelta(seconds=steps * step_seconds)
+    cursor = (collection.find({'user_id': {'$in': list(user_ids)}, 'timestamp': {'$gte': start, '$lt': end}},
+                              {'_id': 0, 'user_id': 1, 'timestamp': 1, 'value': 1})
+              .sort('timestamp', 1)
+              .batch_size(SERIES_BATCH_SIZE))
+    rows, timestamps, values = [], [], []
+    for doc in cursor:
+        value = doc.get('value')
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            rows.append(row_of[doc['user_id']])
+            timestamps.append(doc['timestamp'])
+            values.append(value)
+    if values:
+        columns = ((to_epoch_seconds(timestamps) - to_epoch_seconds([start])[0]) // step_seconds).astype(np.int64)
+        grid[np.asarray(rows), np.clip(columns, 0, steps - 1)] = values
+    return grid
+
+
+def to_iso(seconds):
+    """Epoch seconds to the naive-UTC ISO strings the rest of the API returns"""
+    return [datetime.fromtimestamp(s, tz=timezone.utc).replace(tzinfo=None).isoformat() for s in seconds]
@@ -0,0 +1,133 @@
+# history.py
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:  # Optional - the stdlib encoder is used instead
+    orjson = None
+
+# Documents fetched from MongoDB per round-trip while streaming a response
+HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 500))
+# Documents serialized together into one chunk of the response body
+HISTORY_CHUNK_DOCS = int(os.environ.get('HISTORY_CHUNK_DOCS', 200))
+
+# Fields returned by the history GET endpoints (any other fields the client
+# attached stay in the database unless listed here)
+HISTORY_FIELDS = {
+    'glucose': ('user_id', 'value', 'timestamp', 'notes'),
+    'insulin': ('user_id', 'dose', 'insulin_type', 'timestamp', 'notes'),
+    'meal': ('user_id', 'carbs', 'meal_type', 'timestamp', 'notes'),
+    'activity': ('user_id', 'activity_type', 'duration', 'intensity', 'timestamp', 'notes'),
+    'vitals': ('user_id', 'heart_rate', 'gsr', 'timestamp'),
+}
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Serialize to JSON bytes; ObjectId and datetime handled natively"""
+        return orjson.dumps(obj, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(', ', ': '))
+
+    def dumps(obj):
+        """Serialize to JSON bytes; ObjectId and datetime handled natively"""
+        return _encoder.encode(obj).encode('utf-8')
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(doc):
+    """Opaque page token for the position just after `doc` (timestamp, _id)"""
+    timestamp = doc['timestamp']
+    millis = (timestamp.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{doc['_id']}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token):
+    """Return (timestamp, ObjectId) from a page token, or raise ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('ascii')
+        millis, object_id = raw.split(':')
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {token}")
+
+
+def history_projection(kind):
+    return {field: 1 for field in HISTORY_FIELDS[kind]}
+
+
+def find_history(collection, kind, query, limit, after=None):
+    """
+    Newest-first projected cursor for a history endpoint.
+
+    `after` is a decoded page token: only documents older than that
+    (timestamp, _id) position are returned. The timestamp bound is an index
+    range on (user_id, timestamp, _id) and the _id tie-break only applies to
+    documents sharing the boundary timestamp, so a deep page costs the same
+    as the first. One extra document is fetched to tell whether another page
+    follows (see stream_history).
+    """
+    if after is not None:
+        timestamp, object_id = after
+        bounds = dict(query.get('timestamp', {}))
+        bounds['$lte'] = timestamp
+        query = {**query, 'timestamp': bounds,
+                 '$or': [{'timestamp': {'$lt': timestamp}}, {'_id': {'$lt': object_id}}]}
+    return (collection.find(query, history_projection(kind))
+            .sort([('timestamp', -1), ('_id', -1)])
+            .limit(limit + 1 if limit > 0 else 0)
+            .batch_size(HISTORY_BATCH_SIZE))
+
+
+def stream_history(key, cursor, limit):
+    """
+    Yield `{"<key>": [doc, ...], "next_cursor": token-or-null}` as JSON bytes,
+    HISTORY_CHUNK_DOCS documents at a time, so memory stays flat however many
+    documents the cursor returns.
+
+    The cursor is expected to hold up to limit + 1 documents (find_history);
+    the extra one only signals that a next page exists. The first document is
+    fetched before anything is yielded, so query errors still surface while
+    the caller can return an error status.
+    """
+    iterator = iter(cursor)
+    first = next(iterator, None)
+
+    def generate():
+        yield b'{"' + key.encode('utf-8') + b'": ['
+        chunk = [] if first is None else [first]
+        separator = b''
+        emitted = len(chunk)
+        last = first
+        next_cursor = None
+        for doc in iterator:
+            if limit > 0 and emitted >= limit:
+                next_cursor = encode_cursor(last)
+                break
+            chunk.append(doc)
+            emitted += 1
+            last = doc
+            if len(chunk) >= HISTORY_CHUNK_DOCS:
+                yield separator + dumps(chunk)[1:-1]
+                separator, chunk = b', ', []
+        if chunk:
+            yield separator + dumps(chunk)[1:-1]
+        yield b'], "next_cursor": ' + dumps(next_cursor) + b'}'
+
+    return generate()
@@ -0,0 +1,147 @@
+# inference_pool.py
+import gc
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set in the parent right before forking; children inherit it copy-on-write
+_worker_model = None
+
+
+def _worker_loop(tasks, results):
+    """Inference worker: run batches from `tasks` on the inherited model"""
+    model = _worker_model
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, batch = task
+        try:
+            results.put((task_id, np.asarray(model.predict(batch, verbose=0)), None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class InferencePool:
+    """
+    Pre-forked inference worker processes sharing one loaded model.
+
+    The model is loaded once in the parent; `start()` forks `workers`
+    processes that inherit it copy-on-write, so the weights are mapped once
+    rather than copied per worker. Each worker pulls stacked [N, 12, F]
+    batches from a shared task queue, so forward passes run in parallel
+    without contending for the parent's GIL.
+
+    Only fork-safe models should be used (the NumPy backend); the TensorFlow
+    runtime does not survive fork. Pin BLAS to one thread per worker
+    (e.g. OPENBLAS_NUM_THREADS=1) so workers do not oversubscribe the cores.
+    """
+
+    def __init__(self, model, workers=2):
+        self.model = model
+        self.workers = max(1, int(workers))
+        self._context = multiprocessing.get_context('fork')
+        self._tasks = None
+        self._results = None
+        self._processes = []
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._collector = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        global _worker_model
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+
+        _worker_model = self.model
+        # Move existing objects out of the collector's reach so refcount/GC
+        # bookkeeping in the children does not touch (and copy) shared pages
+        gc.freeze()
+        try:
+            for i in range(self.workers):
+                process = self._context.Process(
+                    target=_worker_loop, args=(self._tasks, self._results),
+                    name=f'inference-worker-{i}', daemon=True
+                )
+                process.start()
+                self._processes.append(process)
+        finally:
+            _worker_model = None
+            gc.unfreeze()
+
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-results', daemon=True)
+        self._collector.start()
+        logger.info(f"Started {self.workers} inference workers: {[p.pid for p in self._processes]}")
+        return self
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get()
+            except (EOFError, OSError):
+                # Queue torn down (interpreter shutdown)
+                break
+            if message is None:
+                break
+            task_id, output, error = message
+            with self._pending_lock:
+                future = self._pending.pop(task_id, None)
+            if future is None:
+                continue
+            if error is None:
+                self.completed += 1
+                future.set_result(output)
+            else:
+                self.failed += 1
+                future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+
+    def submit(self, batch):
+        """Queue a stacked input batch and return a Future for its output"""
+        task_id = next(self._ids)
+        future = Future()
+        with self._pending_lock:
+            self._pending[task_id] = future
+        self._tasks.put((task_id, np.ascontiguousarray(batch, dtype=np.float32)))
+        return future
+
+    def predict(self, batch, timeout=30.0, verbose=0):
+        """Blocking, Keras-compatible helper: run one batch on any free worker"""
+        return self.submit(batch).result(timeout=timeout)
+
+    def alive(self):
+        return sum(1 for p in self._processes if p.is_alive())
+
+    def close(self, timeout=5.0):
+        """Stop the workers after they finish queued batches"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join(timeout)
+        self._processes = []
+
+    def stats(self):
+        with self._pending_lock:
+            in_flight = len(self._pending)
+        return {
+            'workers': self.workers,
+            'alive': self.alive(),
+            'pids': [p.pid for p in self._processes],
+            'in_flight': in_flight,
+            'completed': self.completed,
+            'failed': self.failed
+        }
@@ -0,0 +1,283 @@
+# model_manager.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEATURE_COLUMNS = [
+    'cbg', 'glucose_change', 'glucose_acceleration',
+    'glucose_rolling_mean_1h', 'glucose_rolling_std_1h',
+    'basal', 'bolus', 'carbInput', 'insulin_on_board', 'carbs_on_board',
+    'hr', 'gsr'
+]
+DEFAULT_TARGET_COLUMNS = ['hypo_next_30min', 'hyper_next_30min', 'time_to_hypo', 'time_to_hyper']
+
+# TensorFlow backend: serve through traced fixed-shape functions instead of model.predict
+TF_COMPILED_INFERENCE = os.environ.get('TF_COMPILED_INFERENCE', '1') == '1'
+TF_BATCH_BUCKETS = [int(b) for b in os.environ.get('TF_BATCH_BUCKETS', '1,2,4,8,16,32,64').split(',') if b.strip()]
+# CPU thread pools (0 = TensorFlow's default of one thread per core)
+TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+
+# 'tflite' / 'onnx' backends: which exported variant to serve (see models/export_model.py)
+MODEL_VARIANT = os.environ.get('MODEL_VARIANT', 'fp32').lower()
+RUNTIME_NUM_THREADS = int(os.environ.get('RUNTIME_NUM_THREADS', 0))
+# Serve exported variants that failed the export parity gate (not recommended)
+MODEL_ALLOW_FAILED_PARITY = os.environ.get('MODEL_ALLOW_FAILED_PARITY', '0') == '1'
+
+
+class ModelManager:
+    """
+    Loads the prediction model, scalers and column metadata on demand.
+
+    Nothing heavy happens at construction time. `start_background_load()` kicks
+    off loading on a daemon thread and `ensure_loaded()` loads lazily (or waits
+    for the background load). Each phase is timed so cold start is measurable,
+    and a warm-up inference is run so the first real request does not pay for
+    graph tracing.
+    """
+
+    NOT_LOADED = 'not_loaded'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, model_dir, backend='tensorflow', warmup_batch_sizes=(1,), name='default'):
+        self.name = name
+        self.model_dir = model_dir
+        self.backend = backend
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+
+        self.model = None
+        self.feature_scaler = None
+        self.regression_scaler = None
+        self.feature_columns = list(DEFAULT_FEATURE_COLUMNS)
+        self.target_columns = list(DEFAULT_TARGET_COLUMNS)
+
+        self.version = None
+        self.parity = None
+        self.state = self.NOT_LOADED
+        self.error = None
+        self.timings = {}
+        self.created_at = time.time()
+        self.ready_at = None
+
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    # --- Loading -----------------------------------------------------------
+
+    def _timed(self, phase, fn):
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.timings[phase] = round((time.perf_counter() - started) * 1000.0, 2)
+
+    def _load_tensorflow_model(self):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        # Thread pools can only be configured before the TensorFlow runtime starts
+        try:
+            if TF_INTRA_OP_THREADS:
+                tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+            if TF_INTER_OP_THREADS:
+                tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+        except RuntimeError as e:
+            logger.warning(f"Error configuring TensorFlow threads: {e}")
+
+        # Set memory growth to avoid taking all GPU memory
+        gpus = tf.config.list_physical_devices('GPU')
+        for gpu in gpus:
+            try:
+                tf.config.experimental.set_memory_growth(gpu, True)
+            except RuntimeError as e:
+                logger.warning(f"Error configuring GPU: {e}")
+
+        h5_model_path = os.path.join(self.model_dir, 'glycemic_event_prediction_model.h5')
+        device = '/GPU:0' if gpus else '/CPU:0'
+        # Inference only - no need to compile with an optimizer
+        with tf.device(device):
+            model = load_model(h5_model_path, compile=False)
+        logger.info(f"Loaded TensorFlow model on {device}")
+
+        if TF_COMPILED_INFERENCE:
+            from compiled_model import CompiledModel
+            return CompiledModel(model, batch_buckets=TF_BATCH_BUCKETS)
+        return model
+
+    def _load_numpy_model(self):
+        from numpy_model import NumpyBiLSTMModel
+        # Default to the same weights the TensorFlow backend serves
+        return NumpyBiLSTMModel.from_model_dir(
+            self.model_dir,
+            os.environ.get('NUMPY_MODEL_WEIGHTS', 'glycemic_event_prediction_model.h5')
+        )
+
+    def _check_parity(self, runtime, variant):
+        """Refuse exported variants that failed the accuracy gate in export_model.py"""
+        from runtime_models import EXPORT_DIR
+        manifest_path = os.path.join(self.model_dir, EXPORT_DIR, 'manifest.json')
+        entry = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                entry = json.load(f).get('variants', {}).get(f'{runtime}/{variant}')
+        if entry is None:
+            logger.warning(f"No parity results for {runtime}/{variant}; run models/export_model.py")
+        elif not entry['passed']:
+            message = f"{runtime}/{variant} failed the export parity gate"
+            if not MODEL_ALLOW_FAILED_PARITY:
+                raise ValueError(f"{message} (set MODEL_ALLOW_FAILED_PARITY=1 to serve it anyway)")
+            logger.warning(message)
+        self.parity = entry
+
+    def _load_runtime_model(self):
+        from runtime_models import load_runtime_model
+        self._check_parity(self.backend, MODEL_VARIANT)
+        model = load_runtime_model(self.model_dir, self.backend, MODEL_VARIANT, RUNTIME_NUM_THREADS)
+        logger.info(f"Loaded {self.backend} model ({MODEL_VARIANT})")
+        return model
+
+    def _load_model(self):
+        if self.backend == 'numpy':
+            return self._load_numpy_model()
+        if self.backend in ('tflite', 'onnx'):
+            return self._load_runtime_model()
+        return self._load_tensorflow_model()
+
+    def _model_files(self):
+        if self.backend in ('tflite', 'onnx'):
+            from runtime_models import EXPORT_DIR, export_filename
+            weights_file = os.path.join(EXPORT_DIR, export_filename(self.backend, MODEL_VARIANT))
+        elif self.backend == 'numpy':
+            weights_file = os.environ.get('NUMPY_MODEL_WEIGHTS', 'glycemic_event_prediction_model.h5')
+        else:
+            weights_file = 'glycemic_event_prediction_model.h5'
+        return [weights_file, 'feature_scaler.pkl', 'regression_scaler.pkl']
+
+    def _fingerprint(self):
+        """Model version: content hash of the weights and scalers that were loaded"""
+        digest = hashlib.sha1()
+        for name in self._model_files():
+            path = os.path.join(self.model_dir, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        return digest.hexdigest()[:12]
+
+    def _load_scalers(self):
+        from scalers import load_affine_scalers
+        try:
+            # Plain NumPy affine transforms - keeps scikit-learn off the hot path
+            return load_affine_scalers(self.model_dir)
+        except TypeError as e:
+            import joblib
+            logger.warning(f"Using scikit-learn scalers: {e}")
+            feature_scaler = joblib.load(os.path.join(self.model_dir, 'feature_scaler.pkl'))
+            regression_scaler = joblib.load(os.path.join(self.model_dir, 'regression_scaler.pkl'))
+            return feature_scaler, regression_scaler
+
+    def _load_columns(self):
+        try:
+            feature_columns = np.load(os.path.join(self.model_dir, 'feature_columns.npy'), allow_pickle=True).tolist()
+            target_columns = np.load(os.path.join(self.model_dir, 'target_columns.npy'), allow_pickle=True).tolist()
+            return feature_columns, target_columns
+        except Exception as e:
+            logger.warning(f"Error loading columns, using defaults: {e}")
+            return list(DEFAULT_FEATURE_COLUMNS), list(DEFAULT_TARGET_COLUMNS)
+
+    def _warmup(self):
+        if hasattr(self.model, 'trace'):
+            # Trace every batch bucket now rather than on the first request that hits it
+            self.model.trace()
+        for batch_size in self.warmup_batch_sizes:
+            dummy = np.zeros((batch_size, 12, len(self.feature_columns)), dtype=np.float32)
+            self.model.predict(dummy, verbose=0)
+
+    def load(self):
+        """Load everything synchronously, recording how long each phase took"""
+        with self._lock:
+            if self.state == self.READY:
+                return True
+            already_loading = self.state == self.LOADING
+            if not already_loading:
+                self.state = self.LOADING
+                self._done.clear()
+
+        if already_loading:
+            # Another thread is loading - wait for it instead of loading twice
+            self._done.wait()
+            return self.state == self.READY
+
+        started = time.perf_counter()
+        try:
+            self.feature_columns, self.target_columns = self._timed('load_columns', self._load_columns)
+            self.feature_scaler, self.regression_scaler = self._timed('load_scalers', self._load_scalers)
+            self.model = self._timed('load_model', self._load_model)
+            self._timed('warmup', self._warmup)
+            self.version = self._fingerprint()
+            self.timings['total'] = round((time.perf_counter() - started) * 1000.0, 2)
+            self.ready_at = time.time()
+            self.error = None
+            self.state = self.READY
+            logger.info(f"Model ready ({self.backend}) in {self.timings['total']} ms: {self.timings}")
+        except Exception as e:
+            self.timings['total'] = round((time.perf_counter() - started) * 1000.0, 2)
+            self.error = str(e)
+            self.state = self.FAILED
+            logger.error(f"Error loading model: {e}")
+        finally:
+            self._done.set()
+
+        return self.state == self.READY
+
+    def start_background_load(self):
+        """Start loading on a daemon thread (no-op if loading already started)"""
+        with self._lock:
+            if self.state != self.NOT_LOADED or self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.load, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def ensure_loaded(self, timeout=None):
+        """
+        Make sure the model is loaded, loading lazily if nothing has started.
+
+        Returns True when the model is ready; False if loading failed or did
+        not finish within `timeout` seconds.
+        """
+        if self.state == self.READY:
+            return True
+        if self.state == self.NOT_LOADED and self._thread is None:
+            return self.load()
+        self._done.wait(timeout)
+        return self.state == self.READY
+
+    def is_ready(self):
+        return self.state == self.READY
+
+    @property
+    def tag(self):
+        """Version tag attached to predictions: <name>@<content fingerprint>"""
+        return f"{self.name}@{self.version}"
+
+    def status(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'ready': self.is_ready(),
+            'backend': self.backend,
+            'version': self.version,
+            'variant': MODEL_VARIANT if self.backend in ('tflite', 'onnx') else None,
+            'error': self.error,
+            'timings_ms': dict(self.timings),
+            'cold_start_ms': round((self.ready_at - self.created_at) * 1000.0, 2) if self.ready_at else None
+        }
@@ -0,0 +1,280 @@
+# model_registry.py
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+from batching import Histogram
+from model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+class ModelRegistry:
+    """
+    Versioned model bundles with an atomically swappable active version.
+
+    Each version is a ModelManager over a bundle directory (weights, scalers
+    and column metadata). The 'default' version is the top-level models/
+    directory; other versions live in `versions_dir/<name>/`. Versions are
+    loaded and warmed up before they can be activated, and callers take the
+    active manager once per request, so a swap never affects a request that
+    is already running.
+
+    An optional shadow version scores a sampled fraction of traffic off the
+    request path (see ShadowRunner).
+    """
+
+    DEFAULT_VERSION = 'default'
+
+    def __init__(self, model_dir, versions_dir, backend='tensorflow', warmup_batch_sizes=(1,),
+                 on_loaded=None, on_retire=None):
+        self.model_dir = model_dir
+        self.versions_dir = versions_dir
+        self.backend = backend
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        # Called with a freshly loaded manager before it is swapped in (e.g. to
+        # start its batcher and workers) and with one that was replaced or removed
+        self.on_loaded = on_loaded
+        self.on_retire = on_retire
+        self._versions = {}
+        self._pending = {}
+        self._active = None
+        self._shadow = None
+        self._shadow_sample_rate = 0.0
+        self._lock = threading.Lock()
+
+    def version_dir(self, name):
+        if name == self.DEFAULT_VERSION:
+            return self.model_dir
+        if not VERSION_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid model version name: {name}")
+        path = os.path.join(self.versions_dir, name)
+        if not os.path.isdir(path):
+            raise ValueError(f"Model version not found: {name}")
+        return path
+
+    def _new_manager(self, name):
+        return ModelManager(
+            self.version_dir(name), backend=self.backend,
+            warmup_batch_sizes=self.warmup_batch_sizes, name=name
+        )
+
+    def _retire(self, manager):
+        if manager is not None and self.on_retire is not None:
+            self.on_retire(manager)
+
+    def register(self, name, wait=True):
+        """
+        Load (or reload) a version from its bundle directory.
+
+        The new manager only replaces the registered one - and the active or
+        shadow pointer, if it was either - once it has loaded successfully.
+        With wait=False loading runs on a background thread.
+        """
+        manager = self._new_manager(name)
+        with self._lock:
+            self._pending[name] = manager
+
+        # Failed loads stay listed under 'pending' (with their error) until retried
+        def load():
+            if not manager.load():
+                logger.error(f"Model version {name} failed to load: {manager.error}")
+                return
+            if self.on_loaded is not None:
+                try:
+                    self.on_loaded(manager)
+                except Exception as e:
+                    manager.state, manager.error = manager.FAILED, str(e)
+                    logger.error(f"Model version {name} failed to start: {e}")
+                    return
+            with self._lock:
+                self._pending.pop(name, None)
+                previous = self._versions.get(name)
+                self._versions[name] = manager
+                if self._active is previous and previous is not None:
+                    self._active = manager
+                if self._shadow is previous and previous is not None:
+                    self._shadow = manager
+            logger.info(f"Registered model version {manager.tag}")
+            if previous is not None and previous is not manager:
+                self._retire(previous)
+
+        if wait:
+            load()
+        else:
+            threading.Thread(target=load, name=f'model-loader-{name}', daemon=True).start()
+        return manager
+
+    def add(self, manager):
+        """Register an already constructed manager (loaded lazily or in the background)"""
+        with self._lock:
+            self._versions[manager.name] = manager
+            if self._active is None:
+                self._active = manager
+
+    def activate(self, name):
+        """Atomically make a loaded version the active one"""
+        with self._lock:
+            manager = self._versions.get(name)
+            if manager is None:
+                raise ValueError(f"Model version not registered: {name}")
+            if not manager.is_ready():
+                raise ValueError(f"Model version {name} is not ready ({manager.state})")
+            previous, self._active = self._active, manager
+            if self._shadow is manager:
+                self._shadow = None
+        logger.info(f"Activated model version {manager.tag}")
+        return previous
+
+    def remove(self, name):
+        with self._lock:
+            manager = self._versions.get(name)
+            if manager is None:
+                raise ValueError(f"Model version not registered: {name}")
+            if manager is self._active:
+                raise ValueError("Cannot remove the active model version")
+            del self._versions[name]
+            if self._shadow is manager:
+                self._shadow = None
+        self._retire(manager)
+
+    def active(self):
+        return self._active
+
+    def get(self, name):
+        return self._versions.get(name)
+
+    def set_shadow(self, name, sample_rate):
+        """Shadow a registered version on `sample_rate` of traffic (name=None stops)"""
+        with self._lock:
+            if name is None:
+                self._shadow, self._shadow_sample_rate = None, 0.0
+                return
+            manager = self._versions.get(name)
+            if manager is None:
+                raise ValueError(f"Model version not registered: {name}")
+            if manager is self._active:
+                raise ValueError("The active version cannot also be the shadow")
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self._shadow, self._shadow_sample_rate = manager, float(sample_rate)
+
+    def shadow(self):
+        """(manager, sample_rate) for the shadow version, or None"""
+        shadow, rate = self._shadow, self._shadow_sample_rate
+        if shadow is None or rate <= 0 or not shadow.is_ready():
+            return None
+        return shadow, rate
+
+    def status(self):
+        with self._lock:
+            versions = {name: manager.status() for name, manager in self._versions.items()}
+            pending = {name: manager.status() for name, manager in self._pending.items()}
+            active = self._active.name if self._active else None
+            shadow = self._shadow.name if self._shadow else None
+            rate = self._shadow_sample_rate
+        return {
+            'active': active,
+            'shadow': {'version': shadow, 'sample_rate': rate} if shadow else None,
+            'versions': versions,
+            'pending': pending
+        }
+
+
+class ShadowRunner:
+    """
+    Runs shadow inference on a background thread and tracks how the shadow
+    version's outputs differ from the active version's.
+
+    Jobs are dropped (and counted) when the queue is full, so shadowing can
+    never slow down or back up live requests.
+    """
+
+    def __init__(self, max_queue=256):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.windows = 0
+        self.risk_disagreements = 0
+        self.probability_error_sum = 0.0
+        self.probability_error_max = 0.0
+        self.minutes_error_sum = 0.0
+        self.latency_histogram = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000])
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='shadow-inference', daemon=True)
+                self._thread.start()
+
+    def submit(self, job):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.submitted += 1
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            started = time.perf_counter()
+            try:
+                job()
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.warning(f"Shadow inference failed: {e}")
+            self.latency_histogram.observe((time.perf_counter() - started) * 1000.0)
+
+    def record(self, active_probabilities, shadow_probabilities, active_minutes, shadow_minutes):
+        """Accumulate differences for [N, 2] hypo/hyper probabilities and minutes"""
+        probability_error = np.abs(active_probabilities - shadow_probabilities)
+        risk_bounds = [0.3, 0.7]
+        disagreements = int(np.sum(
+            np.digitize(active_probabilities, risk_bounds, right=True)
+            != np.digitize(shadow_probabilities, risk_bounds, right=True)
+        ))
+        with self._lock:
+            self.windows += len(active_probabilities)
+            self.risk_disagreements += disagreements
+            self.probability_error_sum += float(probability_error.sum())
+            self.probability_error_max = max(self.probability_error_max, float(probability_error.max()))
+            self.minutes_error_sum += float(np.abs(active_minutes - shadow_minutes).sum())
+
+    def reset(self):
+        with self._lock:
+            self.windows = self.risk_disagreements = 0
+            self.probability_error_sum = self.probability_error_max = self.minutes_error_sum = 0.0
+
+    def stats(self):
+        with self._lock:
+            values = 2 * self.windows
+            return {
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'queue_depth': self._queue.qsize(),
+                'windows': self.windows,
+                'probability_mean_abs_diff': self.probability_error_sum / values if values else None,
+                'probability_max_abs_diff': self.probability_error_max if values else None,
+                'minutes_mean_abs_diff': self.minutes_error_sum / values if values else None,
+                'risk_level_disagreements': self.risk_disagreements,
+                'latency_ms': self.latency_histogram.snapshot()
+            }
@@ -0,0 +1,241 @@
+# export_model.py
+# Export the Keras model to TFLite / ONNX (fp32, fp16, int8) and gate each
+# variant on prediction parity with the Keras reference.
+#
+# Usage: python export_model.py [--runtimes tflite onnx] [--variants fp32 fp16 int8]
+#                               [--windows held_out.npy] [--count 2000] [--keep-failed]
+#
+# Writes models/export/<model>.<variant>.<tflite|onnx> plus manifest.json with
+# size, latency and parity metrics. Variants that fail the gate are recorded in
+# the manifest but their files are deleted (unless --keep-failed). Exits
+# non-zero if any variant fails the gate.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from preprocessing import EVENT_HISTORY_STEPS, build_feature_windows, prepare_input_batch
+from runtime_models import EXPORT_DIR, VARIANTS, export_path, load_runtime_model
+
+model_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Accuracy gate against the Keras model
+MAX_PROBABILITY_ERROR = 0.02   # Absolute change in hypo/hyper probability
+MAX_MINUTES_ERROR = 5.0        # Absolute change in time-to-event (minutes)
+MIN_RISK_AGREEMENT = 0.99      # Fraction of windows with unchanged Low/Medium/High risk
+
+
+def load_keras_model():
+    return tf.keras.models.load_model(
+        os.path.join(model_dir, 'glycemic_event_prediction_model.h5'), compile=False
+    )
+
+
+def unrolled(model):
+    """
+    Rebuild the model with unrolled LSTMs.
+
+    The converter cannot lower the LSTM while-loop with a dynamic batch
+    dimension; with 12 fixed timesteps unrolling is equivalent and exports
+    cleanly with a resizable batch.
+    """
+    config = model.get_config()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('class_name') == 'LSTM':
+                node['config']['unroll'] = True
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(config)
+    rebuilt = model.__class__.from_config(config)
+    rebuilt.set_weights(model.get_weights())
+    return rebuilt
+
+
+def export_tflite(model, variant, path):
+    converter = tf.lite.TFLiteConverter.from_keras_model(unrolled(model))
+    if variant in ('fp16', 'int8'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    # int8: dynamic-range quantization (int8 weights, float activations)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, variant, path):
+    import tf2onnx
+
+    if variant == 'fp32':
+        signature = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='input'),)
+        function = tf.function(lambda x: model(x, training=False))
+        tf2onnx.convert.from_function(function, input_signature=signature, opset=17, output_path=path)
+        return
+    # fp16/int8 are converted from a fresh fp32 export of `model`, never from
+    # whatever fp32 file happens to be on disk
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, 'model.fp32.onnx')
+        export_onnx(model, 'fp32', fp32_path)
+        if variant == 'fp16':
+            import onnx
+            from onnxconverter_common import float16
+            onnx.save(float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True), path)
+        elif variant == 'int8':
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+
+
+EXPORTERS = {'tflite': export_tflite, 'onnx': export_onnx}
+
+
+def synthetic_windows(count, feature_columns, feature_scaler, seed=12345):
+    """
+    Scaled [count, 12, F] inputs from simulated CGM/insulin/meal traces.
+
+    Used when no held-out window file is given; the seed is unrelated to
+    training so these are unseen inputs covering hypo, normal and hyper ranges.
+    """
+    rng = np.random.default_rng(seed)
+    history = EVENT_HISTORY_STEPS
+    start = rng.uniform(50, 320, (count, 1))
+    trend = rng.normal(0, 2.5, (count, 1))
+    noise = np.cumsum(rng.normal(0, 3, (count, 12)), axis=1)
+    cbg = np.clip(start + trend * np.arange(12) + noise, 40, 400)
+    basal = np.repeat(rng.uniform(0, 2, (count, 1)), 12, axis=1)
+    bolus = rng.choice([0, 0, 0, 0, 0, 0, 0, 0, 2, 4, 8], (count, history)).astype(np.float64)
+    carbs = rng.choice([0] * 14 + [20, 45, 80], (count, history)).astype(np.float64)
+    hr = rng.uniform(55, 130, (count, 12))
+    gsr = rng.uniform(0.2, 4, (count, 12))
+    features = build_feature_windows(cbg, basal, bolus, carbs, hr, gsr, feature_columns)
+    return prepare_input_batch(features, feature_scaler)
+
+
+def risk_levels(probability):
+    return np.digitize(probability, [0.3, 0.7], right=True)
+
+
+def parity(reference, candidate, regression_scaler):
+    """Differences in the quantities the API returns, candidate vs reference"""
+    def decode(outputs):
+        probabilities = np.clip(outputs[:, :2], 0, 1)
+        minutes = np.maximum(regression_scaler.inverse_transform(outputs[:, 2:4]), 0)
+        return probabilities, minutes
+
+    ref_prob, ref_minutes = decode(reference)
+    cand_prob, cand_minutes = decode(candidate)
+    prob_error = np.abs(ref_prob - cand_prob)
+    minutes_error = np.abs(ref_minutes - cand_minutes)
+    agreement = float(np.mean(risk_levels(ref_prob) == risk_levels(cand_prob)))
+    return {
+        'hypo_probability_max_error': float(prob_error[:, 0].max()),
+        'hypo_probability_mean_error': float(prob_error[:, 0].mean()),
+        'hyper_probability_max_error': float(prob_error[:, 1].max()),
+        'hyper_probability_mean_error': float(prob_error[:, 1].mean()),
+        'time_to_hypo_max_error_minutes': float(minutes_error[:, 0].max()),
+        'time_to_hypo_mean_error_minutes': float(minutes_error[:, 0].mean()),
+        'time_to_hyper_max_error_minutes': float(minutes_error[:, 1].max()),
+        'time_to_hyper_mean_error_minutes': float(minutes_error[:, 1].mean()),
+        'risk_level_agreement': agreement
+    }
+
+
+def passes_gate(metrics):
+    return (max(metrics['hypo_probability_max_error'], metrics['hyper_probability_max_error']) <= MAX_PROBABILITY_ERROR
+            and max(metrics['time_to_hypo_max_error_minutes'],
+                    metrics['time_to_hyper_max_error_minutes']) <= MAX_MINUTES_ERROR
+            and metrics['risk_level_agreement'] >= MIN_RISK_AGREEMENT)
+
+
+def latency_ms(model, window, repeat=200):
+    model.predict(window)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        model.predict(window)
+    return (time.perf_counter() - started) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runtimes', nargs='+', default=list(EXPORTERS), choices=list(EXPORTERS))
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--windows', help='Held-out scaled input windows (.npy, [N, 12, F])')
+    parser.add_argument('--count', type=int, default=2000, help='Synthetic windows when --windows is not given')
+    parser.add_argument('--keep-failed', action='store_true', help='Keep the files of variants that fail the gate')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(model_dir, EXPORT_DIR), exist_ok=True)
+    model = load_keras_model()
+    feature_columns = np.load(os.path.join(model_dir, 'feature_columns.npy'), allow_pickle=True).tolist()
+    feature_scaler = joblib.load(os.path.join(model_dir, 'feature_scaler.pkl'))
+    regression_scaler = joblib.load(os.path.join(model_dir, 'regression_scaler.pkl'))
+
+    if args.windows:
+        windows = np.load(args.windows).astype(np.float32)
+    else:
+        windows = synthetic_windows(args.count, feature_columns, feature_scaler)
+    reference = model.predict(windows, verbose=0)
+
+    manifest_path = os.path.join(model_dir, EXPORT_DIR, 'manifest.json')
+    manifest = json.load(open(manifest_path)) if os.path.exists(manifest_path) else {}
+    manifest['parity_windows'] = args.windows or f'synthetic:{len(windows)}'
+    manifest['gate'] = {
+        'max_probability_error': MAX_PROBABILITY_ERROR,
+        'max_minutes_error': MAX_MINUTES_ERROR,
+        'min_risk_level_agreement': MIN_RISK_AGREEMENT
+    }
+    manifest.setdefault('variants', {})
+
+    failed = []
+    for runtime in args.runtimes:
+        for variant in args.variants:
+            name = f'{runtime}/{variant}'
+            path = export_path(model_dir, runtime, variant)
+            try:
+                EXPORTERS[runtime](model, variant, path)
+                exported = load_runtime_model(model_dir, runtime, variant)
+            except ImportError as e:
+                print(f"{name}: skipped ({e})")
+                continue
+            metrics = parity(reference, exported.predict(windows), regression_scaler)
+            passed = passes_gate(metrics)
+            size_bytes = os.path.getsize(path)
+            manifest['variants'][name] = {
+                'file': os.path.basename(path),
+                'size_bytes': size_bytes,
+                'latency_ms_batch1': round(latency_ms(exported, windows[:1]), 4),
+                'passed': passed,
+                **metrics
+            }
+            if not passed:
+                failed.append(name)
+                if not args.keep_failed:
+                    # Do not leave a file that fails the gate where it can be shipped or served
+                    del exported
+                    os.remove(path)
+                    manifest['variants'][name]['file'] = None
+            print(f"{name}: {size_bytes / 1024:7.1f} KiB, "
+                  f"prob err {max(metrics['hypo_probability_max_error'], metrics['hyper_probability_max_error']):.2e}, "
+                  f"minutes err {max(metrics['time_to_hypo_max_error_minutes'], metrics['time_to_hyper_max_error_minutes']):.2f}, "
+                  f"risk agreement {metrics['risk_level_agreement']:.4f} "
+                  f"{'OK' if passed else 'FAILED'}")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {manifest_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# numpy_model.py
+import json
+import os
+
+import numpy as np
+import h5py
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _hard_sigmoid(x):
+    return np.clip(x / 6.0 + 0.5, 0.0, 1.0)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    None: lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': _sigmoid,
+    'hard_sigmoid': _hard_sigmoid,
+}
+
+
+def _activation(name):
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation: {name}")
+    return ACTIVATIONS[name]
+
+
+def _read_vars(group):
+    """Read the numbered weight arrays under a Keras 3 `vars` group"""
+    vars_group = group['vars']
+    return [np.asarray(vars_group[str(i)], dtype=np.float32) for i in range(len(vars_group))]
+
+
+def _layer_weights(weights, name):
+    """
+    Return a layer's weights in Keras `get_weights()` order.
+
+    Supports both the Keras 3 `.weights.h5` layout and the legacy full-model
+    `.h5` layout (where each layer lists its `weight_names`).
+    """
+    if 'model_weights' in weights:
+        group = weights['model_weights'][name]
+        names = [n.decode() if isinstance(n, bytes) else n for n in group.attrs['weight_names']]
+        return [np.asarray(group[n], dtype=np.float32) for n in names]
+
+    group = weights['layers'][name]
+    if 'forward_layer' in group:
+        return (_read_vars(group['forward_layer']['cell'])
+                + _read_vars(group['backward_layer']['cell']))
+    if 'cell' in group:
+        return _read_vars(group['cell'])
+    return _read_vars(group)
+
+
+class LSTMLayer:
+    """Single-direction LSTM matching Keras (gate order i, f, c, o)"""
+
+    def __init__(self, config, kernel, recurrent_kernel, bias):
+        self.units = config['units']
+        self.return_sequences = config.get('return_sequences', False)
+        self.go_backwards = config.get('go_backwards', False)
+        self.activation = _activation(config.get('activation', 'tanh'))
+        self.recurrent_activation = _activation(config.get('recurrent_activation', 'sigmoid'))
+        self.kernel = kernel
+        self.recurrent_kernel = recurrent_kernel
+        self.bias = bias if bias is not None else np.zeros(4 * self.units, dtype=np.float32)
+
+    def __call__(self, x):
+        batch_size, steps, _ = x.shape
+        if self.go_backwards:
+            x = x[:, ::-1, :]
+
+        # Input projection for every timestep in one matmul: [N, T, 4u]
+        projected = x @ self.kernel + self.bias
+
+        h = np.zeros((batch_size, self.units), dtype=np.float32)
+        c = np.zeros((batch_size, self.units), dtype=np.float32)
+        outputs = []
+        u = self.units
+        for t in range(steps):
+            z = projected[:, t, :] + h @ self.recurrent_kernel
+            i = self.recurrent_activation(z[:, :u])
+            f = self.recurrent_activation(z[:, u:2 * u])
+            g = self.activation(z[:, 2 * u:3 * u])
+            o = self.recurrent_activation(z[:, 3 * u:])
+            c = f * c + i * g
+            h = o * self.activation(c)
+            if self.return_sequences:
+                outputs.append(h)
+
+        if self.return_sequences:
+            return np.stack(outputs, axis=1)
+        return h
+
+
+class BidirectionalLayer:
+    def __init__(self, config, forward_layer, backward_layer):
+        self.merge_mode = config.get('merge_mode', 'concat')
+        self.forward_layer = forward_layer
+        self.backward_layer = backward_layer
+
+    def __call__(self, x):
+        forward = self.forward_layer(x)
+        backward = self.backward_layer(x)
+        if self.backward_layer.return_sequences:
+            # Keras re-reverses the backward sequence before merging
+            backward = backward[:, ::-1, :]
+        if self.merge_mode == 'concat':
+            return np.concatenate([forward, backward], axis=-1)
+        if self.merge_mode == 'sum':
+            return forward + backward
+        if self.merge_mode == 'mul':
+            return forward * backward
+        if self.merge_mode == 'ave':
+            return (forward + backward) / 2
+        raise ValueError(f"Unsupported merge_mode: {self.merge_mode}")
+
+
+class DenseLayer:
+    def __init__(self, config, kernel, bias):
+        self.activation = _activation(config.get('activation', 'linear'))
+        self.kernel = kernel
+        self.bias = bias
+
+    def __call__(self, x):
+        out = x @ self.kernel
+        if self.bias is not None:
+            out += self.bias
+        return self.activation(out)
+
+
+class NumpyBiLSTMModel:
+    """
+    TensorFlow-free inference engine for the glycemic event model.
+
+    Rebuilds the Keras Sequential from model_config.json and an H5 weights
+    file (model.weights.h5 or the full glycemic_event_prediction_model.h5)
+    and runs the forward pass as batched NumPy matrix ops. Exposes a
+    Keras-compatible `predict` so it can stand in for the loaded model.
+    """
+
+    def __init__(self, layers, input_shape=None):
+        self.layers = layers
+        self.input_shape = input_shape
+
+    @classmethod
+    def from_files(cls, config_path, weights_path):
+        with open(config_path) as f:
+            model_config = json.load(f)
+
+        layers = []
+        input_shape = None
+        with h5py.File(weights_path, 'r') as weights:
+            for layer in model_config['config']['layers']:
+                class_name = layer['class_name']
+                config = layer['config']
+                name = config.get('name')
+
+                if class_name == 'InputLayer':
+                    input_shape = tuple(config.get('batch_shape') or config.get('batch_input_shape'))
+                elif class_name in ('Dropout', 'SpatialDropout1D', 'GaussianNoise'):
+                    continue  # Identity at inference time
+                elif class_name == 'Dense':
+                    params = _layer_weights(weights, name)
+                    bias = params[1] if config.get('use_bias', True) else None
+                    layers.append(DenseLayer(config, params[0], bias))
+                elif class_name == 'LSTM':
+                    params = _layer_weights(weights, name)
+                    bias = params[2] if config.get('use_bias', True) else None
+                    layers.append(LSTMLayer(config, params[0], params[1], bias))
+                elif class_name == 'Bidirectional':
+                    forward_config = config['layer']['config']
+                    backward_config = (config.get('backward_layer') or {}).get(
+                        'config', {**forward_config, 'go_backwards': not forward_config.get('go_backwards', False)}
+                    )
+                    params = _layer_weights(weights, name)
+                    split = 3 if forward_config.get('use_bias', True) else 2
+                    forward_params, backward_params = params[:split], params[split:]
+                    layers.append(BidirectionalLayer(
+                        config,
+                        LSTMLayer(forward_config, *forward_params[:2],
+                                  forward_params[2] if split == 3 else None),
+                        LSTMLayer(backward_config, *backward_params[:2],
+                                  backward_params[2] if len(backward_params) == 3 else None)
+                    ))
+                else:
+                    raise ValueError(f"Unsupported layer type for NumPy backend: {class_name}")
+
+        return cls(layers, input_shape)
+
+    @classmethod
+    def from_model_dir(cls, model_dir, weights_file='model.weights.h5'):
+        return cls.from_files(
+            os.path.join(model_dir, 'model_config.json'),
+            os.path.join(model_dir, weights_file)
+        )
+
+    def __call__(self, x):
+        out = np.asarray(x, dtype=np.float32)
+        if out.ndim == 2:
+            out = out[np.newaxis]
+        for layer in self.layers:
+            out = layer(out)
+        return out
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """Keras-compatible predict over a [N, T, F] batch"""
+        x = np.asarray(x, dtype=np.float32)
+        if batch_size is None or len(x) <= batch_size:
+            return self(x)
+        return np.concatenate([self(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
@@ -2,117 +2,327 @@
 import numpy as np
 import uuid
 import pandas as pd
-import joblib
 import os
-import sys
-from preprocessing import prepare_input_data
+import random
+import threading
+import weakref
+from preprocessing import build_feature_matrix, prepare_input_batch, window_series, build_feature_windows
 from utils.recommendation import generate_recommendation
+from batching import MicroBatcher
+from inference_pool import InferencePool
+from model_manager import ModelManager
+from model_registry import ModelRegistry, ShadowRunner
+from prediction_cache import PredictionCache
+from rule_based import rule_based_inputs, rule_based_scores, risk_level
 
-# Print Python path information to debug
-print(f"Python path: {sys.path}")
-print(f"Current working directory: {os.getcwd()}")
+# Micro-batching configuration for concurrent /api/predict calls
+PREDICT_BATCHING = os.environ.get('PREDICT_BATCHING', '1') == '1'
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 32))
+PREDICT_MAX_WAIT_MS = float(os.environ.get('PREDICT_MAX_WAIT_MS', 5))
 
-# Import TensorFlow and configure GPU
-try:
-    import tensorflow as tf
-    print(f"Successfully imported TensorFlow")
-    
-    # Check for GPU availability
-    gpus = tf.config.list_physical_devices('GPU')
-    if gpus:
-        print(f"GPU devices available: {len(gpus)}")
-        for gpu in gpus:
-            print(f"  {gpu}")
-        # Set memory growth to avoid taking all GPU memory
-        try:
-            for gpu in gpus:
-                tf.config.experimental.set_memory_growth(gpu, True)
-            # Make GPU visible to TensorFlow
-            tf.config.set_visible_devices(gpus, 'GPU')
-            print("GPU configuration successful!")
-        except RuntimeError as e:
-            print(f"Error configuring GPU: {e}")
-    else:
-        print("No GPU found. Using CPU for inference.")
-    
-    # Import Keras from tensorflow
-    try:
-        from tensorflow.keras.models import load_model
-        print(f"Successfully imported Keras modules from TensorFlow")
-        keras_available = True
-    except ImportError as e:
-        print(f"Could not import from tensorflow.keras: {e}")
-        keras_available = False
-except ImportError as e:
-    print(f"Error importing tensorflow: {e}")
-    keras_available = False
+# Select inference backend: 'tensorflow' (Keras H5 model), 'numpy' (TensorFlow-free),
+# or an exported 'tflite' / 'onnx' model (variant chosen by MODEL_VARIANT)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'tensorflow').lower()
+
+# Pre-forked inference worker processes (0 = run inference in the web process).
+# Workers share the parent's weights copy-on-write; since the TensorFlow runtime
+# is not fork-safe they always serve the NumPy implementation of the model, and
+# an explicitly configured other backend is a configuration error.
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+if INFERENCE_WORKERS > 0:
+    if 'INFERENCE_BACKEND' in os.environ and INFERENCE_BACKEND != 'numpy':
+        raise ValueError(
+            f"INFERENCE_WORKERS={INFERENCE_WORKERS} requires INFERENCE_BACKEND=numpy, "
+            f"got INFERENCE_BACKEND={INFERENCE_BACKEND} (unset it or set INFERENCE_WORKERS=0)"
+        )
+    INFERENCE_BACKEND = 'numpy'
+
+# How the model is loaded: 'background' (thread started at app startup), 'lazy'
+# (first prediction loads it) or 'eager' (app startup blocks until loaded)
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'background').lower()
+# Seconds a prediction waits for a loading model before using the rule-based fallback
+MODEL_LOAD_TIMEOUT = float(os.environ.get('MODEL_LOAD_TIMEOUT', 30))
+
+# Prediction result cache (PREDICTION_CACHE_SIZE=0 disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 300))
+PREDICTION_CACHE_QUANTUM = float(os.environ.get('PREDICTION_CACHE_QUANTUM', 1e-3))
 
 # Define model directory
 model_dir = os.path.join(os.path.dirname(__file__), 'models')
-print(f"Model directory: {model_dir}")
-
-# Initialize global variables
-model = None
-feature_scaler = None
-regression_scaler = None
-
-# Try to load model
-if keras_available:
-    h5_model_path = os.path.join(model_dir, 'glycemic_event_prediction_model.h5')
-    if os.path.exists(h5_model_path):
-        print(f"Attempting to load H5 model from {h5_model_path}")
-        try:
-            # Load model with GPU support
-            with tf.device('/GPU:0'):
-                model = load_model(h5_model_path, compile=False)
-                model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-            print("Model loaded successfully with TensorFlow Keras on GPU")
-        except Exception as e:
-            print(f"Error loading model with GPU: {e}")
-            # Fallback to CPU
-            try:
-                print("Falling back to CPU")
-                with tf.device('/CPU:0'):
-                    model = load_model(h5_model_path, compile=False)
-                    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-                print("Model loaded successfully with TensorFlow Keras on CPU")
-            except Exception as e2:
-                print(f"Error loading model on CPU: {e2}")
-else:
-    print("TensorFlow Keras not available, will use rule-based predictions")
-
-# Load feature scaler
-feature_scaler_path = os.path.join(model_dir, 'feature_scaler.pkl')
-if os.path.exists(feature_scaler_path):
-    try:
-        feature_scaler = joblib.load(feature_scaler_path)
-        print("Feature scaler loaded successfully")
-    except Exception as e:
-        print(f"Error loading feature scaler: {e}")
-
-# Load regression scaler
-regression_scaler_path = os.path.join(model_dir, 'regression_scaler.pkl')
-if os.path.exists(regression_scaler_path):
-    try:
-        regression_scaler = joblib.load(regression_scaler_path)
-        print("Regression scaler loaded successfully")
-    except Exception as e:
-        print(f"Error loading regression scaler: {e}")
-
-# Load feature and target columns
-try:
-    feature_columns = np.load(os.path.join(model_dir, 'feature_columns.npy'), allow_pickle=True).tolist()
-    target_columns = np.load(os.path.join(model_dir, 'target_columns.npy'), allow_pickle=True).tolist()
-    print("Feature and target columns loaded successfully")
-except Exception as e:
-    print(f"Error loading columns: {e}")
-    feature_columns = [
-        'cbg', 'glucose_change', 'glucose_acceleration',
-        'glucose_rolling_mean_1h', 'glucose_rolling_std_1h',
-        'basal', 'bolus', 'carbInput', 'insulin_on_board', 'carbs_on_board',
-        'hr', 'gsr'
-    ]
-    target_columns = ['hypo_next_30min', 'hyper_next_30min', 'time_to_hypo', 'time_to_hyper']
+
+# Additional model versions live in MODEL_VERSIONS_DIR/<name>/ (same files as models/)
+MODEL_VERSIONS_DIR = os.environ.get('MODEL_VERSIONS_DIR', os.path.join(model_dir, 'versions'))
+# Seconds a replaced version keeps its batcher/workers so in-flight requests can finish
+MODEL_RETIRE_GRACE_SECONDS = float(os.environ.get('MODEL_RETIRE_GRACE_SECONDS', 30))
+# Shadow inference jobs queued beyond this are dropped
+SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 256))
+
+RULE_BASED_VERSION = 'rule_based'
+
+# Per-manager serving resources: {manager: (batcher, inference_pool)}
+_serving = {}
+_serving_lock = threading.Lock()
+# Replaced versions: their resources are never rebuilt, and requests still
+# holding one after its grace period run unbatched in this process
+_retired = weakref.WeakSet()
+
+def _forward(manager, pool, input_batch):
+    """Run one forward pass over a stacked [N, 12, F] input batch"""
+    if pool is not None and manager in _serving:
+        return pool.predict(input_batch, timeout=MODEL_LOAD_TIMEOUT)
+    return manager.model.predict(input_batch, verbose=0)
+
+def _serving_for(manager):
+    """Micro-batcher and (optional) worker pool for a loaded model version"""
+    entry = _serving.get(manager)
+    if entry is not None:
+        return entry
+    with _serving_lock:
+        entry = _serving.get(manager)
+        if entry is None:
+            if manager in _retired:
+                return None, None
+            # Workers are forked from the fully loaded manager
+            pool = InferencePool(manager.model, workers=INFERENCE_WORKERS).start() if INFERENCE_WORKERS > 0 else None
+            batcher = MicroBatcher(
+                lambda batch: _forward(manager, pool, batch),
+                max_batch_size=PREDICT_MAX_BATCH_SIZE,
+                max_wait_ms=PREDICT_MAX_WAIT_MS,
+                # Keep every inference worker busy with its own batch
+                concurrency=max(1, INFERENCE_WORKERS)
+            ) if PREDICT_BATCHING else None
+            entry = (batcher, pool)
+            _serving[manager] = entry
+    return entry
+
+def _retire_serving(manager):
+    """
+    Release a replaced version's batcher and workers after a grace period.
+
+    The entry stays in _serving until then, so in-flight requests keep using
+    it; afterwards _serving_for never rebuilds it.
+    """
+    with _serving_lock:
+        _retired.add(manager)
+        if manager not in _serving:
+            return
+
+    def close():
+        with _serving_lock:
+            entry = _serving.pop(manager, None)
+        if entry is None:
+            return
+        batcher, pool = entry
+        if batcher is not None:
+            batcher.close()
+        if pool is not None:
+            pool.close()
+
+    timer = threading.Timer(MODEL_RETIRE_GRACE_SECONDS, close)
+    timer.daemon = True
+    timer.start()
+
+registry = ModelRegistry(
+    model_dir,
+    MODEL_VERSIONS_DIR,
+    backend=INFERENCE_BACKEND,
+    warmup_batch_sizes=sorted({1, PREDICT_MAX_BATCH_SIZE}),
+    on_loaded=_serving_for,
+    on_retire=_retire_serving
+)
+registry.add(ModelManager(
+    model_dir,
+    backend=INFERENCE_BACKEND,
+    warmup_batch_sizes=sorted({1, PREDICT_MAX_BATCH_SIZE}),
+    name=ModelRegistry.DEFAULT_VERSION
+))
+
+shadow_runner = ShadowRunner(max_queue=SHADOW_QUEUE_SIZE)
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+    quantum=PREDICTION_CACHE_QUANTUM
+)
+
+def start_model_loading():
+    """Kick off model loading according to MODEL_LOAD_MODE"""
+    manager = registry.active()
+    if INFERENCE_WORKERS > 0:
+        # Workers are forked from a fully loaded parent, before requests are served
+        if manager.load():
+            _serving_for(manager)
+    elif MODEL_LOAD_MODE == 'eager':
+        manager.load()
+    elif MODEL_LOAD_MODE == 'background':
+        manager.start_background_load()
+
+def get_model_status():
+    return registry.active().status()
+
+def get_registry_status():
+    return {**registry.status(), 'shadow_stats': shadow_runner.stats()}
+
+def load_model_version(name, wait=False):
+    """Load (or reload) a model version; it is swapped in only once warmed up"""
+    return registry.register(name, wait=wait).status()
+
+def activate_model_version(name):
+    registry.activate(name)
+    return get_registry_status()
+
+def set_shadow_version(name, sample_rate=0.1):
+    registry.set_shadow(name, sample_rate)
+    shadow_runner.reset()
+    return get_registry_status()
+
+def reload_model():
+    """
+    Load the active version's files again and swap them in once ready.
+
+    Requests keep using the current model while the new one loads. Cached
+    predictions are dropped after the swap (their keys carry the old model
+    version, so they could not be served anyway).
+    """
+    manager = registry.register(registry.active().name, wait=True)
+    if not manager.is_ready():
+        return {'reloaded': False, **manager.status()}
+    prediction_cache.clear()
+    return {'reloaded': True, **manager.status()}
+
+def get_feature_columns():
+    """Model feature column order (loads the column metadata if needed)"""
+    manager = registry.active()
+    manager.ensure_loaded(timeout=MODEL_LOAD_TIMEOUT)
+    return manager.feature_columns
+
+def run_model(manager, input_sequence):
+    """
+    Run a model version on a [N, 12, F] input sequence.
+
+    Single-window requests are routed through the micro-batcher so that
+    concurrent callers share one forward pass.
+    """
+    batcher, pool = _serving_for(manager)
+    if batcher is not None and input_sequence.shape[0] == 1:
+        return np.expand_dims(batcher.predict(input_sequence[0]), 0)
+    return _forward(manager, pool, input_sequence)
+
+def get_prediction_cache_stats():
+    return prediction_cache.stats()
+
+def _decode_outputs(manager, outputs):
+    """[N, 2] clipped hypo/hyper probabilities and [N, 2] time-to-event minutes"""
+    outputs = np.asarray(outputs)
+    probabilities = np.clip(outputs[:, :2], 0, 1)
+    minutes = np.maximum(manager.regression_scaler.inverse_transform(outputs[:, 2:4]), 0)
+    return probabilities, minutes
+
+def _run_shadow(shadow, active, features, active_outputs):
+    # Bundles may order (or select) feature columns differently
+    if shadow.feature_columns != active.feature_columns:
+        index = {col: i for i, col in enumerate(active.feature_columns)}
+        zeros = np.zeros(features.shape[:2])
+        features = np.stack(
+            [features[:, :, index[col]] if col in index else zeros for col in shadow.feature_columns], axis=-1
+        )
+    shadow_outputs = shadow.model.predict(prepare_input_batch(features, shadow.feature_scaler), verbose=0)
+    active_probabilities, active_minutes = _decode_outputs(active, active_outputs)
+    shadow_probabilities, shadow_minutes = _decode_outputs(shadow, shadow_outputs)
+    shadow_runner.record(active_probabilities, shadow_probabilities, active_minutes, shadow_minutes)
+
+def maybe_shadow(active, features, active_outputs):
+    """Score a sampled fraction of traffic with the shadow version, off the request path"""
+    target = registry.shadow()
+    if target is None:
+        return
+    shadow, sample_rate = target
+    if random.random() >= sample_rate:
+        return
+    features = np.array(features, copy=True)
+    active_outputs = np.array(active_outputs, copy=True)
+    shadow_runner.submit(lambda: _run_shadow(shadow, active, features, active_outputs))
+
+def score_window(manager, prediction_id, current_glucose, features, input_sequence):
+    """
+    Score one window (unscaled [1, 12, F] features and the scaled input),
+    serving repeats from the prediction cache.
+
+    A cache hit returns the original result (same prediction_id, no new
+    recommendation); a miss runs the model and caches the result.
+    """
+    key = prediction_cache.key(manager.tag, input_sequence[0])
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return cached
+    outputs = run_model(manager, input_sequence)
+    result = build_model_result(manager, prediction_id, current_glucose, outputs[0])
+    prediction_cache.put(key, result)
+    maybe_shadow(manager, features, outputs)
+    return result
+
+def get_batching_stats():
+    """Batch-size and queue-wait histograms for the active version's inference scheduler"""
+    manager = registry.active()
+    batcher = _serving.get(manager, (None, None))[0]
+    if not PREDICT_BATCHING:
+        return {'enabled': False}
+    if batcher is None:
+        return {'enabled': True, 'started': False}
+    return {'enabled': True, **batcher.stats()}
+
+def get_inference_pool_stats():
+    pool = _serving.get(registry.active(), (None, None))[1]
+    if pool is None:
+        return {'enabled': False}
+    return {'enabled': True, **pool.stats()}
+
+def build_model_result(manager, prediction_id, current_glucose, prediction):
+    """Turn one row of raw model output into the prediction response"""
+    # Extract predictions
+    hypo_probability = max(0, min(1, prediction[0]))
+    hyper_probability = max(0, min(1, prediction[1]))
+    time_to_hypo_scaled = prediction[2]
+    time_to_hyper_scaled = prediction[3]
+    
+    # Scale back regression values
+    regression_predictions = manager.regression_scaler.inverse_transform(
+        np.array([[time_to_hypo_scaled, time_to_hyper_scaled]])
+    )[0]
+    
+    time_to_hypo = max(0, regression_predictions[0])
+    time_to_hyper = max(0, regression_predictions[1])
+    
+    # Get risk levels
+    hypo_risk = "High" if hypo_probability > 0.7 else "Medium" if hypo_probability > 0.3 else "Low"
+    hyper_risk = "High" if hyper_probability > 0.7 else "Medium" if hyper_probability > 0.3 else "Low"
+    
+    # Get recommendation - now passing the prediction_id
+    recommendation = generate_recommendation(
+        prediction_id,
+        current_glucose, 
+        float(hypo_probability), 
+        float(hyper_probability),
+        float(time_to_hypo), 
+        float(time_to_hyper)
+    )
+
+    # Return model prediction results
+    return {
+        "prediction_id": prediction_id,
+        "current_glucose": float(current_glucose),
+        "hypo_probability": float(hypo_probability),
+        "hyper_probability": float(hyper_probability),
+        "hypo_risk": hypo_risk,
+        "hyper_risk": hyper_risk,
+        "time_to_hypo_minutes": float(time_to_hypo) if hypo_probability > 0.3 else None,
+        "time_to_hyper_minutes": float(time_to_hyper) if hyper_probability > 0.3 else None,
+        "recommendation": recommendation,
+        "timestamp": pd.Timestamp.now().isoformat(),
+        "model_prediction": True,
+        "model_version": manager.tag
+    }
 
 def predict_glucose_events(recent_glucose_data, recent_insulin_data, recent_meal_data,
                           recent_activity_data=None, recent_hr_data=None, recent_gsr_data=None):
@@ -129,156 +339,206 @@ def predict_glucose_events(recent_glucose_data, recent_insulin_data, recent_meal
     # Extract current glucose for all return paths
     current_glucose = recent_glucose_data[-1]
     
+    # Use one model version for the whole request, even if another is activated meanwhile
+    manager = registry.active()
+
     # If model is available, try to use it
-    if model is not None and feature_scaler is not None and regression_scaler is not None:
+    if manager.ensure_loaded(timeout=MODEL_LOAD_TIMEOUT):
         try:
             # Process the input data
-            input_sequence = prepare_input_data(
+            features = build_feature_matrix(
                 recent_glucose_data, 
                 recent_insulin_data,
                 recent_meal_data,
                 recent_activity_data,
                 recent_hr_data,
                 recent_gsr_data,
-                feature_columns,
-                feature_scaler
-            )
-            
-            # Make prediction with model
-            prediction = model.predict(input_sequence)[0]
-            
-            # Extract predictions
-            hypo_probability = max(0, min(1, prediction[0]))
-            hyper_probability = max(0, min(1, prediction[1]))
-            time_to_hypo_scaled = prediction[2]
-            time_to_hyper_scaled = prediction[3]
-            
-            # Scale back regression values
-            regression_predictions = regression_scaler.inverse_transform(
-                np.array([[time_to_hypo_scaled, time_to_hyper_scaled]])
-            )[0]
+                manager.feature_columns
+            )[np.newaxis]
+            input_sequence = prepare_input_batch(features, manager.feature_scaler)
             
-            time_to_hypo = max(0, regression_predictions[0])
-            time_to_hyper = max(0, regression_predictions[1])
-            
-            # Get risk levels
-            hypo_risk = "High" if hypo_probability > 0.7 else "Medium" if hypo_probability > 0.3 else "Low"
-            hyper_risk = "High" if hyper_probability > 0.7 else "Medium" if hyper_probability > 0.3 else "Low"
-            
-            # Get recommendation - now passing the prediction_id
-            recommendation = generate_recommendation(
-                prediction_id,
-                current_glucose, 
-                float(hypo_probability), 
-                float(hyper_probability),
-                float(time_to_hypo), 
-                float(time_to_hyper)
-            )
-
-            # Return model prediction results
-            return {
-                "prediction_id": prediction_id,
-                "current_glucose": float(current_glucose),
-                "hypo_probability": float(hypo_probability),
-                "hyper_probability": float(hyper_probability),
-                "hypo_risk": hypo_risk,
-                "hyper_risk": hyper_risk,
-                "time_to_hypo_minutes": float(time_to_hypo) if hypo_probability > 0.3 else None,
-                "time_to_hyper_minutes": float(time_to_hyper) if hyper_probability > 0.3 else None,
-                "recommendation": recommendation,
-                "timestamp": pd.Timestamp.now().isoformat(),
-                "model_prediction": True
-            }
+            # Make prediction with model (batched with concurrent requests, cached by input)
+            return score_window(manager, prediction_id, current_glucose, features, input_sequence)
             
         except Exception as e:
             print(f"Error in model prediction: {e}")
             # Fall through to rule-based prediction
     
-    # Rule-based prediction logic (fallback)
-    print("Using rule-based prediction")
-    trend = 0
-    if len(recent_glucose_data) >= 3:
-        trend = (recent_glucose_data[-1] - recent_glucose_data[-3]) / 2
-    
-    # Enhanced rule-based predictions
-    # Calculate hypo probability based on current level and trend
-    if current_glucose < 70:
-        hypo_prob = 0.9  # Already hypoglycemic
-    elif current_glucose < 80 and trend < -1:
-        hypo_prob = 0.7  # Heading toward hypo rapidly
-    elif current_glucose < 90 and trend < 0:
-        hypo_prob = 0.5  # Moderately at risk
-    elif current_glucose < 100 and trend < -2:
-        hypo_prob = 0.4  # Some risk due to rapid drop
-    else:
-        hypo_prob = max(0.1, min(0.3, 1 - (current_glucose / 120)))  # Base risk
-        
-    # Calculate hyper probability based on current level and trend
-    if current_glucose > 180:
-        hyper_prob = 0.9  # Already hyperglycemic
-    elif current_glucose > 160 and trend > 1:
-        hyper_prob = 0.7  # Heading toward hyper rapidly
-    elif current_glucose > 140 and trend > 0:
-        hyper_prob = 0.5  # Moderately at risk
-    elif current_glucose > 120 and trend > 2:
-        hyper_prob = 0.4  # Some risk due to rapid rise
-    else:
-        hyper_prob = max(0.1, min(0.3, current_glucose / 200))  # Base risk
-    
-    # Calculate meal impact from carb data
-    recent_carbs = sum(recent_meal_data[-3:] if recent_meal_data else [0])
-    if recent_carbs > 30:
-        # High recent carb intake raises hyper risk and reduces hypo risk
-        hyper_prob = min(0.95, hyper_prob + 0.2)
-        hypo_prob = max(0.05, hypo_prob - 0.1)
-    
-    # Calculate insulin impact
-    recent_bolus = sum(recent_insulin_data.get('bolus', [0])[-3:])
-    if recent_bolus > 2:
-        # High recent insulin raises hypo risk and reduces hyper risk
-        hypo_prob = min(0.95, hypo_prob + 0.2)
-        hyper_prob = max(0.05, hyper_prob - 0.1)
-    
-    # Calculate time estimates based on current values and trends
-    if current_glucose < 70:
-        time_to_hypo = 0  # Already in hypoglycemia
-    else:
-        time_to_hypo = (current_glucose - 70) * (3 if trend < 0 else 5)
-    
-    if current_glucose > 180:
-        time_to_hyper = 0  # Already in hyperglycemia
-    else:
-        time_to_hyper = (180 - current_glucose) * (3 if trend > 0 else 5)
-    
-    # Make sure probabilities are within [0, 1]
-    hypo_prob = max(0, min(1, hypo_prob))
-    hyper_prob = max(0, min(1, hyper_prob))
-    
-    # Risk levels based on probabilities
-    hypo_risk = "High" if hypo_prob > 0.7 else "Medium" if hypo_prob > 0.3 else "Low"
-    hyper_risk = "High" if hyper_prob > 0.7 else "Medium" if hyper_prob > 0.3 else "Low"
-    
-    # Generate recommendation - pass the prediction_id
-    recommendation = generate_recommendation(
-        prediction_id,
-        current_glucose, 
-        float(hypo_prob), 
-        float(hyper_prob),
-        float(time_to_hypo), 
-        float(time_to_hyper)
+    return rule_based_prediction(
+        prediction_id, current_glucose, recent_glucose_data,
+        recent_insulin_data, recent_meal_data
     )
 
-    return {
-        "prediction_id": prediction_id,
-        "current_glucose": float(current_glucose),
-        "hypo_probability": float(hypo_prob),
-        "hyper_probability": float(hyper_prob),
-        "hypo_risk": hypo_risk,
-        "hyper_risk": hyper_risk,
-        "time_to_hypo_minutes": float(time_to_hypo) if hypo_prob > 0.3 else None,
-        "time_to_hyper_minutes": float(time_to_hyper) if hyper_prob > 0.3 else None,
-        "recommendation": recommendation,
-        "timestamp": pd.Timestamp.now().isoformat(),
-        "rule_based_prediction": True,
-        "note": "Using enhanced rule-based prediction"
-    }
\ No newline at end of file
+def predict_from_features(feature_matrix):
+    """
+    Predict from an unscaled [12, F] feature matrix (in model feature_columns
+    order), e.g. one read from the per-user feature window cache.
+    """
+    prediction_id = str(uuid.uuid4())
+    manager = registry.active()
+    columns = manager.feature_columns
+    features = {col: feature_matrix[:, i] for i, col in enumerate(columns)}
+    glucose = features['cbg'].tolist()
+    current_glucose = glucose[-1]
+
+    if manager.ensure_loaded(timeout=MODEL_LOAD_TIMEOUT):
+        try:
+            input_sequence = prepare_input_batch(feature_matrix[np.newaxis], manager.feature_scaler)
+            return score_window(manager, prediction_id, current_glucose, feature_matrix[np.newaxis], input_sequence)
+        except Exception as e:
+            print(f"Error in model prediction: {e}")
+
+    return rule_based_prediction(
+        prediction_id, current_glucose, glucose,
+        {'bolus': features.get('bolus', np.zeros(12)).tolist()},
+        features.get('carbInput', np.zeros(12)).tolist()
+    )
+
+def rule_based_predictions(prediction_ids, glucose_windows, insulin_windows, meal_windows):
+    """Rule-based predictions for a batch of patients (fallback when the model is unavailable)"""
+    print(f"Using rule-based prediction for {len(prediction_ids)} window(s)")
+    current, trend, recent_carbs, recent_bolus = rule_based_inputs(glucose_windows, insulin_windows, meal_windows)
+    scores = rule_based_scores(current, trend, recent_carbs, recent_bolus)
+
+    results = []
+    for i, prediction_id in enumerate(prediction_ids):
+        hypo_prob = float(scores['hypo_probability'][i])
+        hyper_prob = float(scores['hyper_probability'][i])
+        time_to_hypo = float(scores['time_to_hypo'][i])
+        time_to_hyper = float(scores['time_to_hyper'][i])
+
+        # Generate recommendation - pass the prediction_id
+        recommendation = generate_recommendation(
+            prediction_id,
+            float(current[i]),
+            hypo_prob,
+            hyper_prob,
+            time_to_hypo,
+            time_to_hyper
+        )
+
+        results.append({
+            "prediction_id": prediction_id,
+            "current_glucose": float(current[i]),
+            "hypo_probability": hypo_prob,
+            "hyper_probability": hyper_prob,
+            "hypo_risk": risk_level(hypo_prob),
+            "hyper_risk": risk_level(hyper_prob),
+            "time_to_hypo_minutes": time_to_hypo if hypo_prob > 0.3 else None,
+            "time_to_hyper_minutes": time_to_hyper if hyper_prob > 0.3 else None,
+            "recommendation": recommendation,
+            "timestamp": pd.Timestamp.now().isoformat(),
+            "rule_based_prediction": True,
+            "model_version": RULE_BASED_VERSION,
+            "note": "Using enhanced rule-based prediction"
+        })
+    return results
+
+def rule_based_prediction(prediction_id, current_glucose, recent_glucose_data,
+                          recent_insulin_data, recent_meal_data):
+    """Rule-based prediction logic for one window (fallback when the model is unavailable)"""
+    return rule_based_predictions(
+        [prediction_id], [recent_glucose_data], [recent_insulin_data], [recent_meal_data]
+    )[0]
+
+def _window_args(window):
+    """Unpack one patient window into predict_glucose_events arguments"""
+    return (
+        window.get('glucose_readings', []),
+        window.get('insulin', {}),
+        window.get('carbs', []),
+        window.get('activity'),
+        window.get('heart_rate'),
+        window.get('gsr')
+    )
+
+def predict_glucose_events_batch(windows):
+    """
+    Score many patient windows with a single model call.
+
+    Each window is a dict with the same keys the /api/predict payload uses
+    (glucose_readings, insulin, carbs, activity, heart_rate, gsr). Returns one
+    result per window in input order. Windows that fail validation get an
+    {"error": ...} entry without failing the batch; windows the model cannot
+    score fall back to the rule-based prediction, as in predict_glucose_events.
+    """
+    results = [None] * len(windows)
+    prediction_ids = [str(uuid.uuid4()) for _ in windows]
+
+    # Validate windows
+    pending = []
+    for i, window in enumerate(windows):
+        glucose = window.get('glucose_readings', [])
+        if len(glucose) < 12:
+            results[i] = {"error": "Need at least 12 glucose readings (1 hour of data)"}
+            continue
+        pending.append(i)
+
+    manager = registry.active()
+    if pending and manager.ensure_loaded(timeout=MODEL_LOAD_TIMEOUT):
+        series = []
+        scored = []
+        for i in pending:
+            try:
+                glucose, insulin, carbs, _, hr, gsr = _window_args(windows[i])
+                series.append(window_series(glucose, insulin, carbs, hr, gsr))
+                scored.append(i)
+            except Exception as e:
+                print(f"Error preprocessing window {i}: {e}")
+
+        if scored:
+            try:
+                # One vectorized feature build, scaler call and forward pass for the whole batch
+                feature_batch = build_feature_windows(
+                    *(np.stack(column) for column in zip(*series)),
+                    manager.feature_columns
+                )
+                input_batch = prepare_input_batch(feature_batch, manager.feature_scaler)
+
+                # Serve repeated windows from the prediction cache; only run the model on misses
+                keys = [prediction_cache.key(manager.tag, window) for window in input_batch]
+                misses = []
+                for row, i in enumerate(scored):
+                    cached = prediction_cache.get(keys[row])
+                    if cached is not None:
+                        results[i] = cached
+                    else:
+                        misses.append(row)
+
+                predictions = run_model(manager, input_batch[misses]) if misses else []
+                if misses:
+                    maybe_shadow(manager, feature_batch[misses], predictions)
+                for prediction, row in zip(predictions, misses):
+                    i = scored[row]
+                    try:
+                        results[i] = build_model_result(
+                            manager, prediction_ids[i], windows[i]['glucose_readings'][-1], prediction
+                        )
+                        prediction_cache.put(keys[row], results[i])
+                    except Exception as e:
+                        print(f"Error in model prediction for window {i}: {e}")
+            except Exception as e:
+                print(f"Error in batch model prediction: {e}")
+                # Fall through to rule-based prediction for the scored windows
+
+    # Vectorized rule-based fallback for anything the model did not score
+    fallback = [i for i in pending if results[i] is None]
+    if fallback:
+        try:
+            args = [_window_args(windows[i])[:3] for i in fallback]
+            fallback_results = rule_based_predictions(
+                [prediction_ids[i] for i in fallback], *(list(column) for column in zip(*args))
+            )
+            for i, result in zip(fallback, fallback_results):
+                results[i] = result
+        except Exception as e:
+            print(f"Error in batch rule-based prediction: {e}")
+            # Score one at a time so a single malformed window only fails itself
+            for i in fallback:
+                try:
+                    glucose, insulin, carbs = _window_args(windows[i])[:3]
+                    results[i] = rule_based_prediction(prediction_ids[i], glucose[-1], glucose, insulin, carbs)
+                except Exception as e:
+                    results[i] = {"error": str(e)}
+
+    return results
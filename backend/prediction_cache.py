@@ -0,0 +1,96 @@
+# prediction_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results with a time-to-live.
+
+    Keys are a hash of the model version plus the scaled model input window
+    quantized to `quantum`, so re-scoring an unchanged window (dashboard
+    polling, retries) returns the original result - including its
+    prediction_id - without another forward pass or recommendation.
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=300.0, quantum=1e-3):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.quantum = quantum
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def key(self, model_version, input_window):
+        """Hash of the model version and the quantized [12, F] input window"""
+        window = np.asarray(input_window, dtype=np.float64)
+        quantized = np.round(window / self.quantum).astype(np.int64)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(model_version).encode())
+        digest.update(str(quantized.shape).encode())
+        digest.update(quantized.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return a copy of the cached result (marked `cached`), or None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return {**result, 'cached': True}
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after a model reload)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
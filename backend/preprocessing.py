@@ -1,6 +1,8 @@
 # preprocessing.py
+import os
+from functools import lru_cache
+
 import numpy as np
-import pandas as pd
 
 def prepare_input_data(recent_glucose_data, recent_insulin_data, recent_meal_data,
                       recent_activity_data=None, recent_hr_data=None, recent_gsr_data=None,
@@ -11,40 +13,11 @@ def prepare_input_data(recent_glucose_data, recent_insulin_data, recent_meal_dat
     Returns:
         Preprocessed input sequence ready for model prediction
     """
-    # Use the most recent 12 readings
-    glucose_data = recent_glucose_data[-12:]
-
-    # Create a dataframe with the input data
-    input_df = pd.DataFrame({
-        'cbg': glucose_data,
-        'basal': recent_insulin_data.get('basal', [0] * len(glucose_data))[-12:],
-        'bolus': recent_insulin_data.get('bolus', [0] * len(glucose_data))[-12:],
-        'carbInput': recent_meal_data[-12:] if len(recent_meal_data) >= 12 else [0] * 12,
-        'hr': recent_hr_data[-12:] if recent_hr_data and len(recent_hr_data) >= 12 else [70] * 12,  # Default HR
-        'gsr': recent_gsr_data[-12:] if recent_gsr_data and len(recent_gsr_data) >= 12 else [1] * 12   # Default GSR
-    })
-
-    # Calculate glucose changes
-    input_df['glucose_change'] = input_df['cbg'].diff().fillna(0)
-    input_df['glucose_acceleration'] = input_df['glucose_change'].diff().fillna(0)
-
-    # Calculate rolling statistics
-    input_df['glucose_rolling_mean_1h'] = input_df['cbg'].rolling(window=12, min_periods=1).mean()
-    input_df['glucose_rolling_std_1h'] = input_df['cbg'].rolling(window=12, min_periods=1).std().fillna(0)
-
-    # Calculate insulin on board (simplified version)
-    input_df['insulin_on_board'] = calculate_insulin_on_board(input_df['bolus'])
-    
-    # Calculate carbs on board (simplified version)
-    input_df['carbs_on_board'] = calculate_carbs_on_board(input_df['carbInput'])
-
-    # Ensure all required feature columns exist
-    for col in feature_columns:
-        if col not in input_df.columns:
-            input_df[col] = 0
-
-    # Extract features in the correct order
-    input_features = input_df[feature_columns].values
+    input_features = build_feature_matrix(
+        recent_glucose_data, recent_insulin_data, recent_meal_data,
+        recent_activity_data, recent_hr_data, recent_gsr_data,
+        feature_columns
+    )
 
     # Scale the features
     input_features_scaled = feature_scaler.transform(input_features)
@@ -54,66 +27,231 @@ def prepare_input_data(recent_glucose_data, recent_insulin_data, recent_meal_dat
 
     return input_sequence
 
-def calculate_insulin_on_board(bolus_series):
-    """Calculate insulin on board based on bolus history"""
-    # Simple exponential decay model
-    iob = [0] * len(bolus_series)
+def prepare_input_batch(feature_matrices, feature_scaler):
+    """
+    Scale unscaled [12, F] feature matrices (a list or a stacked [N, 12, F] array) in one call
     
-    # Assuming insulin activity peaks at 1 hour and then declines over 4 hours
-    # For each timepoint, calculate the remaining insulin from previous boluses
-    for i in range(len(bolus_series)):
-        iob[i] = bolus_series[i]  # Add current bolus
-        
-        # Add remaining effect from previous boluses (last 12 timepoints, assuming 5-min intervals = 1 hour)
-        for j in range(max(0, i-12), i):
-            time_diff = i - j  # Number of time intervals past
-            
-            # Decay factor based on time passed (simplified pharmacokinetic model)
-            if time_diff <= 3:  # First 15 minutes (assuming 5-min intervals)
-                decay_factor = 0.9  # 90% still active
-            elif time_diff <= 6:  # 15-30 minutes
-                decay_factor = 0.8  # 80% still active
-            elif time_diff <= 12:  # 30-60 minutes
-                decay_factor = 0.7  # 70% still active
-            elif time_diff <= 24:  # 1-2 hours
-                decay_factor = 0.5  # 50% still active
-            elif time_diff <= 36:  # 2-3 hours
-                decay_factor = 0.3  # 30% still active
-            elif time_diff <= 48:  # 3-4 hours
-                decay_factor = 0.1  # 10% still active
-            else:  # After 4 hours
-                decay_factor = 0.0  # No longer active
-                
-            iob[i] += bolus_series[j] * decay_factor
+    Returns:
+        Input sequences of shape [N, 12, F] ready for a single model call
+    """
+    stacked = np.asarray(feature_matrices) if isinstance(feature_matrices, np.ndarray) else np.stack(feature_matrices)
+    n_windows, steps, n_features = stacked.shape
+    scaled = feature_scaler.transform(stacked.reshape(n_windows * steps, n_features))
+    return scaled.reshape(n_windows, steps, n_features)
+
+WINDOW_LENGTH = 12  # 12 x 5-minute readings = 1 hour
+STEP_MINUTES = 5
+
+# Bolus / carb history kept for IOB and COB (default 72 steps = 6 hours), so
+# doses from before the 1-hour model window still contribute
+EVENT_HISTORY_STEPS = int(os.environ.get('EVENT_HISTORY_STEPS', 72))
+
+# Step decay tables as (max steps since dose, fraction still active); the
+# current step counts at 100%. Both run out to 48 steps (4 hours).
+INSULIN_DECAY_TABLE = [(3, 0.9), (6, 0.8), (12, 0.7), (24, 0.5), (36, 0.3), (48, 0.1)]
+CARB_DECAY_TABLE = [(2, 0.8), (4, 0.5), (6, 0.2), (48, 0.05)]
+
+def step_decay_kernel(table):
+    """Expand a step decay table into a kernel indexed by steps since the dose"""
+    kernel = np.zeros(table[-1][0] + 1)
+    kernel[0] = 1.0
+    previous = 0
+    for max_steps, factor in table:
+        kernel[previous + 1:max_steps + 1] = factor
+        previous = max_steps
+    return kernel
+
+def exponential_decay_kernel(half_life_steps, length=48):
+    """Single-exponential decay with the given half-life (in 5-minute steps)"""
+    return 0.5 ** (np.arange(length + 1) / half_life_steps)
+
+def biexponential_decay_kernel(tau_fast_steps, tau_slow_steps, length=48):
+    """
+    Fraction remaining of a two-compartment (absorption then elimination)
+    process with time constants in 5-minute steps; starts at 1 and decays
+    more slowly at first than a single exponential.
+    """
+    k = np.arange(length + 1)
+    return ((tau_slow_steps * np.exp(-k / tau_slow_steps) - tau_fast_steps * np.exp(-k / tau_fast_steps))
+            / (tau_slow_steps - tau_fast_steps))
+
+def make_decay_kernel(kind, table):
+    """Build a named decay kernel ('step', 'exponential' or 'biexponential')"""
+    length = table[-1][0]
+    if kind == 'step':
+        return step_decay_kernel(table)
+    if kind == 'exponential':
+        # Match the step table's half-activity point
+        half_life = next(steps for steps, factor in table if factor <= 0.5)
+        return exponential_decay_kernel(half_life, length)
+    if kind == 'biexponential':
+        return biexponential_decay_kernel(length / 8, length / 4, length)
+    raise ValueError(f"Unknown decay kernel: {kind}")
+
+# Decay kernels used for insulin on board / carbs on board (IOB_KERNEL / COB_KERNEL)
+IOB_DECAY_KERNEL = make_decay_kernel(os.environ.get('IOB_KERNEL', 'step'), INSULIN_DECAY_TABLE)
+COB_DECAY_KERNEL = make_decay_kernel(os.environ.get('COB_KERNEL', 'step'), CARB_DECAY_TABLE)
+
+def _last_window(values, name, length=WINDOW_LENGTH):
+    """Take the most recent `length` values as a float array"""
+    array = np.asarray(values, dtype=np.float64)[-length:]
+    if array.shape != (length,):
+        raise ValueError(f"{name} must have at least {length} values, got {array.shape[0]}")
+    return array
+
+def _event_history(values, name):
+    """Most recent EVENT_HISTORY_STEPS event values, left-padded with zeros"""
+    array = np.asarray(values, dtype=np.float64)[-EVENT_HISTORY_STEPS:]
+    if array.ndim != 1 or len(array) < WINDOW_LENGTH:
+        raise ValueError(f"{name} must have at least {WINDOW_LENGTH} values")
+    history = np.zeros(max(EVENT_HISTORY_STEPS, WINDOW_LENGTH))
+    history[len(history) - len(array):] = array
+    return history
+
+def window_series(recent_glucose_data, recent_insulin_data, recent_meal_data,
+                  recent_hr_data=None, recent_gsr_data=None):
+    """
+    Normalize one raw input window into fixed-length arrays, applying the same
+    defaults the model has always used (no carbs, HR 70, GSR 1)
     
-    return iob
+    Returns:
+        Tuple of (cbg, basal, bolus, carbInput, hr, gsr). Bolus and carbs
+        carry EVENT_HISTORY_STEPS of (zero-padded) history for IOB/COB; the
+        other arrays have length 12.
+    """
+    zeros = [0] * WINDOW_LENGTH
+    cbg = _last_window(recent_glucose_data, 'glucose_readings')
+    basal = _last_window(recent_insulin_data.get('basal', zeros), 'basal')
+    bolus = _event_history(recent_insulin_data.get('bolus', zeros), 'bolus')
+    carbs = _event_history(recent_meal_data if len(recent_meal_data) >= WINDOW_LENGTH else zeros, 'carbs')
+    hr = _last_window(recent_hr_data if recent_hr_data and len(recent_hr_data) >= WINDOW_LENGTH
+                      else [70] * WINDOW_LENGTH, 'heart_rate')
+    gsr = _last_window(recent_gsr_data if recent_gsr_data and len(recent_gsr_data) >= WINDOW_LENGTH
+                       else [1] * WINDOW_LENGTH, 'gsr')
+    return cbg, basal, bolus, carbs, hr, gsr
 
-def calculate_carbs_on_board(carbs_series):
-    """Calculate carbs on board based on carbohydrate intake history"""
-    # Initialize COB array
-    cob = [0] * len(carbs_series)
+@lru_cache(maxsize=32)
+def _lag_matrix(steps):
+    """lag[t, j] = t - j for a window of `steps` time steps"""
+    return np.arange(steps)[:, None] - np.arange(steps)[None, :]
+
+@lru_cache(maxsize=32)
+def _rolling_mask(steps, window):
+    lag = _lag_matrix(steps)
+    mask = ((lag >= 0) & (lag < window)).astype(np.float64)
+    return mask, mask.sum(axis=1)
+
+# Series up to this length are convolved with a cached Toeplitz matmul; longer
+# ones use np.convolve so the cost stays linear in the history length
+TOEPLITZ_MAX_STEPS = 256
+
+@lru_cache(maxsize=32)
+def _convolution_matrix(steps, kernel):
+    """Transposed lower-triangular Toeplitz matrix with weights[t, j] = kernel[t - j]"""
+    kernel = np.asarray(kernel, dtype=np.float64)
+    lag = _lag_matrix(steps)
+    weights = np.where((lag >= 0) & (lag < len(kernel)), kernel[np.clip(lag, 0, len(kernel) - 1)], 0.0)
+    return np.ascontiguousarray(weights.T)
+
+def causal_convolve(series, kernel):
+    """
+    Causal convolution along the last (time) axis: out[t] = sum_k kernel[k] * series[t - k]
     
-    # Simple model: Carbs are absorbed over approximately 3-4 hours
-    # With peak impact at around 30-60 minutes
+    Works on a single series [T] or a batch [N, T] of any length
+    """
+    series = np.asarray(series, dtype=np.float64)
+    kernel = np.asarray(kernel, dtype=np.float64)
+    steps = series.shape[-1]
+    if steps <= TOEPLITZ_MAX_STEPS:
+        return series @ _convolution_matrix(steps, tuple(kernel[:steps]))
+    flat = series.reshape(-1, steps)
+    out = np.stack([np.convolve(row, kernel)[:steps] for row in flat])
+    return out.reshape(series.shape)
+
+def build_feature_windows(cbg, basal, bolus, carbs, hr, gsr, feature_columns):
+    """
+    NumPy-only feature builder for one window [12] or a stacked batch [N, 12]
     
-    # For each timepoint, calculate the remaining carbs from previous intakes
-    for i in range(len(carbs_series)):
-        cob[i] = carbs_series[i]  # Add current carb intake
-        
-        # Add remaining effect from previous intakes (last 8 timepoints, assuming 5-min intervals)
-        for j in range(max(0, i-8), i):
-            time_diff = i - j  # Number of time intervals past
-            
-            # Decay factor based on time passed
-            if time_diff <= 2:  # First hour (assuming 5-min intervals)
-                decay_factor = 0.8  # 80% still active
-            elif time_diff <= 4:  # Second hour
-                decay_factor = 0.5  # 50% still active
-            elif time_diff <= 6:  # Third hour
-                decay_factor = 0.2  # 20% still active
-            else:  # Fourth hour and beyond
-                decay_factor = 0.05  # 5% still active
-                
-            cob[i] += carbs_series[j] * decay_factor
+    Produces the features of the original pandas implementation (diff,
+    rolling mean/std, IOB, COB) in feature_columns order; parity with a
+    frozen copy of it is tested in tests/test_preprocessing.py. Bolus and
+    carbs may carry a longer history ([H] or [N, H], H >= 12); IOB/COB are
+    computed over the whole history and the last 12 steps are kept.
     
-    return cob
\ No newline at end of file
+    Returns:
+        Unscaled features of shape [12, F] or [N, 12, F]
+    """
+    cbg = np.asarray(cbg, dtype=np.float64)
+    single = cbg.ndim == 1
+    cbg = np.atleast_2d(cbg)
+    n_windows, steps = cbg.shape
+
+    def as_batch(values):
+        values = np.asarray(values, dtype=np.float64)
+        return np.broadcast_to(values, (n_windows, values.shape[-1]))
+
+    basal, bolus, carbs, hr, gsr = (as_batch(v) for v in (basal, bolus, carbs, hr, gsr))
+
+    # Insulin / carbs on board over the full event history, then trim to the window
+    insulin_on_board = causal_convolve(bolus, IOB_DECAY_KERNEL)[:, -steps:]
+    carbs_on_board = causal_convolve(carbs, COB_DECAY_KERNEL)[:, -steps:]
+    bolus = bolus[:, -steps:]
+    carbs = carbs[:, -steps:]
+
+    # Glucose changes (first differences, 0 for the first step)
+    glucose_change = np.zeros_like(cbg)
+    glucose_change[:, 1:] = np.diff(cbg, axis=1)
+    glucose_acceleration = np.zeros_like(cbg)
+    glucose_acceleration[:, 1:] = np.diff(glucose_change, axis=1)
+
+    # Rolling 1h statistics (window of 12, min_periods=1) via a window mask
+    mask, counts = _rolling_mask(steps, WINDOW_LENGTH)                # [T, T], [T]
+    rolling_mean = (cbg @ mask.T) / counts
+    deviations = (cbg[:, None, :] - rolling_mean[:, :, None]) * mask  # [N, T, T]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolling_var = (deviations ** 2).sum(axis=2) / (counts - 1)
+    rolling_std = np.where(counts > 1, np.sqrt(rolling_var), 0.0)
+
+    features = {
+        'cbg': cbg,
+        'glucose_change': glucose_change,
+        'glucose_acceleration': glucose_acceleration,
+        'glucose_rolling_mean_1h': rolling_mean,
+        'glucose_rolling_std_1h': rolling_std,
+        'basal': basal,
+        'bolus': bolus,
+        'carbInput': carbs,
+        'insulin_on_board': insulin_on_board,
+        'carbs_on_board': carbs_on_board,
+        'hr': hr,
+        'gsr': gsr,
+    }
+
+    # Stack in feature_columns order; unknown columns are zero-filled
+    zeros = np.zeros_like(cbg)
+    stacked = np.stack([features.get(col, zeros) for col in feature_columns], axis=-1)
+    return stacked[0] if single else stacked
+
+def build_feature_matrix(recent_glucose_data, recent_insulin_data, recent_meal_data,
+                         recent_activity_data=None, recent_hr_data=None, recent_gsr_data=None,
+                         feature_columns=None):
+    """
+    Build the unscaled [12, F] feature matrix for one window, in feature_columns order
+    """
+    series = window_series(
+        recent_glucose_data, recent_insulin_data, recent_meal_data,
+        recent_hr_data, recent_gsr_data
+    )
+    return build_feature_windows(*series, feature_columns)
+
+def calculate_insulin_on_board(bolus_series, kernel=None):
+    """Calculate insulin on board based on bolus history"""
+    # Remaining insulin from every earlier bolus, weighted by the decay kernel
+    # (step table out to 4 hours by default, see INSULIN_DECAY_TABLE)
+    return causal_convolve(bolus_series, IOB_DECAY_KERNEL if kernel is None else kernel).tolist()
+
+def calculate_carbs_on_board(carbs_series, kernel=None):
+    """Calculate carbs on board based on carbohydrate intake history"""
+    # Remaining carbs from every earlier intake, weighted by the decay kernel
+    # (step table out to 4 hours by default, see CARB_DECAY_TABLE)
+    return causal_convolve(carbs_series, COB_DECAY_KERNEL if kernel is None else kernel).tolist()
@@ -0,0 +1,130 @@
+# recent_data.py
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# 'aggregate' builds the home-screen payload in one $unionWith/$facet round-trip;
+# 'parallel' runs one projected find() per collection concurrently. Aggregate
+# falls back to parallel on servers without $unionWith (MongoDB < 4.4).
+RECENT_DATA_MODE = os.environ.get('RECENT_DATA_MODE', 'aggregate').lower()
+
+# Timeline sources: (type, limit, fields projected into each timeline entry)
+TIMELINE_SOURCES = [
+    ('glucose', 20, {'value': '$value'}),
+    ('insulin', 10, {'value': '$dose', 'insulin_type': '$insulin_type'}),
+    ('meal', 10, {'value': '$carbs', 'meal_type': {'$ifNull': ['$meal_type', '']}}),
+    ('activity', 5, {'value': '$duration', 'activity_type': '$activity_type'}),
+]
+
+_executor = ThreadPoolExecutor(max_workers=len(TIMELINE_SOURCES), thread_name_prefix='recent-data')
+
+
+def _source_stages(entry_type, limit, fields, query):
+    return [
+        {'$match': query},
+        {'$sort': {'timestamp': -1}},
+        {'$limit': limit},
+        {'$project': {
+            '_id': 0,
+            'type': {'$literal': entry_type},
+            'timestamp': 1,
+            'id': {'$toString': '$_id'},
+            **fields
+        }}
+    ]
+
+
+def build_recent_pipeline(collections, query):
+    """
+    One pipeline over the glucose collection that unions in the other sources
+    and returns {timeline: [...newest first], glucose_data: [...oldest first]}.
+    """
+    (first_type, first_limit, first_fields), *others = TIMELINE_SOURCES
+    pipeline = _source_stages(first_type, first_limit, first_fields, query)
+    for entry_type, limit, fields in others:
+        pipeline.append({'$unionWith': {
+            'coll': collections[entry_type].name,
+            'pipeline': _source_stages(entry_type, limit, fields, query)
+        }})
+    pipeline += [
+        {'$sort': {'timestamp': -1}},
+        {'$facet': {
+            'timeline': [],
+            'glucose_data': [
+                {'$match': {'type': 'glucose'}},
+                {'$sort': {'timestamp': 1}},
+                {'$project': {
+                    '_id': 0,
+                    'time': {'$dateToString': {'format': '%H:%M', 'date': '$timestamp'}},
+                    'value': 1
+                }}
+            ]
+        }}
+    ]
+    return pipeline
+
+
+def fetch_recent_aggregate(collections, query):
+    result = next(collections['glucose'].aggregate(build_recent_pipeline(collections, query)), None)
+    return result or {'timeline': [], 'glucose_data': []}
+
+
+def _find_source(collection, entry_type, limit, fields, query):
+    projection = {'timestamp': 1}
+    for name, source in fields.items():
+        source_field = source if isinstance(source, str) else source['$ifNull'][0]
+        projection[source_field.lstrip('$')] = 1
+    rows = []
+    for doc in collection.find(query, projection).sort('timestamp', -1).limit(limit):
+        entry = {'type': entry_type}
+        for name, source in fields.items():
+            if isinstance(source, str):
+                entry[name] = doc.get(source.lstrip('$'))
+            else:
+                field, default = source['$ifNull']
+                entry[name] = doc.get(field.lstrip('$'), default)
+        entry['timestamp'] = doc['timestamp']
+        entry['id'] = str(doc['_id'])
+        rows.append(entry)
+    return rows
+
+
+def fetch_recent_parallel(collections, query):
+    futures = [
+        _executor.submit(_find_source, collections[entry_type], entry_type, limit, fields, query)
+        for entry_type, limit, fields in TIMELINE_SOURCES
+    ]
+    timeline = [entry for future in futures for entry in future.result()]
+    timeline.sort(key=lambda x: x['timestamp'], reverse=True)
+    glucose = sorted((e for e in timeline if e['type'] == 'glucose'), key=lambda x: x['timestamp'])
+    return {
+        'timeline': timeline,
+        'glucose_data': [{'time': g['timestamp'].strftime('%H:%M'), 'value': g['value']} for g in glucose]
+    }
+
+
+# Server error code for an unknown aggregation stage
+UNRECOGNIZED_STAGE = 40324
+_aggregate_supported = True
+
+
+def fetch_recent(collections, query, mode=None):
+    """
+    Home-screen payload: a merged timeline of recent glucose, insulin, meal
+    and activity entries (newest first) plus the glucose series for the chart.
+    """
+    global _aggregate_supported
+    mode = mode or RECENT_DATA_MODE
+    if mode == 'aggregate' and _aggregate_supported:
+        try:
+            return fetch_recent_aggregate(collections, query)
+        except (OperationFailure, NotImplementedError) as e:
+            if isinstance(e, NotImplementedError) or e.code == UNRECOGNIZED_STAGE:
+                # $unionWith needs MongoDB 4.4+; use parallel finds from now on
+                _aggregate_supported = False
+            logger.warning(f"Aggregated recent data failed, using parallel queries: {e}")
+    return fetch_recent_parallel(collections, query)
@@ -0,0 +1,173 @@
+# resampling.py
+from datetime import datetime, timezone
+
+import numpy as np
+
+from preprocessing import WINDOW_LENGTH, STEP_MINUTES, EVENT_HISTORY_STEPS
+
+STEP_SECONDS = STEP_MINUTES * 60
+
+# Grid points further than this from the nearest reading are flagged as gaps
+MAX_GAP_MINUTES = {
+    'glucose': 15,
+    'heart_rate': 15,
+    'gsr': 15,
+}
+
+# Defaults used when a continuous signal has no readings at all
+DEFAULT_VALUES = {
+    'heart_rate': 70,
+    'gsr': 1,
+}
+
+
+def to_epoch_seconds(timestamps):
+    """Convert datetimes, ISO strings or epoch numbers to a float array of epoch seconds"""
+    seconds = np.empty(len(timestamps), dtype=np.float64)
+    for i, ts in enumerate(timestamps):
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        if isinstance(ts, datetime):
+            # Naive datetimes are stored as UTC (datetime.utcnow) throughout the app
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=timezone.utc)
+            seconds[i] = ts.timestamp()
+        else:
+            seconds[i] = float(ts)
+    return seconds
+
+
+def make_grid(end, steps):
+    """Epoch-second grid of `steps` points spaced 5 minutes apart, ending at `end`"""
+    return end - STEP_SECONDS * np.arange(steps - 1, -1, -1, dtype=np.float64)
+
+
+def _sorted(times, values):
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(times, kind='stable')
+    return times[order], values[order]
+
+
+def resample_continuous(times, values, grid, max_gap_minutes=15, default=None):
+    """
+    Linearly interpolate a continuous signal onto the grid (edges are held).
+
+    Returns (values, gap_mask) where gap_mask marks grid points further than
+    `max_gap_minutes` from the nearest reading.
+    """
+    if len(times) == 0:
+        fill = np.nan if default is None else default
+        return np.full(len(grid), fill, dtype=np.float64), np.ones(len(grid), dtype=bool)
+
+    times, values = _sorted(times, values)
+    resampled = np.interp(grid, times, values)
+
+    # Distance from each grid point to its nearest reading
+    idx = np.searchsorted(times, grid)
+    prev_gap = np.abs(grid - times[np.clip(idx - 1, 0, len(times) - 1)])
+    next_gap = np.abs(times[np.clip(idx, 0, len(times) - 1)] - grid)
+    nearest = np.minimum(prev_gap, next_gap)
+    return resampled, nearest > max_gap_minutes * 60
+
+
+def resample_events(times, values, grid):
+    """
+    Sum discrete events (boluses, carbs) into the 5-minute bin ending at each grid point.
+
+    Events before the first bin or after the last grid point are dropped.
+    """
+    binned = np.zeros(len(grid), dtype=np.float64)
+    if len(times) == 0:
+        return binned
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    # Bin i covers (grid[i] - step, grid[i]]
+    bins = np.ceil((times - grid[0]) / STEP_SECONDS).astype(np.int64)
+    in_range = (bins >= 0) & (bins < len(grid))
+    binned += np.bincount(bins[in_range], weights=values[in_range], minlength=len(grid))
+    return binned
+
+
+def resample_step(times, values, grid, default=0.0):
+    """Carry the most recent value forward (e.g. basal rates); `default` before the first"""
+    if len(times) == 0:
+        return np.full(len(grid), default, dtype=np.float64)
+    times, values = _sorted(times, values)
+    idx = np.searchsorted(times, grid, side='right') - 1
+    return np.where(idx >= 0, values[np.clip(idx, 0, None)], default)
+
+
+def _column(docs, field):
+    """Extract (times, values) for documents that carry a numeric `field`"""
+    pairs = [(doc['timestamp'], doc[field]) for doc in docs
+             if doc.get(field) is not None and doc.get('timestamp') is not None]
+    if not pairs:
+        return np.empty(0), np.empty(0)
+    timestamps, values = zip(*pairs)
+    return to_epoch_seconds(timestamps), np.asarray(values, dtype=np.float64)
+
+
+def resample_user_readings(glucose_docs, insulin_docs=(), meal_docs=(), vitals_docs=(),
+                           end=None, steps=WINDOW_LENGTH, history_steps=EVENT_HISTORY_STEPS):
+    """
+    Align timestamped readings onto a common 5-minute grid for prediction.
+
+    Documents use the same shape as the MongoDB collections: glucose
+    {timestamp, value}, insulin {timestamp, dose, insulin_type}, meals
+    {timestamp, carbs} and vitals {timestamp, heart_rate, gsr}. The grid ends
+    at `end` (epoch seconds or datetime; defaults to the latest glucose reading).
+
+    Returns a dict in the /api/predict input format (glucose_readings,
+    insulin {basal, bolus}, carbs, activity, heart_rate, gsr) plus `gaps`,
+    the per-signal gap masks over the 12-step window.
+    """
+    glucose_times, glucose_values = _column(glucose_docs, 'value')
+    if len(glucose_times) == 0:
+        raise ValueError("No timestamped glucose readings to resample")
+
+    if end is None:
+        end = glucose_times.max()
+    elif not isinstance(end, (int, float)):
+        end = to_epoch_seconds([end])[0]
+
+    history_steps = max(history_steps, steps)
+    grid = make_grid(end, history_steps)
+    window = grid[-steps:]
+
+    glucose, glucose_gaps = resample_continuous(
+        glucose_times, glucose_values, window, MAX_GAP_MINUTES['glucose']
+    )
+
+    insulin_docs = list(insulin_docs)
+    bolus_times, bolus_values = _column([d for d in insulin_docs if d.get('insulin_type') == 'bolus'], 'dose')
+    basal_times, basal_values = _column([d for d in insulin_docs if d.get('insulin_type') == 'basal'], 'dose')
+    meal_times, meal_values = _column(meal_docs, 'carbs')
+
+    vitals_docs = list(vitals_docs)
+    hr_times, hr_values = _column(vitals_docs, 'heart_rate')
+    gsr_times, gsr_values = _column(vitals_docs, 'gsr')
+    heart_rate, hr_gaps = resample_continuous(
+        hr_times, hr_values, window, MAX_GAP_MINUTES['heart_rate'], DEFAULT_VALUES['heart_rate']
+    )
+    gsr, gsr_gaps = resample_continuous(
+        gsr_times, gsr_values, window, MAX_GAP_MINUTES['gsr'], DEFAULT_VALUES['gsr']
+    )
+
+    return {
+        'glucose_readings': glucose.tolist(),
+        'insulin': {
+            'basal': resample_step(basal_times, basal_values, window).tolist(),
+            'bolus': resample_events(bolus_times, bolus_values, grid).tolist()
+        },
+        'carbs': resample_events(meal_times, meal_values, grid).tolist(),
+        'activity': [0] * steps,
+        'heart_rate': heart_rate.tolist(),
+        'gsr': gsr.tolist(),
+        'gaps': {
+            'glucose': glucose_gaps.tolist(),
+            'heart_rate': hr_gaps.tolist(),
+            'gsr': gsr_gaps.tolist()
+        },
+        'window_end': datetime.fromtimestamp(end, tz=timezone.utc).isoformat()
+    }
@@ -0,0 +1,118 @@
+# result_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from resampling import to_epoch_seconds
+
+
+def _epoch(ts):
+    return None if ts is None else float(to_epoch_seconds([ts])[0])
+
+
+class UserResultCache:
+    """
+    Bounded LRU cache of per-user derived results (chart series, profiles)
+    with a time-to-live.
+
+    Each entry records the time range of readings it was computed from, so
+    ingest only drops the entries a new reading can change: invalidate(user,
+    timestamps) removes that user's entries whose range covers any of the
+    timestamps. An entry with end=None covers everything from `start` on
+    (ranges ending "now"); the TTL bounds how stale such entries get as
+    "now" moves. Ranges and timestamps are compared as epoch seconds, so
+    naive (UTC) and timezone-aware datetimes can be mixed.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def _drop(self, key):
+        del self._entries[key]
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def get(self, user_id, params):
+        """Return a copy of the cached result (marked `cached`), or None"""
+        if not self.enabled:
+            return None
+        key = (user_id, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, _, result = entry
+            if now >= expires_at:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return {**result, 'cached': True}
+
+    def put(self, user_id, params, result, start=None, end=None):
+        """Cache `result` for (user_id, params), computed from readings in [start, end]"""
+        if not self.enabled:
+            return
+        key = (user_id, params)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, _epoch(start), _epoch(end), dict(result))
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_id, timestamps=None):
+        """Drop the user's entries covering any of `timestamps` (all of them if None)"""
+        seconds = None if timestamps is None else to_epoch_seconds(list(timestamps)).tolist()
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                _, start, end, _ = self._entries[key]
+                if seconds is None or any(
+                    (start is None or ts >= start) and (end is None or ts <= end) for ts in seconds
+                ):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'users': len(self._by_user),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,206 @@
+# rollups.py
+#
+# Rebuild after a migration or manual repair:
+#   python rollups.py [--user-id ID] [--since ISO] [--until ISO]
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from resampling import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Rollup granularities and their length in seconds (UTC-aligned)
+PERIODS = {'hour': 3600, 'day': 86400}
+
+# Consensus CGM range bounds in mg/dL. Counts nest: below_70 includes
+# below_54 and above_180 includes above_250.
+RANGE_COUNTS = {
+    'below_54': lambda v: v < 54,
+    'below_70': lambda v: v < 70,
+    'in_range': lambda v: (v >= 70) & (v <= 180),
+    'above_180': lambda v: v > 180,
+    'above_250': lambda v: v > 250,
+}
+
+# Readings fetched per round-trip by the rebuild job
+REBUILD_BATCH_SIZE = 5000
+
+
+def _to_datetime(seconds):
+    return datetime.fromtimestamp(float(seconds), tz=timezone.utc).replace(tzinfo=None)
+
+
+def aggregate_readings(seconds, values, period_seconds):
+    """
+    Per-bucket sufficient statistics for one user's readings.
+
+    Returns a list of (bucket_start_seconds, stats) where stats holds count,
+    sum, sum_sq, min, max and the RANGE_COUNTS counts. All buckets are
+    reduced together with np.unique / bincount.
+    """
+    if len(values) == 0:
+        return []
+    buckets = np.floor_divide(seconds, period_seconds) * period_seconds
+    starts, inverse = np.unique(buckets, return_inverse=True)
+    count = np.bincount(inverse)
+    fields = {
+        'count': count,
+        'sum': np.bincount(inverse, weights=values),
+        'sum_sq': np.bincount(inverse, weights=values * values),
+    }
+    for name, predicate in RANGE_COUNTS.items():
+        fields[name] = np.bincount(inverse, weights=predicate(values), minlength=len(starts)).astype(np.int64)
+    minimum = np.full(len(starts), np.inf)
+    maximum = np.full(len(starts), -np.inf)
+    np.minimum.at(minimum, inverse, values)
+    np.maximum.at(maximum, inverse, values)
+    fields['min'], fields['max'] = minimum, maximum
+    return [
+        (start, {name: array[i].item() for name, array in fields.items()})
+        for i, start in enumerate(starts)
+    ]
+
+
+def _group_by_user(docs):
+    grouped = {}
+    for doc in docs:
+        value = doc.get('value')
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            timestamps, values = grouped.setdefault(doc.get('user_id'), ([], []))
+            timestamps.append(doc['timestamp'])
+            values.append(value)
+    return {
+        user_id: (to_epoch_seconds(timestamps), np.asarray(values, dtype=np.float64))
+        for user_id, (timestamps, values) in grouped.items()
+    }
+
+
+def update_rollups(rollups, docs):
+    """
+    Fold newly inserted glucose readings into the hourly and daily rollups.
+
+    One unordered bulk_write of $inc/$min/$max upserts per call. Order does
+    not matter, so backfilled readings are folded in like live ones. Errors
+    are logged rather than raised - the readings are already stored, and
+    the rebuild job repairs any rollups that missed an update.
+    """
+    operations = []
+    now = datetime.utcnow()
+    for user_id, (seconds, values) in _group_by_user(docs).items():
+        for period, period_seconds in PERIODS.items():
+            for start, stats in aggregate_readings(seconds, values, period_seconds):
+                minimum, maximum = stats.pop('min'), stats.pop('max')
+                operations.append(UpdateOne(
+                    {'user_id': user_id, 'period': period, 'start': _to_datetime(start)},
+                    {'$inc': stats, '$min': {'min': minimum}, '$max': {'max': maximum},
+                     '$set': {'updated_at': now}},
+                    upsert=True
+                ))
+    if not operations:
+        return True
+    try:
+        rollups.bulk_write(operations, ordered=False)
+        return True
+    except PyMongoError as e:
+        logger.warning(f"Glucose rollup update failed ({len(operations)} buckets): {e}")
+        return False
+
+
+def rebuild_rollups(readings, rollups, user_id=None, since=None, until=None):
+    """
+    Recompute rollups from raw readings, e.g. after a migration or repair.
+
+    The range is widened to whole UTC days. For each user the existing
+    rollups in the range are replaced by freshly computed ones in one
+    bulk_write. Readings ingested for the same range while a rebuild runs
+    may be counted twice or not at all - rebuild quiet ranges or rerun.
+    Returns the number of rollup documents written.
+    """
+    day = PERIODS['day']
+    since = since or datetime(1970, 1, 1)
+    until = until or datetime.utcnow()
+    start = _to_datetime(np.floor(to_epoch_seconds([since])[0] / day) * day)
+    end = _to_datetime(np.ceil(to_epoch_seconds([until])[0] / day) * day)
+    if end <= start:
+        end = start + timedelta(seconds=day)
+
+    query = {'timestamp': {'$gte': start, '$lt': end}}
+    user_ids = [user_id] if user_id is not None else readings.distinct('user_id', query)
+    written = 0
+    now = datetime.utcnow()
+    for uid in user_ids:
+        cursor = (readings.find({**query, 'user_id': uid}, {'_id': 0, 'user_id': 1, 'timestamp': 1, 'value': 1})
+                  .batch_size(REBUILD_BATCH_SIZE))
+        seconds, values = _group_by_user(cursor).get(uid, (np.empty(0), np.empty(0)))
+        operations = [DeleteMany({'user_id': uid, 'start': {'$gte': start, '$lt': end}})]
+        for period, period_seconds in PERIODS.items():
+            for bucket_start, stats in aggregate_readings(seconds, values, period_seconds):
+                operations.append(InsertOne({
+                    'user_id': uid, 'period': period, 'start': _to_datetime(bucket_start),
+                    **stats, 'updated_at': now
+                }))
+        rollups.bulk_write(operations, ordered=True)
+        written += len(operations) - 1
+        logger.info(f"Rebuilt {len(operations) - 1} glucose rollups for user {uid}")
+    return written
+
+
+def summarize(docs):
+    """
+    Combine rollup documents into summary statistics.
+
+    Mean, SD and CV come from the pooled count / sum / sum of squares (SD is
+    the population SD over all readings), GMI uses the consensus formula
+    3.31 + 0.02392 * mean (mg/dL), and range percentages are shares of
+    readings.
+    """
+    count = sum(doc['count'] for doc in docs)
+    if count == 0:
+        return {'readings': 0}
+    total = sum(doc['sum'] for doc in docs)
+    total_sq = sum(doc['sum_sq'] for doc in docs)
+    mean = total / count
+    sd = float(np.sqrt(max(total_sq / count - mean * mean, 0.0)))
+    summary = {
+        'readings': count,
+        'mean': round(mean, 1),
+        'sd': round(sd, 1),
+        'cv': round(100 * sd / mean, 1) if mean else None,
+        'gmi': round(3.31 + 0.02392 * mean, 2),
+        'min': min(doc['min'] for doc in docs),
+        'max': max(doc['max'] for doc in docs),
+    }
+    for name in RANGE_COUNTS:
+        summary[f'percent_{name}'] = round(100 * sum(doc.get(name, 0) for doc in docs) / count, 1)
+    return summary
+
+
+def glucose_stats(rollups, user_id, start, end=None, period='day', series=False):
+    """Summary over [start, end) from `period` rollups, optionally with one entry per bucket"""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+    bounds = {'$gte': start} if end is None else {'$gte': start, '$lt': end}
+    docs = list(rollups.find({'user_id': user_id, 'period': period, 'start': bounds},
+                             {'_id': 0, 'user_id': 0, 'updated_at': 0}).sort('start', 1))
+    result = {'period': period, 'rollups': len(docs), **summarize(docs)}
+    if series:
+        result['series'] = [{'start': doc['start'], **summarize([doc])} for doc in docs]
+    return result
+
+
+if __name__ == '__main__':
+    from database.db import glucose_readings, glucose_rollups
+
+    parser = argparse.ArgumentParser(description='Rebuild hourly/daily glucose rollups from raw readings')
+    parser.add_argument('--user-id', help='Only this user (default: every user with readings in range)')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='Start of the range (ISO, UTC)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='End of the range (ISO, UTC, default now)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    count = rebuild_rollups(glucose_readings, glucose_rollups, args.user_id, args.since, args.until)
+    print(f"Rebuilt {count} rollup documents")
@@ -0,0 +1,125 @@
+# rule_based.py
+import numpy as np
+
+
+def rule_based_inputs(glucose_windows, insulin_windows, meal_windows):
+    """
+    Reduce per-patient inputs to the four values the rules use.
+
+    Returns float arrays (current_glucose, trend, recent_carbs, recent_bolus):
+    trend is the 2-step slope over the last 3 readings (0 with fewer), and the
+    carb / bolus totals cover the last 3 steps.
+    """
+    count = len(glucose_windows)
+    current = np.empty(count)
+    trend = np.zeros(count)
+    carbs = np.empty(count)
+    bolus = np.empty(count)
+    for i, (glucose, insulin, meals) in enumerate(zip(glucose_windows, insulin_windows, meal_windows)):
+        current[i] = glucose[-1]
+        if len(glucose) >= 3:
+            trend[i] = (glucose[-1] - glucose[-3]) / 2
+        carbs[i] = sum(meals[-3:] if meals else [0])
+        bolus[i] = sum((insulin or {}).get('bolus', [0])[-3:])
+    return current, trend, carbs, bolus
+
+
+def rule_based_scores(current_glucose, trend, recent_carbs, recent_bolus):
+    """
+    Vectorized rule-based risk scores for a batch of patients.
+
+    Takes equal-length arrays and returns a dict of arrays: hypo_probability,
+    hyper_probability, time_to_hypo and time_to_hyper (minutes). Results are
+    identical to rule_based_scores_scalar applied element-wise.
+    """
+    c = np.asarray(current_glucose, dtype=np.float64)
+    t = np.asarray(trend, dtype=np.float64)
+    recent_carbs = np.asarray(recent_carbs, dtype=np.float64)
+    recent_bolus = np.asarray(recent_bolus, dtype=np.float64)
+
+    # Probability ladders based on current level and trend (first match wins)
+    hypo = np.select(
+        [c < 70, (c < 80) & (t < -1), (c < 90) & (t < 0), (c < 100) & (t < -2)],
+        [0.9, 0.7, 0.5, 0.4],
+        default=np.maximum(0.1, np.minimum(0.3, 1 - (c / 120)))
+    )
+    hyper = np.select(
+        [c > 180, (c > 160) & (t > 1), (c > 140) & (t > 0), (c > 120) & (t > 2)],
+        [0.9, 0.7, 0.5, 0.4],
+        default=np.maximum(0.1, np.minimum(0.3, c / 200))
+    )
+
+    # High recent carb intake raises hyper risk and reduces hypo risk
+    carb_heavy = recent_carbs > 30
+    hyper = np.where(carb_heavy, np.minimum(0.95, hyper + 0.2), hyper)
+    hypo = np.where(carb_heavy, np.maximum(0.05, hypo - 0.1), hypo)
+
+    # High recent insulin raises hypo risk and reduces hyper risk
+    bolus_heavy = recent_bolus > 2
+    hypo = np.where(bolus_heavy, np.minimum(0.95, hypo + 0.2), hypo)
+    hyper = np.where(bolus_heavy, np.maximum(0.05, hyper - 0.1), hyper)
+
+    # Time estimates from current values and trends
+    time_to_hypo = np.where(c < 70, 0, (c - 70) * np.where(t < 0, 3, 5))
+    time_to_hyper = np.where(c > 180, 0, (180 - c) * np.where(t > 0, 3, 5))
+
+    return {
+        'hypo_probability': np.clip(hypo, 0, 1),
+        'hyper_probability': np.clip(hyper, 0, 1),
+        'time_to_hypo': time_to_hypo.astype(np.float64),
+        'time_to_hyper': time_to_hyper.astype(np.float64)
+    }
+
+
+def rule_based_scores_scalar(current_glucose, trend, recent_carbs, recent_bolus):
+    """Reference scalar implementation of the rules (used for parity checks)"""
+    if current_glucose < 70:
+        hypo_prob = 0.9  # Already hypoglycemic
+    elif current_glucose < 80 and trend < -1:
+        hypo_prob = 0.7  # Heading toward hypo rapidly
+    elif current_glucose < 90 and trend < 0:
+        hypo_prob = 0.5  # Moderately at risk
+    elif current_glucose < 100 and trend < -2:
+        hypo_prob = 0.4  # Some risk due to rapid drop
+    else:
+        hypo_prob = max(0.1, min(0.3, 1 - (current_glucose / 120)))  # Base risk
+
+    if current_glucose > 180:
+        hyper_prob = 0.9  # Already hyperglycemic
+    elif current_glucose > 160 and trend > 1:
+        hyper_prob = 0.7  # Heading toward hyper rapidly
+    elif current_glucose > 140 and trend > 0:
+        hyper_prob = 0.5  # Moderately at risk
+    elif current_glucose > 120 and trend > 2:
+        hyper_prob = 0.4  # Some risk due to rapid rise
+    else:
+        hyper_prob = max(0.1, min(0.3, current_glucose / 200))  # Base risk
+
+    if recent_carbs > 30:
+        hyper_prob = min(0.95, hyper_prob + 0.2)
+        hypo_prob = max(0.05, hypo_prob - 0.1)
+
+    if recent_bolus > 2:
+        hypo_prob = min(0.95, hypo_prob + 0.2)
+        hyper_prob = max(0.05, hyper_prob - 0.1)
+
+    if current_glucose < 70:
+        time_to_hypo = 0  # Already in hypoglycemia
+    else:
+        time_to_hypo = (current_glucose - 70) * (3 if trend < 0 else 5)
+
+    if current_glucose > 180:
+        time_to_hyper = 0  # Already in hyperglycemia
+    else:
+        time_to_hyper = (180 - current_glucose) * (3 if trend > 0 else 5)
+
+    return {
+        'hypo_probability': max(0, min(1, hypo_prob)),
+        'hyper_probability': max(0, min(1, hyper_prob)),
+        'time_to_hypo': time_to_hypo,
+        'time_to_hyper': time_to_hyper
+    }
+
+
+def risk_level(probability):
+    return "High" if probability > 0.7 else "Medium" if probability > 0.3 else "Low"
@@ -0,0 +1,125 @@
+# runtime_models.py
+import os
+import threading
+
+import numpy as np
+
+# Exported models live in models/export/, named <MODEL_BASENAME>.<variant>.<ext>
+EXPORT_DIR = 'export'
+MODEL_BASENAME = 'glycemic_event_prediction_model'
+RUNTIME_EXTENSIONS = {'tflite': 'tflite', 'onnx': 'onnx'}
+VARIANTS = ('fp32', 'fp16', 'int8')
+MAX_BATCH = 64
+
+
+def export_filename(runtime, variant):
+    if runtime not in RUNTIME_EXTENSIONS:
+        raise ValueError(f"Unknown export runtime: {runtime}")
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown model variant: {variant} (expected one of {VARIANTS})")
+    return f"{MODEL_BASENAME}.{variant}.{RUNTIME_EXTENSIONS[runtime]}"
+
+
+def export_path(model_dir, runtime, variant):
+    return os.path.join(model_dir, EXPORT_DIR, export_filename(runtime, variant))
+
+
+def _tflite_interpreter_class():
+    # Prefer the standalone runtimes so serving does not need full TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """
+    TFLite model with a Keras-compatible `predict(x, batch_size=None, verbose=0)`.
+
+    Interpreters are not thread-safe and resizing them is slow, so one
+    interpreter is kept per power-of-two batch size (inputs are zero-padded
+    up to it), each guarded by its own lock.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.num_threads = num_threads or None
+        self._interpreter_class = _tflite_interpreter_class()
+        self._interpreters = {}
+        self._create_lock = threading.Lock()
+
+    def _interpreter(self, bucket):
+        entry = self._interpreters.get(bucket)
+        if entry is None:
+            with self._create_lock:
+                entry = self._interpreters.get(bucket)
+                if entry is None:
+                    interpreter = self._interpreter_class(model_path=self.path, num_threads=self.num_threads)
+                    input_detail = interpreter.get_input_details()[0]
+                    interpreter.resize_tensor_input(
+                        input_detail['index'], [bucket] + list(input_detail['shape'][1:])
+                    )
+                    interpreter.allocate_tensors()
+                    entry = (interpreter, input_detail['index'],
+                             interpreter.get_output_details()[0]['index'], threading.Lock())
+                    self._interpreters[bucket] = entry
+        return entry
+
+    def _run(self, x):
+        size = x.shape[0]
+        bucket = min(MAX_BATCH, 1 << (size - 1).bit_length())
+        if size < bucket:
+            padded = np.zeros((bucket,) + x.shape[1:], dtype=np.float32)
+            padded[:size] = x
+            x = padded
+        interpreter, input_index, output_index, lock = self._interpreter(bucket)
+        with lock:
+            interpreter.set_tensor(input_index, x)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)[:size].copy()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if x.shape[0] <= MAX_BATCH:
+            return self._run(x)
+        return np.concatenate([self._run(x[i:i + MAX_BATCH]) for i in range(0, x.shape[0], MAX_BATCH)])
+
+    __call__ = predict
+
+
+class OnnxModel:
+    """ONNX Runtime (CPU) model with a Keras-compatible `predict()`"""
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        self.path = path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        return self.session.run(None, {self.input_name: x})[0]
+
+    __call__ = predict
+
+
+def load_runtime_model(model_dir, runtime, variant, num_threads=None):
+    """Load an exported model for `runtime` ('tflite' or 'onnx') and `variant`"""
+    path = export_path(model_dir, runtime, variant)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found - run models/export_model.py first")
+    if runtime == 'tflite':
+        return TFLiteModel(path, num_threads)
+    return OnnxModel(path, num_threads)
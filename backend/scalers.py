@@ -0,0 +1,94 @@
+# scalers.py
+import hashlib
+import os
+
+import numpy as np
+
+# Affine scaler parameters extracted from the joblib pickles, so serving does
+# not need to import scikit-learn (regenerated whenever the pickles change)
+SCALER_PARAMS_FILE = 'scaler_params.npz'
+SCALER_FILES = ('feature_scaler.pkl', 'regression_scaler.pkl')
+
+
+class AffineScaler:
+    """
+    Drop-in replacement for a fitted MinMaxScaler using plain NumPy.
+
+    transform() computes X * scale + offset and inverse_transform() computes
+    (X - offset) / scale, in the same order as scikit-learn so results are
+    bit-identical, without its per-call validation. Both accept `out` to
+    write into a preallocated array (which may be X itself).
+    """
+
+    def __init__(self, scale, offset, clip_range=None):
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.clip_range = tuple(clip_range) if clip_range is not None else None
+        self.n_features_in_ = len(self.scale)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        if type(scaler).__name__ != 'MinMaxScaler':
+            raise TypeError(f"Unsupported scaler type: {type(scaler).__name__}")
+        clip_range = scaler.feature_range if getattr(scaler, 'clip', False) else None
+        return cls(scaler.scale_, scaler.min_, clip_range)
+
+    def transform(self, X, out=None):
+        out = np.multiply(X, self.scale, out=out)
+        out += self.offset
+        if self.clip_range is not None:
+            np.clip(out, self.clip_range[0], self.clip_range[1], out=out)
+        return out
+
+    def inverse_transform(self, X, out=None):
+        out = np.subtract(X, self.offset, out=out)
+        out /= self.scale
+        return out
+
+    def to_arrays(self, prefix):
+        arrays = {f'{prefix}_scale': self.scale, f'{prefix}_offset': self.offset}
+        if self.clip_range is not None:
+            arrays[f'{prefix}_clip'] = np.asarray(self.clip_range, dtype=np.float64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        clip = arrays.get(f'{prefix}_clip')
+        return cls(arrays[f'{prefix}_scale'], arrays[f'{prefix}_offset'], clip)
+
+
+def scaler_digest(model_dir):
+    """Hash of the scaler pickles, used to detect a stale parameter file"""
+    digest = hashlib.sha1()
+    for name in SCALER_FILES:
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_affine_scalers(model_dir):
+    """
+    Return (feature_scaler, regression_scaler) as AffineScalers.
+
+    Reads scaler_params.npz when it matches the pickles; otherwise unpickles
+    them with joblib (importing scikit-learn), extracts the parameters and
+    refreshes the .npz for the next start. Non-MinMax scalers raise TypeError.
+    """
+    digest = scaler_digest(model_dir)
+    params_path = os.path.join(model_dir, SCALER_PARAMS_FILE)
+    if os.path.exists(params_path):
+        with np.load(params_path) as stored:
+            arrays = dict(stored)
+        if str(arrays.get('digest')) == digest:
+            return AffineScaler.from_arrays(arrays, 'feature'), AffineScaler.from_arrays(arrays, 'regression')
+
+    import joblib
+    feature_scaler = AffineScaler.from_sklearn(joblib.load(os.path.join(model_dir, SCALER_FILES[0])))
+    regression_scaler = AffineScaler.from_sklearn(joblib.load(os.path.join(model_dir, SCALER_FILES[1])))
+    try:
+        np.savez(params_path, digest=np.asarray(digest),
+                 **feature_scaler.to_arrays('feature'), **regression_scaler.to_arrays('regression'))
+    except OSError:
+        # Read-only model directory - the pickles are used on every start instead
+        pass
+    return feature_scaler, regression_scaler
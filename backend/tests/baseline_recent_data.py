@@ -0,0 +1,26 @@
+# tests/baseline_recent_data.py
+#
+# The original /api/data/recent handler: four sequential full-document
+# queries merged in Python. Do not modify: it is the reference the projected
+# and aggregated versions in recent_data.py are checked against.
+
+
+def recent_sequential(collections, query):
+    """Home-screen payload exactly as the original implementation built it"""
+    limits = {'glucose': 20, 'insulin': 10, 'meal': 10, 'activity': 5}
+    docs = {kind: list(collections[kind].find(query).sort('timestamp', -1).limit(limit))
+            for kind, limit in limits.items()}
+    timeline = [{'type': 'glucose', 'value': d['value'], 'timestamp': d['timestamp'], 'id': str(d['_id'])}
+                for d in docs['glucose']]
+    timeline += [{'type': 'insulin', 'value': d['dose'], 'insulin_type': d['insulin_type'],
+                  'timestamp': d['timestamp'], 'id': str(d['_id'])} for d in docs['insulin']]
+    timeline += [{'type': 'meal', 'value': d['carbs'], 'meal_type': d.get('meal_type', ''),
+                  'timestamp': d['timestamp'], 'id': str(d['_id'])} for d in docs['meal']]
+    timeline += [{'type': 'activity', 'value': d['duration'], 'activity_type': d['activity_type'],
+                  'timestamp': d['timestamp'], 'id': str(d['_id'])} for d in docs['activity']]
+    timeline.sort(key=lambda x: x['timestamp'], reverse=True)
+    return {
+        'timeline': timeline,
+        'glucose_data': [{'time': g['timestamp'].strftime('%H:%M'), 'value': g['value']}
+                         for g in sorted(docs['glucose'], key=lambda x: x['timestamp'])]
+    }
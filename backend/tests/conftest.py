@@ -0,0 +1,34 @@
+# tests/conftest.py
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """The Flask app module, backed by an in-memory mongomock database"""
+    mongomock = pytest.importorskip('mongomock')
+    patch = pytest.MonkeyPatch()
+    patch.setenv('INFERENCE_BACKEND', 'numpy')
+    patch.setenv('MODEL_LOAD_MODE', 'lazy')
+    patch.setattr('pymongo.MongoClient', mongomock.MongoClient)
+    # utils.recommendation calls logging.basicConfig with a log file at import;
+    # a root handler makes that a no-op so test runs leave recommendation.log alone
+    logging.getLogger().addHandler(logging.NullHandler())
+    import app
+    yield app
+    patch.undo()
+
+
+@pytest.fixture
+def client(app_module):
+    """Test client with empty collections and caches"""
+    from database import db
+    for name in db.db.list_collection_names():
+        db.db[name].delete_many({})
+    app_module.glucose_view_cache.clear()
+    return app_module.app.test_client()
@@ -0,0 +1,41 @@
+# tests/reference_downsampling.py
+#
+# Textbook pure-Python downsamplers, one point at a time. They are the
+# reference the vectorized versions in downsampling.py are checked against
+# (tests/test_downsampling.py, benchmark.py chart).
+
+
+def lttb_reference(x, y, threshold):
+    """Largest-Triangle-Three-Buckets indices, as in Steinarsson's reference implementation"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n - 1)
+        if i == threshold - 3:
+            hi, next_lo, next_hi = n - 1, n - 1, n
+        avg_x = sum(x[next_lo:next_hi]) / (next_hi - next_lo)
+        avg_y = sum(y[next_lo:next_hi]) / (next_hi - next_lo)
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def minmax_reference(y, threshold):
+    """First and last points plus each equal-count bucket's lowest and highest point (threshold >= 4)"""
+    n = len(y)
+    buckets = (threshold - 2) // 2
+    width = -(-n // buckets)
+    selected = {0, n - 1}
+    for lo in range(0, n, width):
+        indices = range(lo, min(lo + width, n))
+        selected.add(min(indices, key=lambda i: y[i]))
+        selected.add(max(indices, key=lambda i: y[i]))
+    return sorted(selected)
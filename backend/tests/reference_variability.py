@@ -0,0 +1,57 @@
+# tests/reference_variability.py
+#
+# Straightforward per-user loop implementations of the glycemic variability
+# indexes. They are the reference the vectorized variability.py is checked
+# against (tests/test_variability.py, benchmark.py variability).
+import numpy as np
+
+
+def variability_reference(g, conga_hours=1, short_window=5, long_window=32):
+    """Every index for one user's series `g` (NaN = missing), with plain loops"""
+    day, lag = 288, 12 * conga_hours
+    valid = [t for t in range(len(g)) if not np.isnan(g[t])]
+    values = np.array([g[t] for t in valid])
+    mean, sd = values.mean(), values.std(ddof=1)
+
+    def risk(v):
+        f = 1.509 * (np.log(v) ** 1.084 - 5.381)
+        return (10 * f * f if f < 0 else 0.0), (10 * f * f if f > 0 else 0.0)
+
+    risks = [risk(v) for v in values]
+    lbgi = sum(r[0] for r in risks) / len(risks)
+    hbgi = sum(r[1] for r in risks) / len(risks)
+
+    daily = []
+    for start in range(0, len(g), day):
+        day_risks = [risk(v) for v in g[start:start + day] if not np.isnan(v)]
+        if day_risks:
+            daily.append(max(r[0] for r in day_risks) + max(r[1] for r in day_risks))
+    adrr = sum(daily) / len(daily)
+
+    lagged = [g[t] - g[t - lag] for t in range(lag, len(g)) if not np.isnan(g[t]) and not np.isnan(g[t - lag])]
+    conga = np.std(lagged, ddof=1)
+    modd = np.mean([abs(g[t] - g[t - day]) for t in range(day, len(g))
+                    if not np.isnan(g[t]) and not np.isnan(g[t - day])])
+
+    def trailing(t, window):
+        recent = [v for v in g[max(0, t - window + 1):t + 1] if not np.isnan(v)]
+        return sum(recent) / len(recent)
+
+    turning, current, current_up = [], None, None
+    for t in valid:
+        up = trailing(t, short_window) >= trailing(t, long_window)
+        if up != current_up:
+            if current is not None:
+                turning.append(current)
+            current, current_up = g[t], up
+        else:
+            current = max(current, g[t]) if up else min(current, g[t])
+    turning.append(current)
+    swings = [b - a for a, b in zip(turning, turning[1:]) if abs(b - a) > sd]
+    ups = [s for s in swings if s > 0]
+    downs = [-s for s in swings if s < 0]
+    directions = [np.mean(x) for x in (ups, downs) if x]
+    mage = np.mean(directions) if directions else np.nan
+
+    return {'mean': mean, 'sd': sd, 'j_index': 0.001 * (mean + sd) ** 2, 'lbgi': lbgi, 'hbgi': hbgi,
+            'adrr': adrr, 'conga': conga, 'modd': modd, 'mage': mage}
@@ -0,0 +1,47 @@
+# tests/test_batching.py
+import threading
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+def double(batch):
+    return batch * 2
+
+
+def test_batches_concurrent_windows():
+    batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=50)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.predict(np.full(3, i))))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert all(np.array_equal(results[i], np.full(3, 2 * i)) for i in range(8))
+    assert batcher.stats()['batch_size']['count'] < 8
+
+
+def test_submit_after_close_runs_inline_without_restarting():
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=1)
+    assert np.array_equal(batcher.predict(np.ones(2), timeout=5), [2, 2])
+    threads = list(batcher._threads)
+    batcher.close()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert np.array_equal(batcher.predict(np.ones(2), timeout=5), [2, 2])
+    assert not any(thread.is_alive() for thread in threads)
+    assert batcher.stats()['closed'] is True
+    assert batcher.stats()['queue_depth'] == 0
+
+
+def test_never_started_batcher_stays_stopped_after_close():
+    batcher = MicroBatcher(double)
+    batcher.close()
+
+    assert np.array_equal(batcher.predict(np.ones(2), timeout=5), [2, 2])
+    assert batcher._threads is None
@@ -0,0 +1,70 @@
+# tests/test_bulk_ingest.py
+import io
+import json
+
+from pymongo.errors import BulkWriteError
+
+from bulk_ingest import bulk_insert, iter_json, iter_ndjson, validate_record
+
+# The fake collection rejects this value, as a server-side validator would
+REJECTED_VALUE = 999
+
+
+class RecordingCollection:
+    """insert_many(ordered=False): stores every document except rejected ones, reporting their positions"""
+
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        errors = [{'index': i, 'code': 121, 'errmsg': 'Document failed validation'}
+                  for i, doc in enumerate(docs) if doc.get('value') == REJECTED_VALUE]
+        self.docs.extend(doc for doc in docs if doc.get('value') != REJECTED_VALUE)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(docs) - len(errors)})
+
+
+def mixed_records(count=50):
+    records = []
+    for i in range(count):
+        record = {'user_id': 'u1', 'timestamp': 1700000000 + 300 * i, 'value': 80 + i}
+        if i % 9 == 4:
+            del record['value']
+        elif i % 11 == 6:
+            record['value'] = 'high'
+        elif i % 13 == 8:
+            record['value'] = REJECTED_VALUE
+        records.append(record)
+    return records
+
+
+def sequential_reference(records):
+    """One record at a time, as the single-record endpoint stores them: (stored docs, failed indexes)"""
+    stored, failed = [], []
+    for index, record in enumerate(records):
+        try:
+            doc = validate_record('glucose', record)
+        except ValueError:
+            failed.append(index)
+            continue
+        if doc['value'] == REJECTED_VALUE:
+            failed.append(index)
+        else:
+            stored.append(doc)
+    return stored, failed
+
+
+def test_ndjson_and_json_batches_match_single_record_inserts():
+    records = mixed_records()
+    expected_docs, expected_failed = sequential_reference(records)
+    ndjson = io.BytesIO(b''.join(json.dumps(record).encode() + b'\n' for record in records))
+
+    for source in (iter_ndjson(ndjson), iter_json({'records': records})):
+        collection = RecordingCollection()
+        summary = bulk_insert(collection, 'glucose', source, chunk_size=7)
+
+        assert collection.docs == expected_docs
+        assert sorted(error['index'] for error in summary['errors']) == expected_failed
+        assert summary['inserted'] == len(expected_docs)
+        assert summary['failed'] == len(expected_failed)
+        assert sum(chunk['received'] for chunk in summary['chunks']) == len(records)
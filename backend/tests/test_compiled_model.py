@@ -0,0 +1,47 @@
+# tests/test_compiled_model.py
+import threading
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from compiled_model import CompiledModel  # noqa: E402
+
+
+def small_model():
+    return tf.keras.Sequential([
+        tf.keras.Input((12, 3)),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(2)
+    ])
+
+
+def test_concurrent_requests_trace_each_bucket_once():
+    compiled = CompiledModel(small_model(), batch_buckets=(1, 4))
+    traced = []
+    get_concrete_function = compiled._function.get_concrete_function
+
+    def counting(*args):
+        traced.append(args)
+        return get_concrete_function(*args)
+
+    compiled._function.get_concrete_function = counting
+    threads = [threading.Thread(target=compiled.predict, args=(np.zeros((3, 12, 3)),)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(traced) == 1
+    assert list(compiled._concrete) == [4]
+
+
+def test_trace_covers_every_bucket_and_matches_keras():
+    model = small_model()
+    compiled = CompiledModel(model, batch_buckets=(1, 2, 4))
+    compiled.trace()
+    assert sorted(compiled._concrete) == [1, 2, 4]
+
+    x = np.random.default_rng(0).normal(size=(9, 12, 3)).astype(np.float32)
+    np.testing.assert_allclose(compiled.predict(x), model.predict(x, verbose=0), atol=1e-5)
@@ -0,0 +1,56 @@
+# tests/test_downsampling.py
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from downsampling import DOWNSAMPLERS, lttb, minmax
+from tests.reference_downsampling import lttb_reference, minmax_reference
+
+
+def random_series(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(10, 3000))
+    x = np.cumsum(rng.uniform(200, 400, n))
+    y = 120 + np.cumsum(rng.normal(0, 4, n))
+    return x, y, int(rng.integers(4, n))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_lttb_matches_reference(seed):
+    x, y, threshold = random_series(seed)
+    assert list(lttb(x, y, threshold)) == lttb_reference(list(x), list(y), threshold)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_minmax_matches_reference(seed):
+    x, y, threshold = random_series(seed)
+    assert list(minmax(y, threshold)) == minmax_reference(list(y), threshold)
+
+
+@pytest.mark.parametrize('threshold', range(1, 12))
+def test_minmax_respects_small_budgets(threshold):
+    y = np.sin(np.arange(500) / 20.0)
+    y[137] = -5.0
+
+    indices = minmax(y, threshold)
+
+    assert len(indices) <= threshold
+    assert np.all(np.diff(indices) > 0)
+    if threshold >= 2:
+        assert indices[0] == 0 and indices[-1] == len(y) - 1
+    if threshold >= 3:
+        assert 137 in indices
+
+
+@pytest.mark.parametrize('method', sorted(DOWNSAMPLERS))
+def test_chart_points_within_budget(client, app_module, method):
+    start = datetime.utcnow() - timedelta(hours=20)
+    app_module.glucose_readings.insert_many(
+        [{'user_id': 'u1', 'value': 100 + i % 40, 'timestamp': start + timedelta(minutes=5 * i)} for i in range(200)]
+    )
+
+    body = client.get(f'/api/chart/glucose?user_id=u1&points=3&method={method}').get_json()
+
+    assert body['raw_points'] == 200
+    assert body['points'] == 3
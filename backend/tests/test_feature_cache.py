@@ -0,0 +1,82 @@
+# tests/test_feature_cache.py
+import os
+
+import numpy as np
+
+import preprocessing
+from feature_cache import STEP_SECONDS, FeatureWindowCache, UserFeatureState
+from preprocessing import WINDOW_LENGTH, build_feature_windows
+
+FEATURE_COLUMNS = np.load(os.path.join(os.path.dirname(preprocessing.__file__), 'models', 'feature_columns.npy'),
+                          allow_pickle=True).tolist()
+
+
+def random_stream(steps, seed=0):
+    """Per-step inputs; bolus/carbs/basal/vitals at step t arrive just before glucose reading t"""
+    rng = np.random.default_rng(seed)
+    return {
+        'cbg': rng.uniform(40, 400, steps),
+        'basal': rng.uniform(0, 2, steps),
+        'bolus': rng.choice([0, 0, 0, 0, 2.5, 8], steps),
+        'carbs': rng.choice([0, 0, 0, 30, 80], steps),
+        'hr': rng.uniform(50, 150, steps),
+        'gsr': rng.uniform(0, 5, steps),
+    }
+
+
+def rebuilt_window(stream, end):
+    """Reference: build_feature_windows over the full event history up to step `end` (exclusive)"""
+    window = slice(end - WINDOW_LENGTH, end)
+    return build_feature_windows(
+        stream['cbg'][window], stream['basal'][window], stream['bolus'][:end], stream['carbs'][:end],
+        stream['hr'][window], stream['gsr'][window], FEATURE_COLUMNS
+    )
+
+
+def feed(cache_or_state, stream, step, *user):
+    timestamp = step * STEP_SECONDS
+    cache_or_state.add_insulin(*user, timestamp, stream['basal'][step], 'basal')
+    if stream['bolus'][step]:
+        cache_or_state.add_insulin(*user, timestamp, stream['bolus'][step], 'bolus')
+    if stream['carbs'][step]:
+        cache_or_state.add_meal(*user, timestamp, stream['carbs'][step])
+    cache_or_state.add_vitals(*user, timestamp, stream['hr'][step], stream['gsr'][step])
+    cache_or_state.add_glucose(*user, timestamp, stream['cbg'][step])
+
+
+def test_incremental_window_matches_rebuild():
+    stream = random_stream(120)
+    state = UserFeatureState()
+
+    for step in range(120):
+        feed(state, stream, step)
+        if step + 1 >= WINDOW_LENGTH:
+            # Runs well past the IOB/COB kernel length, so the event rings wrap
+            np.testing.assert_allclose(state.window(FEATURE_COLUMNS), rebuilt_window(stream, step + 1),
+                                       rtol=0, atol=1e-9)
+
+
+def test_seeded_cache_continues_like_a_rebuild():
+    stream = random_stream(90, seed=1)
+    seeded_steps = 60
+
+    def loader(user_id):
+        window = slice(seeded_steps - WINDOW_LENGTH, seeded_steps)
+        resampled = {
+            'glucose_readings': stream['cbg'][window],
+            'insulin': {'basal': stream['basal'][window], 'bolus': stream['bolus'][:seeded_steps]},
+            'carbs': stream['carbs'][:seeded_steps],
+            'heart_rate': stream['hr'][window],
+            'gsr': stream['gsr'][window],
+        }
+        return resampled, (seeded_steps - 1) * STEP_SECONDS
+
+    cache = FeatureWindowCache(loader=loader)
+    np.testing.assert_allclose(cache.window('u1', FEATURE_COLUMNS), rebuilt_window(stream, seeded_steps),
+                               rtol=0, atol=1e-9)
+
+    for step in range(seeded_steps, 90):
+        feed(cache, stream, step, 'u1')
+        np.testing.assert_allclose(cache.window('u1', FEATURE_COLUMNS), rebuilt_window(stream, step + 1),
+                                   rtol=0, atol=1e-9)
+    assert cache.stats()['rebuilds'] == 1
@@ -0,0 +1,31 @@
+# tests/test_glucose_views.py
+from datetime import datetime, timedelta, timezone
+
+from result_cache import UserResultCache
+
+
+def test_invalidate_mixes_naive_and_aware_timestamps():
+    cache = UserResultCache()
+    start = datetime(2024, 1, 1)
+    cache.put('u1', ('chart',), {'points': 1}, start=start, end=start + timedelta(hours=2))
+    cache.put('u1', ('other',), {'points': 1}, start=start + timedelta(hours=6))
+
+    cache.invalidate('u1', [datetime(2024, 1, 1, 1, tzinfo=timezone.utc)])
+
+    assert cache.get('u1', ('chart',)) is None
+    assert cache.get('u1', ('other',)) is not None
+
+
+def test_aware_timestamp_after_cached_chart(client, app_module):
+    now = datetime.utcnow()
+    reading = {'user_id': 'u1', 'value': 120, 'timestamp': (now - timedelta(hours=1)).isoformat()}
+    assert client.post('/api/glucose', json=reading).status_code == 201
+    assert client.get('/api/chart/glucose?user_id=u1').get_json()['raw_points'] == 1
+    assert client.get('/api/chart/glucose?user_id=u1').get_json()['cached'] is True
+
+    aware = (now - timedelta(minutes=30)).replace(tzinfo=timezone.utc).isoformat()
+    response = client.post('/api/glucose', json={'user_id': 'u1', 'value': 140, 'timestamp': aware})
+
+    assert response.status_code == 201
+    assert app_module.glucose_readings.count_documents({'user_id': 'u1'}) == 2
+    assert app_module.glucose_view_cache.get('u1', ('chart', 1.0, app_module.CHART_DEFAULT_POINTS, 'lttb')) is None
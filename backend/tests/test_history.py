@@ -0,0 +1,29 @@
+# tests/test_history.py
+from datetime import datetime, timedelta
+
+import history
+
+
+def test_keyset_pages_match_one_sorted_query(client, app_module, monkeypatch):
+    # Small chunks so pages are assembled from several streamed pieces
+    monkeypatch.setattr(history, 'HISTORY_CHUNK_DOCS', 3)
+    now = datetime.utcnow().replace(microsecond=0)
+    # Three readings per timestamp, so page boundaries fall inside ties
+    app_module.glucose_readings.insert_many(
+        [{'user_id': 'u1', 'value': 100 + i, 'timestamp': now - timedelta(minutes=5 * (i // 3))} for i in range(46)]
+        + [{'user_id': 'u2', 'value': 90, 'timestamp': now}]
+    )
+    expected = [str(doc['_id']) for doc in app_module.glucose_readings.find({'user_id': 'u1'})
+                .sort([('timestamp', -1), ('_id', -1)])]
+
+    paged, token = [], None
+    while True:
+        url = '/api/glucose?user_id=u1&limit=7' + (f'&cursor={token}' if token else '')
+        body = client.get(url).get_json()
+        assert len(body['readings']) <= 7
+        paged += [doc['_id'] for doc in body['readings']]
+        token = body['next_cursor']
+        if token is None:
+            break
+
+    assert paged == expected
@@ -0,0 +1,105 @@
+# tests/test_model_registry.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from model_registry import ModelRegistry, ShadowRunner
+
+
+def test_shadow_counters_are_exact_under_concurrent_submits():
+    runner = ShadowRunner(max_queue=64)
+    release = threading.Event()
+    threads = [threading.Thread(target=lambda: [runner.submit(release.wait) for _ in range(500)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    stats = runner.stats()
+    assert stats['submitted'] + stats['dropped'] == 8 * 500
+    assert stats['dropped'] > 0
+
+
+class FakeModel:
+    def predict(self, batch, verbose=0):
+        return np.asarray(batch).sum(axis=(1, 2))[:, np.newaxis]
+
+
+class FakeManager:
+    FAILED = 'failed'
+
+    def __init__(self, name):
+        self.name = self.tag = name
+        self.state, self.error = 'ready', None
+        self.model = FakeModel()
+
+    def load(self):
+        return True
+
+    def is_ready(self):
+        return True
+
+
+@pytest.fixture
+def serving(app_module, monkeypatch):
+    """prediction's serving hooks on a registry of fake managers, with a short grace period"""
+    import prediction
+    monkeypatch.setattr(prediction, 'MODEL_RETIRE_GRACE_SECONDS', 0.05)
+    registry = ModelRegistry('unused', 'unused', on_loaded=prediction._serving_for,
+                             on_retire=prediction._retire_serving)
+    monkeypatch.setattr(registry, '_new_manager', FakeManager)
+    yield prediction, registry
+    for manager in list(registry._versions.values()):
+        prediction._retire_serving(manager)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+WINDOW = np.ones((1, 12, 12), dtype=np.float32)
+
+
+def test_reload_retires_the_old_serving_entry(serving):
+    prediction, registry = serving
+    old = registry.register('default')
+    registry.activate('default')
+    old_batcher = prediction._serving[old][0]
+    assert prediction.run_model(old, WINDOW)[0, 0] == 144
+
+    new = registry.register('default')
+
+    assert registry.active() is new and new in prediction._serving
+    # In-flight requests keep the old entry during the grace period
+    assert prediction._serving.get(old, (None,))[0] is old_batcher
+    assert wait_until(lambda: old not in prediction._serving)
+    assert old_batcher.stats()['closed'] is True
+
+    # A late caller is served in-process without rebuilding the old entry
+    assert prediction.run_model(old, WINDOW)[0, 0] == 144
+    assert old not in prediction._serving
+    assert prediction._serving_for(old) == (None, None)
+
+
+def test_removed_version_is_not_rebuilt(serving):
+    prediction, registry = serving
+    registry.register('default')
+    registry.activate('default')
+    candidate = registry.register('candidate')
+    registry.activate('candidate')
+    previous = registry.get('default')
+
+    assert registry.active() is candidate
+    assert previous in prediction._serving
+    registry.remove('default')
+
+    assert wait_until(lambda: previous not in prediction._serving)
+    assert prediction.run_model(previous, WINDOW)[0, 0] == 144
+    assert previous not in prediction._serving
+    assert candidate in prediction._serving
@@ -0,0 +1,33 @@
+# tests/test_numpy_model.py
+import os
+
+import numpy as np
+import pytest
+
+from numpy_model import NumpyBiLSTMModel
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+TOLERANCE = 1e-4
+
+
+def load_keras_model(weights_file):
+    """Keras reference for a weights file: the JSON config rebuilt with its weights, or the full H5 model"""
+    tf = pytest.importorskip('tensorflow')
+    if weights_file == 'model.weights.h5':
+        with open(os.path.join(MODEL_DIR, 'model_config.json')) as f:
+            keras_model = tf.keras.models.model_from_json(f.read())
+        keras_model.load_weights(os.path.join(MODEL_DIR, weights_file))
+        return keras_model
+    return tf.keras.models.load_model(os.path.join(MODEL_DIR, weights_file), compile=False)
+
+
+@pytest.mark.parametrize('weights_file', ['model.weights.h5', 'glycemic_event_prediction_model.h5'])
+def test_numpy_engine_matches_keras(weights_file):
+    keras_model = load_keras_model(weights_file)
+    numpy_model = NumpyBiLSTMModel.from_model_dir(MODEL_DIR, weights_file)
+    rng = np.random.default_rng(0)
+
+    for batch_size in (1, 7, 256):
+        windows = rng.uniform(0, 1, size=(batch_size, 12, 12)).astype(np.float32)
+        np.testing.assert_allclose(numpy_model.predict(windows), keras_model.predict(windows, verbose=0),
+                                   rtol=0, atol=TOLERANCE, err_msg=f'{weights_file} batch={batch_size}')
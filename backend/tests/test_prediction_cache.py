@@ -0,0 +1,44 @@
+# tests/test_prediction_cache.py
+import os
+
+import joblib
+import numpy as np
+
+from numpy_model import NumpyBiLSTMModel
+from prediction_cache import PredictionCache
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+# Same accuracy gate as models/export_model.py: a cached result may stand in
+# for a fresh one if it is as close as an accepted exported variant
+MAX_PROBABILITY_ERROR = 0.02
+MAX_MINUTES_ERROR = 5.0
+
+
+def test_windows_sharing_a_key_get_the_same_prediction():
+    model = NumpyBiLSTMModel.from_model_dir(MODEL_DIR, 'model.weights.h5')
+    cache = PredictionCache()
+    rng = np.random.default_rng(0)
+    shape = (200,) + tuple(model.input_shape[1:])
+
+    # Two windows anywhere inside the same quantization cell
+    centers = np.round(rng.normal(0, 1.5, shape) / cache.quantum) * cache.quantum
+    first = centers + rng.uniform(-0.49, 0.49, shape) * cache.quantum
+    second = centers + rng.uniform(-0.49, 0.49, shape) * cache.quantum
+    assert all(cache.key('v1', a) == cache.key('v1', b) for a, b in zip(first, second))
+
+    regression_scaler = joblib.load(os.path.join(MODEL_DIR, 'regression_scaler.pkl'))
+    outputs = [model.predict(windows) for windows in (first, second)]
+    probabilities = [np.clip(output[:, :2], 0, 1) for output in outputs]
+    minutes = [regression_scaler.inverse_transform(output[:, 2:4]) for output in outputs]
+    np.testing.assert_allclose(probabilities[0], probabilities[1], rtol=0, atol=MAX_PROBABILITY_ERROR)
+    np.testing.assert_allclose(minutes[0], minutes[1], rtol=0, atol=MAX_MINUTES_ERROR)
+
+
+def test_key_separates_model_versions_and_changed_windows():
+    cache = PredictionCache()
+    window = np.zeros((12, 12))
+    changed = window.copy()
+    changed[-1, 0] = 2 * cache.quantum
+
+    assert cache.key('v1', window) != cache.key('v2', window)
+    assert cache.key('v1', window) != cache.key('v1', changed)
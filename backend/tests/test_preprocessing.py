@@ -0,0 +1,76 @@
+# tests/test_preprocessing.py
+import os
+
+import numpy as np
+import pytest
+
+import preprocessing
+from preprocessing import TOEPLITZ_MAX_STEPS, build_feature_matrix, causal_convolve
+from tests.baseline_preprocessing import BASELINE_COB_KERNEL, BASELINE_IOB_KERNEL, baseline_feature_matrix
+
+FEATURE_COLUMNS = np.load(os.path.join(os.path.dirname(preprocessing.__file__), 'models', 'feature_columns.npy'),
+                          allow_pickle=True).tolist()
+COB = FEATURE_COLUMNS.index('carbs_on_board')
+
+
+def random_windows(count, seed=5):
+    rng = np.random.default_rng(seed)
+    return [(
+        list(rng.uniform(40, 400, 12)),
+        {'basal': list(rng.uniform(0, 2, 12)), 'bolus': list(rng.choice([0, 0, 0, 2.5, 8], 12))},
+        list(rng.choice([0, 0, 30, 80], 12)),
+        None,
+        list(rng.uniform(50, 150, 12)),
+        list(rng.uniform(0, 5, 12)),
+    ) for _ in range(count)]
+
+
+@pytest.fixture
+def baseline_kernels(monkeypatch):
+    monkeypatch.setattr(preprocessing, 'IOB_DECAY_KERNEL', BASELINE_IOB_KERNEL)
+    monkeypatch.setattr(preprocessing, 'COB_DECAY_KERNEL', BASELINE_COB_KERNEL)
+
+
+def test_matches_baseline_with_baseline_kernels(baseline_kernels):
+    for window in random_windows(300):
+        np.testing.assert_allclose(build_feature_matrix(*window, FEATURE_COLUMNS),
+                                   baseline_feature_matrix(*window, FEATURE_COLUMNS), rtol=0, atol=1e-9)
+
+
+def test_default_kernels_only_add_older_carbs():
+    # The 4-hour step tables (user-006) change nothing inside a 12-step
+    # window except carbs 9-11 steps old, which now count at 5%
+    for window in random_windows(300, seed=6):
+        actual = build_feature_matrix(*window, FEATURE_COLUMNS)
+        expected = baseline_feature_matrix(*window, FEATURE_COLUMNS)
+        carbs = np.asarray(window[2], dtype=np.float64)
+        expected[:, COB] += [0.05 * sum(carbs[i - lag] for lag in (9, 10, 11) if i >= lag) for i in range(12)]
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+
+
+def test_short_inputs_use_baseline_defaults(baseline_kernels):
+    glucose = list(np.linspace(90, 150, 12))
+    window = (glucose, {}, [20] * 5, None, None, None)
+    np.testing.assert_allclose(build_feature_matrix(*window, FEATURE_COLUMNS),
+                               baseline_feature_matrix(*window, FEATURE_COLUMNS), rtol=0, atol=1e-9)
+
+
+def convolve_reference(series, kernel):
+    """out[t] = sum_k kernel[k] * series[t - k], one element at a time"""
+    out = np.zeros(len(series))
+    for t in range(len(series)):
+        for k in range(min(t + 1, len(kernel))):
+            out[t] += kernel[k] * series[t - k]
+    return out
+
+
+@pytest.mark.parametrize('steps', [1, 12, 48, TOEPLITZ_MAX_STEPS, TOEPLITZ_MAX_STEPS + 1, 400])
+@pytest.mark.parametrize('kernel_name', ['IOB_DECAY_KERNEL', 'COB_DECAY_KERNEL'])
+def test_causal_convolve_matches_reference_on_both_sides_of_the_toeplitz_switch(steps, kernel_name):
+    kernel = getattr(preprocessing, kernel_name)
+    rng = np.random.default_rng(steps)
+    batch = rng.choice([0, 0, 0, 2.5, 8, 45], (3, steps))
+
+    expected = np.stack([convolve_reference(row, kernel) for row in batch])
+    np.testing.assert_allclose(causal_convolve(batch, kernel), expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(causal_convolve(batch[0], kernel), expected[0], rtol=0, atol=1e-9)
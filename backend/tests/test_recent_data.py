@@ -0,0 +1,72 @@
+# tests/test_recent_data.py
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from recent_data import build_recent_pipeline, fetch_recent_parallel
+from tests.baseline_recent_data import recent_sequential
+
+NOW = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def recent_db():
+    """Two users' records around a 24 h window, some meals without meal_type"""
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['recent_data_test']
+    rng = np.random.default_rng(0)
+    docs = {'glucose': [], 'insulin': [], 'meal': [], 'activity': []}
+    for user_id in ('u1', 'u2'):
+        for i in range(400):
+            docs['glucose'].append({'user_id': user_id, 'value': float(rng.uniform(60, 250)), 'notes': 'x',
+                                    'timestamp': NOW - timedelta(minutes=5 * i)})
+        for i in range(15):
+            docs['insulin'].append({'user_id': user_id, 'dose': float(rng.uniform(1, 10)), 'insulin_type': 'bolus',
+                                    'timestamp': NOW - timedelta(hours=3 * i, minutes=1)})
+            meal = {'user_id': user_id, 'carbs': float(rng.uniform(10, 90)),
+                    'timestamp': NOW - timedelta(hours=3 * i, minutes=2)}
+            if i % 2:
+                meal['meal_type'] = 'lunch'
+            docs['meal'].append(meal)
+        for i in range(8):
+            docs['activity'].append({'user_id': user_id, 'activity_type': 'walking', 'duration': 30 + i,
+                                     'timestamp': NOW - timedelta(hours=5 * i, minutes=3)})
+    collections = {}
+    for kind, rows in docs.items():
+        collections[kind] = db[kind]
+        collections[kind].insert_many(rows)
+    return db, collections, {'user_id': 'u1', 'timestamp': {'$gte': NOW - timedelta(hours=24)}}
+
+
+def run_with_union(db, collection, pipeline):
+    """
+    Run `pipeline` on mongomock, which has no $unionWith: leading stages run
+    on `collection`, each $unionWith appends its sub-pipeline's results, and
+    the remaining stages run over the union.
+    """
+    split = next(i for i, stage in enumerate(pipeline) if '$unionWith' in stage)
+    rows = list(collection.aggregate(pipeline[:split]))
+    rest = pipeline[split:]
+    while rest and '$unionWith' in rest[0]:
+        union = rest.pop(0)['$unionWith']
+        rows += list(db[union['coll']].aggregate(union['pipeline']))
+    scratch = db['union_scratch']
+    scratch.drop()
+    scratch.insert_many(rows)
+    return next(scratch.aggregate([{'$project': {'_id': 0}}] + rest), None)
+
+
+def test_parallel_matches_sequential(recent_db):
+    _, collections, query = recent_db
+    assert fetch_recent_parallel(collections, query) == recent_sequential(collections, query)
+
+
+def test_aggregate_pipeline_matches_sequential(recent_db):
+    db, collections, query = recent_db
+    result = run_with_union(db, collections['glucose'], build_recent_pipeline(collections, query))
+
+    expected = recent_sequential(collections, query)
+    # 20 of 288 glucose readings (limit), 8 insulin, 8 meals, 5 activities in the last 24 h
+    assert len(expected['timeline']) == 41
+    assert result == expected
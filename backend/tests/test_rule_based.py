@@ -0,0 +1,42 @@
+# tests/test_rule_based.py
+import itertools
+
+import numpy as np
+
+from rule_based import rule_based_scores, rule_based_scores_scalar
+
+GLUCOSE_THRESHOLDS = (70, 80, 90, 100, 120, 140, 160, 180, 200)
+TREND_THRESHOLDS = (-2, -1, 0, 1, 2)
+
+
+def _around(values, eps=1e-6):
+    return sorted({v + d for v in values for d in (-eps, 0, eps)})
+
+
+def assert_parity(current, trend, carbs, bolus):
+    vector = rule_based_scores(current, trend, carbs, bolus)
+    mismatches = []
+    for i, case in enumerate(zip(current, trend, carbs, bolus)):
+        expected = rule_based_scores_scalar(*case)
+        if any(expected[key] != vector[key][i] for key in expected):
+            mismatches.append(case)
+    assert mismatches == []
+
+
+def test_parity_at_rule_thresholds():
+    cases = list(itertools.product(_around(GLUCOSE_THRESHOLDS), _around(TREND_THRESHOLDS),
+                                   _around((0, 30)), _around((0, 2))))
+    assert_parity(*(np.array(column, dtype=np.float64) for column in zip(*cases)))
+
+
+def test_parity_on_random_inputs():
+    rng = np.random.default_rng(14)
+    count = 20000
+    current = rng.uniform(30, 400, count)
+    trend = rng.normal(0, 3, count)
+    carbs = rng.choice([0, 15, 30, 45, 80], count) * rng.uniform(0.5, 1.5, count)
+    bolus = rng.choice([0, 1, 2, 4], count) * rng.uniform(0.5, 1.5, count)
+    # Integer readings land exactly on the thresholds
+    current[::4] = np.round(current[::4])
+    trend[::4] = np.round(trend[::4])
+    assert_parity(current, trend, carbs, bolus)
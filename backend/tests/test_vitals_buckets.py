@@ -0,0 +1,68 @@
+# tests/test_vitals_buckets.py
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from vitals_buckets import VitalsBucketWriter, VitalsBufferFull
+
+
+class UnreachableCollection:
+    def bulk_write(self, operations, ordered=True):
+        raise AutoReconnect('connection refused')
+
+
+class RejectsFirstBucketOnce:
+    """Applies every operation but the first on the first call, then everything"""
+
+    def __init__(self):
+        self.applied = []
+        self.calls = 0
+
+    def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+        if self.calls == 1:
+            self.applied.extend(operations[1:])
+            raise BulkWriteError({'writeErrors': [{'index': 0, 'code': 121, 'errmsg': 'validation failed'}],
+                                  'nInserted': 0, 'nUpserted': len(operations) - 1})
+        self.applied.extend(operations)
+
+
+def test_partial_bulk_failure_requeues_only_rejected_buckets():
+    collection = RejectsFirstBucketOnce()
+    writer = VitalsBucketWriter(collection, max_pending=1000, flush_interval=0)
+    # Two hourly buckets: 3 samples in the first, 2 in the second
+    writer.add('u1', [1699999200, 1699999210, 1699999220, 1700002800, 1700002810], heart_rate=[70] * 5)
+
+    assert writer.flush() == 2
+    assert writer.stats()['pending_samples'] == 3
+    assert writer.flush() == 3
+
+    pushed = sorted(len(op._doc['$push']['t']['$each']) for op in collection.applied)
+    assert pushed == [2, 3]
+    assert writer.stats()['samples_written'] == 5
+
+
+def test_buffer_is_bounded_while_flushes_fail():
+    writer = VitalsBucketWriter(UnreachableCollection(), max_pending=10, max_buffered=30)
+
+    for i in range(3):
+        writer.add('u1', [1700000000 + 10 * i + k for k in range(10)], heart_rate=[70] * 10)
+    with pytest.raises(VitalsBufferFull):
+        writer.add('u1', [1700001000], heart_rate=[70])
+
+    stats = writer.stats()
+    assert stats['pending_samples'] == 30
+    assert stats['failed_flushes'] == 3
+    assert stats['rejected_samples'] == 1
+
+
+def test_full_buffer_returns_503(client, app_module, monkeypatch):
+    writer = VitalsBucketWriter(UnreachableCollection(), max_pending=5, max_buffered=5)
+    monkeypatch.setattr(app_module, 'vitals_writer', writer)
+    samples = {'user_id': 'u1', 'timestamp': [1700000000 + k for k in range(5)], 'heart_rate': [70] * 5}
+
+    assert client.post('/api/vitals/samples', json=samples).status_code == 202
+    response = client.post('/api/vitals/samples', json=samples)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert writer.stats()['pending_samples'] == 5
@@ -0,0 +1,110 @@
+# tests/test_write_behind.py
+import os
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from write_behind import DUPLICATE_KEY, WriteBehindQueue
+
+# Above any pid_max, so never a running process
+DEAD_PID = 99999999
+
+
+class FakeCollection:
+    """insert_many(ordered=False) semantics: stores new _ids, reports duplicates as write errors"""
+
+    def __init__(self, fail_first=0):
+        self.docs = {}
+        self.fail_first = fail_first
+
+    def insert_many(self, docs, ordered=True):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise OperationFailure('not authorized', code=13)
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc['_id'] in self.docs:
+                errors.append({'index': i, 'code': DUPLICATE_KEY, 'errmsg': 'duplicate key'})
+            else:
+                self.docs[doc['_id']] = doc
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(docs) - len(errors)})
+
+
+def write_spool(path, docs):
+    with open(path, 'w', encoding='utf-8') as f:
+        for doc in docs:
+            f.write(json_util.dumps({'kind': 'meals', 'doc': doc}) + '\n')
+
+
+def make_queue(collection, base, written=None):
+    on_written = None if written is None else (lambda kind, docs: written.extend(docs))
+    return WriteBehindQueue({'meals': collection}, flush_interval=0.01, spool_path=str(base), on_written=on_written)
+
+
+def test_spools_per_process(tmp_path):
+    queue = make_queue(FakeCollection(), tmp_path / 'spool')
+    assert queue.spool_path == f"{tmp_path / 'spool'}.{os.getpid()}"
+
+
+def test_replays_spools_of_dead_processes(tmp_path):
+    base = tmp_path / 'spool'
+    docs = [{'_id': ObjectId(), 'user_id': 'u1', 'carbs': i} for i in range(3)]
+    write_spool(f'{base}.{DEAD_PID}', docs[:2])
+    write_spool(str(base), docs[2:])
+    collection = FakeCollection()
+
+    queue = make_queue(collection, base).start()
+    queue.close()
+
+    assert set(collection.docs) == {doc['_id'] for doc in docs}
+    assert queue.stats()['replayed'] == 3
+    assert not os.path.exists(f'{base}.{DEAD_PID}')
+    assert not os.path.exists(base)
+    assert os.path.getsize(queue.spool_path) == 0
+
+
+def test_leaves_spools_of_running_processes(tmp_path):
+    base = tmp_path / 'spool'
+    live = f'{base}.{os.getppid()}'
+    write_spool(live, [{'_id': ObjectId(), 'user_id': 'u1'}])
+
+    queue = make_queue(FakeCollection(), base).start()
+    queue.close()
+
+    assert queue.stats()['replayed'] == 0
+    assert os.path.exists(live)
+
+
+def test_replayed_duplicates_are_skipped(tmp_path):
+    base = tmp_path / 'spool'
+    stored = {'_id': ObjectId(), 'user_id': 'u1', 'carbs': 10}
+    unstored = {'_id': ObjectId(), 'user_id': 'u1', 'carbs': 20}
+    collection = FakeCollection()
+    collection.docs[stored['_id']] = stored
+    write_spool(f'{base}.{DEAD_PID}', [stored, unstored])
+    written = []
+
+    queue = make_queue(collection, base, written).start()
+    queue.close()
+
+    stats = queue.stats()
+    assert stats['written'] == 1
+    assert stats['failed'] == 0
+    assert [doc['_id'] for doc in written] == [unstored['_id']]
+
+
+def test_earlier_failures_do_not_block_truncation(tmp_path):
+    collection = FakeCollection(fail_first=1)
+    queue = make_queue(collection, tmp_path / 'spool').start()
+
+    queue.submit('meals', {'user_id': 'u1', 'carbs': 1})
+    queue._queue.join()
+    queue.submit('meals', {'user_id': 'u1', 'carbs': 2})
+    queue.close()
+
+    stats = queue.stats()
+    assert stats['failed'] == 1
+    assert stats['retries'] == 0
+    assert stats['written'] == 1
+    assert os.path.getsize(queue.spool_path) == 0
@@ -0,0 +1,207 @@
+# variability.py
+import numpy as np
+
+from preprocessing import STEP_MINUTES
+
+# Metrics expect glucose (mg/dL) on a regular grid, one column per CGM step
+STEPS_PER_HOUR = 60 // STEP_MINUTES
+STEPS_PER_DAY = 24 * STEPS_PER_HOUR
+
+# Users processed together; bounds the temporaries for very large batches
+METRICS_CHUNK_USERS = 128
+
+# MAGE moving-average windows in steps (short / long)
+MAGE_SHORT_WINDOW = 5
+MAGE_LONG_WINDOW = 32
+
+
+def pad_series(series, length=None):
+    """Stack ragged 1-D series into a NaN-padded [users, steps] matrix"""
+    length = length or max((len(s) for s in series), default=0)
+    matrix = np.full((len(series), length), np.nan)
+    for i, s in enumerate(series):
+        s = np.asarray(s, dtype=np.float64)[:length]
+        matrix[i, :len(s)] = s
+    return matrix
+
+
+def _matrix(glucose):
+    g = np.asarray(glucose, dtype=np.float64)
+    return g[np.newaxis] if g.ndim == 1 else g
+
+
+def _nan_mean_std(x, ddof=1):
+    """Row-wise mean and SD ignoring NaN (NaN where too few values), without warnings"""
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=1)
+    filled = np.where(valid, x, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=1) / n
+        squares = np.where(valid, (x - mean[:, np.newaxis]) ** 2, 0.0).sum(axis=1)
+        std = np.sqrt(squares / (n - ddof))
+    return np.where(n > 0, mean, np.nan), np.where(n > ddof, std, np.nan)
+
+
+def _nan_mean(x, axis=-1):
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, x, 0.0).sum(axis=axis) / n
+    return np.where(n > 0, mean, np.nan)
+
+
+def risk_values(glucose):
+    """Kovatchev low / high BG risk of every reading ([users, steps] each, NaN kept)"""
+    g = _matrix(glucose)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f = 1.509 * (np.log(g) ** 1.084 - 5.381)
+    risk = 10 * f * f
+    low = np.where(f < 0, risk, 0.0)
+    high = np.where(f > 0, risk, 0.0)
+    missing = np.isnan(f)
+    low[missing] = np.nan
+    high[missing] = np.nan
+    return low, high
+
+
+def lbgi_hbgi(glucose):
+    """Low and high blood glucose indices"""
+    low, high = risk_values(glucose)
+    return _nan_mean(low), _nan_mean(high)
+
+
+def adrr(glucose):
+    """
+    Average daily risk range: mean over days of the day's maximum low risk
+    plus maximum high risk. Days are consecutive STEPS_PER_DAY blocks from
+    the first column; days without readings are skipped.
+    """
+    return _daily_risk_range(*risk_values(glucose))
+
+
+def _daily_risk_range(low, high):
+    users, steps = low.shape
+    days = -(-steps // STEPS_PER_DAY)
+    pad = days * STEPS_PER_DAY - steps
+    daily_range = np.zeros((users, days))
+    for risk in (low, high):
+        blocks = np.pad(risk, ((0, 0), (0, pad)), constant_values=np.nan).reshape(users, days, STEPS_PER_DAY)
+        daily_max = np.where(np.isnan(blocks), -np.inf, blocks).max(axis=2)
+        daily_range += daily_max
+    daily_range[~np.isfinite(daily_range)] = np.nan
+    return _nan_mean(daily_range)
+
+
+def conga(glucose, hours=1):
+    """CONGA-n: SD of the differences between each reading and the one n hours earlier"""
+    g = _matrix(glucose)
+    lag = int(hours * STEPS_PER_HOUR)
+    if lag >= g.shape[1]:
+        return np.full(len(g), np.nan)
+    return _nan_mean_std(g[:, lag:] - g[:, :-lag])[1]
+
+
+def modd(glucose):
+    """Mean of daily differences: mean |difference| between readings 24 hours apart"""
+    g = _matrix(glucose)
+    if STEPS_PER_DAY >= g.shape[1]:
+        return np.full(len(g), np.nan)
+    return _nan_mean(np.abs(g[:, STEPS_PER_DAY:] - g[:, :-STEPS_PER_DAY]))
+
+
+def j_index(glucose):
+    """J-index: 0.001 * (mean + SD)^2"""
+    mean, std = _nan_mean_std(_matrix(glucose))
+    return 0.001 * (mean + std) ** 2
+
+
+def _trailing_mean(g, window):
+    """Trailing moving average over the last `window` steps, ignoring NaN"""
+    valid = ~np.isnan(g)
+    sums = np.cumsum(np.where(valid, g, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums[:, window:] -= sums[:, :-window].copy()
+    counts[:, window:] -= counts[:, :-window].copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def mage(glucose, short_window=MAGE_SHORT_WINDOW, long_window=MAGE_LONG_WINDOW):
+    """
+    Mean amplitude of glycemic excursions (moving-average method).
+
+    Crossings of a short and a long trailing moving average split each
+    series into alternating rising and falling segments; the segment's
+    peak (short above long) or nadir (short below long) is its turning
+    point. Swings between successive turning points larger than the user's
+    SD are excursions, and MAGE is the average of the mean upward and the
+    mean downward excursion (NaN when there are none).
+
+    All users are reduced together: segments are found on the flattened
+    valid readings and reduced with maximum/minimum.reduceat, so the cost
+    is O(users * steps) with no per-user Python loop.
+    """
+    g = _matrix(glucose)
+    users = len(g)
+    _, std = _nan_mean_std(g)
+    above = _trailing_mean(g, short_window) >= _trailing_mean(g, long_window)
+
+    valid = ~np.isnan(g)
+    values = g[valid]
+    user_of = np.nonzero(valid)[0]
+    up = above[valid]
+    if len(values) == 0:
+        return np.full(users, np.nan)
+
+    boundary = np.ones(len(values), dtype=bool)
+    boundary[1:] = (user_of[1:] != user_of[:-1]) | (up[1:] != up[:-1])
+    starts = np.flatnonzero(boundary)
+    turning = np.where(up[starts], np.maximum.reduceat(values, starts), np.minimum.reduceat(values, starts))
+    segment_user = user_of[starts]
+
+    swing = np.diff(turning)
+    swing_user = segment_user[1:]
+    counted = (segment_user[:-1] == swing_user) & (np.abs(swing) > std[swing_user])
+    rising = counted & (swing > 0)
+    falling = counted & (swing < 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mage_up = (np.bincount(swing_user[rising], weights=swing[rising], minlength=users)
+                   / np.bincount(swing_user[rising], minlength=users))
+        mage_down = (np.bincount(swing_user[falling], weights=-swing[falling], minlength=users)
+                     / np.bincount(swing_user[falling], minlength=users))
+    both = np.stack([mage_up, mage_down])
+    return _nan_mean(both, axis=0)
+
+
+def variability_metrics(glucose, conga_hours=1, chunk_users=METRICS_CHUNK_USERS):
+    """
+    All variability indices for a [users, steps] (or 1-D) glucose grid.
+
+    Missing steps are NaN; rows may have different lengths when padded with
+    NaN (see pad_series). Returns a dict of float arrays of length users:
+    readings, mean, sd, cv, j_index, lbgi, hbgi, adrr, conga, modd and mage.
+    """
+    g = _matrix(glucose)
+    results = []
+    for offset in range(0, len(g), chunk_users):
+        chunk = g[offset:offset + chunk_users]
+        mean, std = _nan_mean_std(chunk)
+        low, high = risk_values(chunk)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cv = 100 * std / mean
+        results.append({
+            'readings': (~np.isnan(chunk)).sum(axis=1).astype(np.float64),
+            'mean': mean,
+            'sd': std,
+            'cv': cv,
+            'j_index': 0.001 * (mean + std) ** 2,
+            'lbgi': _nan_mean(low),
+            'hbgi': _nan_mean(high),
+            'adrr': _daily_risk_range(low, high),
+            'conga': conga(chunk, conga_hours),
+            'modd': modd(chunk),
+            'mage': mage(chunk),
+        })
+    if not results:
+        return {}
+    return {name: np.concatenate([r[name] for r in results]) for name in results[0]}
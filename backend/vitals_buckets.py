@@ -0,0 +1,307 @@
+# vitals_buckets.py
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from resampling import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Each bucket document holds one user-hour of samples as parallel arrays
+BUCKET_SECONDS = 3600
+SIGNALS = ('heart_rate', 'gsr')
+
+
+class VitalsBufferFull(Exception):
+    """The write buffer holds max_buffered samples (callers should shed load)"""
+
+
+def bucket_start(seconds):
+    return np.floor_divide(seconds, BUCKET_SECONDS) * BUCKET_SECONDS
+
+
+def _to_datetime(seconds):
+    return datetime.fromtimestamp(float(seconds), tz=timezone.utc).replace(tzinfo=None)
+
+
+def _as_float(value):
+    if value is None or isinstance(value, bool):
+        return np.nan
+    return float(value)
+
+
+def bucket_updates(user_id, seconds, signals):
+    """
+    (filter, update) pairs appending samples to their hourly buckets, for
+    upserts.
+
+    `seconds` are epoch seconds and `signals` maps each SIGNALS name to a
+    float array (NaN = not measured). Bucket documents look like
+
+        {user_id, start, count, t: [ms offsets from start],
+         heart_rate: [...], gsr: [...],
+         stats: {heart_rate: {count, sum, min, max}, gsr: {...}}}
+
+    with null for missing samples. The header statistics let hourly
+    summaries (mean = sum / count) be read without the arrays.
+    """
+    starts = bucket_start(seconds)
+    updates = []
+    for start in np.unique(starts):
+        in_bucket = starts == start
+        offsets = np.rint((seconds[in_bucket] - start) * 1000).astype(np.int64)
+        update = {
+            '$push': {'t': {'$each': offsets.tolist()}},
+            '$inc': {'count': int(in_bucket.sum())},
+            '$setOnInsert': {'end': _to_datetime(start + BUCKET_SECONDS)},
+        }
+        for name in SIGNALS:
+            values = signals[name][in_bucket]
+            measured = values[~np.isnan(values)]
+            update['$push'][name] = {'$each': [None if np.isnan(v) else v for v in values.tolist()]}
+            if len(measured):
+                update['$inc'][f'stats.{name}.count'] = int(len(measured))
+                update['$inc'][f'stats.{name}.sum'] = float(measured.sum())
+                update.setdefault('$min', {})[f'stats.{name}.min'] = float(measured.min())
+                update.setdefault('$max', {})[f'stats.{name}.max'] = float(measured.max())
+        updates.append(({'user_id': user_id, 'start': _to_datetime(start)}, update))
+    return updates
+
+
+class VitalsBucketWriter:
+    """
+    Write buffer that fills hourly vitals buckets.
+
+    Samples are grouped per user in memory and written as one unordered
+    bulk_write of $push/$inc upserts (one per touched bucket) when
+    `max_pending` samples are buffered or every `flush_interval` seconds,
+    and once more at interpreter exit. A sample costs a few array elements
+    instead of a document plus its index entries.
+
+    Failed flushes keep their samples for the next one (only the rejected
+    buckets when the bulk write partially succeeded), so the buffer is
+    capped at `max_buffered` samples (pending plus being written): add()
+    raises VitalsBufferFull instead of growing while the database is down.
+    """
+
+    def __init__(self, collection, max_pending=5000, flush_interval=2.0, max_buffered=50000):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_buffered = max(max_buffered, max_pending)
+        self._pending = {}
+        self._pending_count = 0
+        # Taken from _pending by a flush that is still writing (still visible to readers)
+        self._in_flight = {}
+        self._in_flight_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples_written = 0
+        self.buckets_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected_samples = 0
+
+    def start(self):
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='vitals-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def add(self, user_id, timestamps, heart_rate=None, gsr=None):
+        """Buffer samples for one user (timestamps as datetimes, ISO strings or epoch seconds)"""
+        seconds = to_epoch_seconds(list(timestamps))
+        count = len(seconds)
+        if count > self.max_buffered:
+            raise ValueError(f"At most {self.max_buffered} samples can be added at once")
+        signals = {}
+        for name, values in (('heart_rate', heart_rate), ('gsr', gsr)):
+            values = [None] * count if values is None else list(values)
+            if len(values) != count:
+                raise ValueError(f"{name} must have one value per timestamp")
+            signals[name] = np.array([_as_float(v) for v in values], dtype=np.float64)
+        with self._lock:
+            if self._pending_count + self._in_flight_count + count > self.max_buffered:
+                self.rejected_samples += count
+                raise VitalsBufferFull(f"Vitals buffer is full ({self.max_buffered} samples)")
+            buffer = self._pending.setdefault(user_id, [])
+            buffer.append((seconds, signals))
+            self._pending_count += count
+            full = self._pending_count >= self.max_pending
+        if full:
+            self.flush()
+        return count
+
+    def pending(self, user_id, start_seconds, end_seconds):
+        """Buffered, not yet flushed samples for a user in [start, end)"""
+        with self._lock:
+            chunks = list(self._in_flight.get(user_id, ())) + list(self._pending.get(user_id, ()))
+        return _merge_chunks(chunks, start_seconds, end_seconds)
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of samples written"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                count, self._pending_count = self._pending_count, 0
+                self._in_flight, self._in_flight_count = pending, count
+            if not pending:
+                return 0
+            operations = []
+            # The samples behind each operation, so a partial failure re-queues only its buckets
+            operation_chunks = []
+            for user_id, chunks in pending.items():
+                seconds = np.concatenate([c[0] for c in chunks])
+                signals = {name: np.concatenate([c[1][name] for c in chunks]) for name in SIGNALS}
+                starts = bucket_start(seconds)
+                for start, (query, update) in zip(np.unique(starts), bucket_updates(user_id, seconds, signals)):
+                    in_bucket = starts == start
+                    operations.append(UpdateOne(query, update, upsert=True))
+                    operation_chunks.append(
+                        (user_id, (seconds[in_bucket], {name: values[in_bucket] for name, values in signals.items()}))
+                    )
+            try:
+                self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every operation not listed in writeErrors was applied,
+                # and re-sending those $push/$inc updates would duplicate samples
+                failed = {error['index'] for error in e.details.get('writeErrors', [])}
+                requeued = self._requeue([operation_chunks[i] for i in sorted(failed)])
+                self.failed_flushes += 1
+                logger.warning(f"Vitals bucket flush rejected {len(failed)} of {len(operations)} buckets "
+                               f"({requeued} samples kept for the next flush)")
+                self.flushes += 1
+                self.samples_written += count - requeued
+                self.buckets_written += len(operations) - len(failed)
+                return count - requeued
+            except PyMongoError as e:
+                # Nothing is known to be applied: put every sample back so the next flush retries them
+                self.failed_flushes += 1
+                logger.warning(f"Vitals bucket flush failed ({count} samples): {e}")
+                self._requeue([(user_id, chunk) for user_id, chunks in pending.items() for chunk in chunks])
+                return 0
+            with self._lock:
+                self._in_flight, self._in_flight_count = {}, 0
+            self.flushes += 1
+            self.samples_written += count
+            self.buckets_written += len(operations)
+            return count
+
+    def _requeue(self, user_chunks):
+        """Move (user_id, chunk) pairs back ahead of newer pending samples and clear the in-flight set"""
+        requeued = {}
+        for user_id, chunk in user_chunks:
+            requeued.setdefault(user_id, []).append(chunk)
+        count = sum(len(chunk[0]) for _, chunk in user_chunks)
+        with self._lock:
+            for user_id, chunks in requeued.items():
+                self._pending[user_id] = chunks + self._pending.get(user_id, [])
+            self._pending_count += count
+            self._in_flight, self._in_flight_count = {}, 0
+        return count
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending_count
+            in_flight = self._in_flight_count
+        return {
+            'pending_samples': pending,
+            'in_flight_samples': in_flight,
+            'max_pending': self.max_pending,
+            'max_buffered': self.max_buffered,
+            'flush_interval': self.flush_interval,
+            'samples_written': self.samples_written,
+            'buckets_written': self.buckets_written,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'rejected_samples': self.rejected_samples
+        }
+
+
+def _merge_chunks(chunks, start_seconds, end_seconds):
+    if not chunks:
+        return np.empty(0), {name: np.empty(0) for name in SIGNALS}
+    seconds = np.concatenate([c[0] for c in chunks])
+    keep = (seconds >= start_seconds) & (seconds < end_seconds)
+    return seconds[keep], {name: np.concatenate([c[1][name] for c in chunks])[keep] for name in SIGNALS}
+
+
+def read_vitals(collection, user_id, start, end, writer=None):
+    """
+    Vitals samples for one user in [start, end) as NumPy arrays.
+
+    Returns {'timestamp': epoch seconds, 'heart_rate': ..., 'gsr': ...},
+    float64 and sorted by time, with NaN for samples that did not measure a
+    signal. Only the buckets overlapping the range are fetched; samples
+    still in `writer`'s buffer are included.
+    """
+    start_seconds, end_seconds = to_epoch_seconds([start, end])
+    first_bucket = _to_datetime(bucket_start(start_seconds))
+    cursor = collection.find(
+        {'user_id': user_id, 'start': {'$gte': first_bucket, '$lt': end}},
+        {'_id': 0, 'start': 1, 't': 1, **{name: 1 for name in SIGNALS}}
+    )
+    chunks = []
+    for doc in cursor:
+        base = to_epoch_seconds([doc['start']])[0]
+        seconds = base + np.asarray(doc['t'], dtype=np.float64) / 1000.0
+        signals = {name: np.array(doc.get(name) or [None] * len(seconds), dtype=np.float64) for name in SIGNALS}
+        chunks.append((seconds, signals))
+    if writer is not None:
+        chunks.append(writer.pending(user_id, start_seconds, end_seconds))
+    seconds, signals = _merge_chunks(chunks, start_seconds, end_seconds)
+    order = np.argsort(seconds, kind='stable')
+    return {'timestamp': seconds[order], **{name: values[order] for name, values in signals.items()}}
+
+
+def step_means(samples, step_seconds):
+    """Average each signal over `step_seconds` steps (NaN-aware); returns the same dict shape"""
+    seconds = samples['timestamp']
+    if len(seconds) == 0:
+        return samples
+    steps = np.floor_divide(seconds, step_seconds).astype(np.int64)
+    keys, inverse = np.unique(steps, return_inverse=True)
+    result = {'timestamp': keys * float(step_seconds) + step_seconds / 2}
+    for name in SIGNALS:
+        values = samples[name]
+        measured = ~np.isnan(values)
+        sums = np.bincount(inverse, weights=np.where(measured, values, 0.0), minlength=len(keys))
+        counts = np.bincount(inverse, weights=measured, minlength=len(keys))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[name] = np.where(counts > 0, sums / counts, np.nan)
+    return result
+
+
+def hourly_summary(collection, user_id, start, end):
+    """Per-hour count/min/max/mean from bucket headers only (no sample arrays fetched)"""
+    docs = collection.find(
+        {'user_id': user_id, 'start': {'$gte': _to_datetime(bucket_start(to_epoch_seconds([start])[0])), '$lt': end}},
+        {'_id': 0, 'start': 1, 'count': 1, 'stats': 1}
+    ).sort('start', 1)
+    summary = []
+    for doc in docs:
+        entry = {'start': doc['start'], 'samples': doc.get('count', 0)}
+        for name in SIGNALS:
+            stats = (doc.get('stats') or {}).get(name)
+            if stats and stats.get('count'):
+                entry[name] = {'min': stats['min'], 'max': stats['max'], 'mean': stats['sum'] / stats['count']}
+        summary.append(entry)
+    return summary
@@ -0,0 +1,287 @@
+# write_behind.py
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindFull(Exception):
+    """The queue stayed full for the whole submit timeout (callers should shed load)"""
+
+
+class WriteBehindQueue:
+    """
+    Write-behind buffer for event inserts.
+
+    submit() assigns the document's _id, appends it to a bounded queue and
+    returns immediately; a flusher thread groups queued events per
+    collection into unordered insert_many batches of up to `batch_size`,
+    waiting at most `flush_interval` seconds to fill one. When the queue is
+    full, submit() waits up to `submit_timeout` seconds and then raises
+    WriteBehindFull, so a slow or unavailable database pushes back on
+    clients instead of growing memory.
+
+    With `spool_path`, each accepted event is also appended to a local
+    newline-delimited JSON file (fsync'd when `fsync` is set) that is
+    truncated whenever everything queued has been written. The file name
+    gets the process id as a suffix (`<spool_path>.<pid>`), so every worker
+    of a pre-forking server spools separately. On start, events left in
+    this process's spool or in the spool of any process that is no longer
+    running are queued again; _ids are assigned before spooling, so
+    replaying an already written event is a no-op duplicate.
+
+    Connection errors are retried until the database comes back; any other
+    database error drops the batch (counted in `failed`).
+
+    close() (also run at interpreter exit) stops accepting events and
+    flushes everything still queued.
+    """
+
+    def __init__(self, collections, max_queue=10000, batch_size=500, flush_interval=0.2,
+                 submit_timeout=1.0, spool_path=None, fsync=False, on_written=None):
+        self.collections = collections
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.submit_timeout = submit_timeout
+        self.spool_base = spool_path
+        self.spool_path = f'{spool_path}.{os.getpid()}' if spool_path else None
+        self.fsync = fsync
+        # Called with (kind, docs) after each batch is stored (e.g. rollups, cache invalidation)
+        self.on_written = on_written
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spool = None
+        self._spool_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._closed = False
+        self._thread = None
+        self.submitted = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        # Events the final drain could not store; they stay in the spool
+        self._unstored_at_shutdown = 0
+        self.batches = 0
+        self.retries = 0
+        self.replayed = 0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        pending = []
+        if self.spool_path:
+            pending = self._read_spool(self.spool_path)
+            orphaned = self._orphaned_spools()
+            self._spool = open(self.spool_path, 'a', encoding='utf-8')
+            for path in orphaned:
+                adopted = self._read_spool(path)
+                # Copy into our own spool before deleting theirs, so a crash in
+                # between only leaves duplicates (skipped by _id on replay)
+                for kind, doc in adopted:
+                    self._spool.write(json_util.dumps({'kind': kind, 'doc': doc}) + '\n')
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Another worker adopted it at the same time
+                    pass
+                pending.extend(adopted)
+        self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+        self._thread.start()
+        for item in pending:
+            self._queue.put(item)
+        self.replayed = len(pending)
+        if pending:
+            logger.info(f"Replaying {len(pending)} spooled events")
+        atexit.register(self.close)
+        return self
+
+    def _orphaned_spools(self):
+        """Spool files of other processes that are no longer running"""
+        # An unsuffixed file is a spool written before per-process spools
+        paths = [self.spool_base] if os.path.exists(self.spool_base) else []
+        for path in glob.glob(glob.escape(self.spool_base) + '.*'):
+            suffix = path[len(self.spool_base) + 1:]
+            if not suffix.isdigit() or path == self.spool_path or _process_alive(int(suffix)):
+                continue
+            paths.append(path)
+        return sorted(paths)
+
+    def _read_spool(self, path):
+        items = []
+        try:
+            f = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            return []
+        with f:
+            for line in f:
+                try:
+                    entry = json_util.loads(line)
+                    items.append((entry['kind'], entry['doc']))
+                except (ValueError, KeyError):
+                    # A torn final line from a crash mid-append
+                    logger.warning("Skipping unreadable write-behind spool entry")
+        return items
+
+    def submit(self, kind, doc):
+        """Queue `doc` for insertion into `kind`'s collection and return its _id"""
+        if kind not in self.collections:
+            raise ValueError(f"Unknown event type: {kind}")
+        if self._closed:
+            raise WriteBehindFull("Write-behind queue is shutting down")
+        doc.setdefault('_id', ObjectId())
+        deadline = time.monotonic() + self.submit_timeout
+        while True:
+            # The spool line is written under the same lock the flusher takes
+            # to truncate, so an accepted event is never truncated unwritten
+            with self._spool_lock:
+                try:
+                    self._queue.put_nowait((kind, doc))
+                    if self._spool is not None:
+                        self._spool.write(json_util.dumps({'kind': kind, 'doc': doc}) + '\n')
+                        self._spool.flush()
+                        if self.fsync:
+                            os.fsync(self._spool.fileno())
+                    self.submitted += 1
+                    return doc['_id']
+                except queue.Full:
+                    pass
+            if time.monotonic() >= deadline:
+                self.rejected += 1
+                raise WriteBehindFull("Write-behind queue is full")
+            time.sleep(0.005)
+
+    def _next_batch(self):
+        try:
+            items = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            items = self._next_batch()
+            if not items:
+                continue
+            self._write(items)
+            for _ in items:
+                self._queue.task_done()
+            self._truncate_spool()
+
+    def _write(self, items):
+        grouped = {}
+        for kind, doc in items:
+            grouped.setdefault(kind, []).append(doc)
+        for kind, docs in grouped.items():
+            stored = self._insert(kind, docs)
+            self.batches += 1
+            if stored and self.on_written is not None:
+                try:
+                    self.on_written(kind, stored)
+                except Exception as e:
+                    logger.warning(f"Write-behind post-write hook failed for {kind}: {e}")
+
+    def _insert(self, kind, docs):
+        """insert_many with retries on connection errors; returns the documents stored"""
+        delay = 0.5
+        while True:
+            try:
+                self.collections[kind].insert_many(docs, ordered=False)
+                self.written += len(docs)
+                return docs
+            except BulkWriteError as e:
+                # Duplicates are replayed events that were already written (and hooked)
+                errors = e.details.get('writeErrors', [])
+                rejected = sum(1 for error in errors if error.get('code') != DUPLICATE_KEY)
+                if rejected:
+                    self.failed += rejected
+                    logger.error(f"Write-behind dropped {rejected} {kind} events rejected by the database")
+                skipped = {error['index'] for error in errors}
+                stored = [doc for i, doc in enumerate(docs) if i not in skipped]
+                self.written += len(stored)
+                return stored
+            except ConnectionFailure as e:
+                if self._stopping.is_set() and delay > 5:
+                    # Shutting down with the database unreachable: the spool keeps them
+                    self.failed += len(docs)
+                    self._unstored_at_shutdown += len(docs)
+                    logger.error(f"Write-behind could not store {len(docs)} {kind} events at shutdown: {e}")
+                    return []
+                self.retries += 1
+                logger.warning(f"Write-behind insert of {len(docs)} {kind} events failed, retrying: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+            except PyMongoError as e:
+                # Not a connection problem (e.g. authorization, validation): retrying will not help
+                self.failed += len(docs)
+                logger.error(f"Write-behind dropped {len(docs)} {kind} events: {e}")
+                return []
+
+    def _truncate_spool(self):
+        if self._spool is None or self._unstored_at_shutdown:
+            # Keep what could not be stored at shutdown for the next start
+            return
+        if self._spool_lock.acquire(blocking=False):
+            try:
+                if self._queue.unfinished_tasks == 0:
+                    self._spool.truncate(0)
+                    self._spool.seek(0)
+            finally:
+                self._spool_lock.release()
+
+    def close(self, timeout=30):
+        """Stop accepting events and flush everything queued"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logger.error(f"Write-behind flush did not finish; {self._queue.qsize()} events left in the spool")
+        if self._spool is not None:
+            self._spool.close()
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'spool': self.spool_path,
+            'submitted': self.submitted,
+            'written': self.written,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'batches': self.batches,
+            'retries': self.retries,
+            'replayed': self.replayed
+        }
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        pass
+    return True